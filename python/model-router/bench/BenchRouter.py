@@ -0,0 +1,37 @@
+"""Runs the router (main:app) against FakeKubernetes, sending all inference traffic to one model host.
+
+Started by bench/run.py as `python -m bench.BenchRouter` from python/model-router, with the
+POSTGRES_* variables of the benchmark database and the router's watchers disabled.
+"""
+import argparse
+import dataclasses
+import uvicorn
+import k8s.MLDeployer as ml_deployer
+from bench.FakeKubernetes import FakeKubernetes
+
+# The real API clients are replaced by the fake below, so never look for a kube config
+ml_deployer._kube_config_loaded = True
+
+import main  # noqa: E402
+
+
+def install_fakes(model_host: str, k8s_latency_ms: float):
+    fake = FakeKubernetes(k8s_latency_ms)
+    main.k8s = main.deployment_jobs.deployer = ml_deployer.MLDeployer(fake, fake, fake, fake)
+    load_route = main.route_table.loader
+
+    async def load_local_route(model_name: str, model_version: str):
+        return dataclasses.replace(await load_route(model_name, model_version), service_name=model_host)
+
+    main.route_table.loader = load_local_route
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Router wired to a fake Kubernetes API for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18400)
+    parser.add_argument("--model-host", default="127.0.0.1")
+    parser.add_argument("--k8s-latency-ms", type=float, default=10.0)
+    args = parser.parse_args()
+    install_fakes(args.model_host, args.k8s_latency_ms)
+    uvicorn.run(main.app, host=args.host, port=args.port, log_level="warning", access_log=False)
@@ -0,0 +1,119 @@
+from typing import Dict, Tuple
+import itertools
+import threading
+import time
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+
+class FakeKubernetes:
+    """In-memory stand-in for the AppsV1, AutoscalingV2, CoreV1 and DiscoveryV1 API calls MLDeployer makes.
+
+    Pass the same instance for every API client of MLDeployer. Each call sleeps latency_ms to
+    model the API server round trip; creating an existing object raises 409 and deleting a
+    missing one 404, like the real API. Every Deployment reports one ready endpoint while it
+    has replicas. Watches are not supported, so run the router with its watchers disabled.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.objects: Dict[Tuple[str, str], object] = {}
+        self.replicas: Dict[str, int] = {}
+        self.resource_versions = itertools.count(1)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def call(self):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create(self, kind: str, body):
+        self.call()
+        with self.lock:
+            key = (kind, body.metadata.name)
+            if key in self.objects:
+                raise ApiException(status=409, reason="AlreadyExists")
+            body.metadata.resource_version = str(next(self.resource_versions))
+            self.objects[key] = body
+            if kind == "deployment":
+                self.replicas[body.metadata.name] = body.spec.replicas
+        return body
+
+    def delete(self, kind: str, name: str):
+        self.call()
+        with self.lock:
+            if self.objects.pop((kind, name), None) is None:
+                raise ApiException(status=404, reason="NotFound")
+            self.replicas.pop(name, None)
+        return client.V1Status(status="Success")
+
+    def read(self, kind: str, name: str):
+        self.call()
+        with self.lock:
+            obj = self.objects.get((kind, name))
+        if obj is None:
+            raise ApiException(status=404, reason="NotFound")
+        return obj
+
+    def list(self, kind: str, watch: bool = False, **kwargs):
+        if watch:
+            raise ApiException(status=501, reason="Watches are not supported by FakeKubernetes")
+        self.call()
+        with self.lock:
+            items = [obj for (object_kind, _), obj in self.objects.items() if object_kind == kind]
+            resource_version = str(next(self.resource_versions))
+        return client.V1DeploymentList(items=items, metadata=client.V1ListMeta(resource_version=resource_version))
+
+    def create_namespaced_deployment(self, body, namespace):
+        return self.create("deployment", body)
+
+    def create_namespaced_horizontal_pod_autoscaler(self, body, namespace):
+        return self.create("autoscaler", body)
+
+    def create_namespaced_service(self, body, namespace):
+        return self.create("service", body)
+
+    def delete_namespaced_deployment(self, name, namespace):
+        return self.delete("deployment", name)
+
+    def delete_namespaced_horizontal_pod_autoscaler(self, name, namespace):
+        return self.delete("autoscaler", name)
+
+    def delete_namespaced_service(self, name, namespace):
+        return self.delete("service", name)
+
+    def read_namespaced_deployment(self, name, namespace):
+        return self.read("deployment", name)
+
+    def patch_namespaced_deployment(self, name, namespace, body):
+        deployment = self.read("deployment", name)
+        annotations = body.get("metadata", {}).get("annotations")
+        if annotations:
+            deployment.metadata.annotations = {**(deployment.metadata.annotations or {}), **annotations}
+        return deployment
+
+    def patch_namespaced_deployment_scale(self, name, namespace, body):
+        self.read("deployment", name)
+        with self.lock:
+            self.replicas[name] = body["spec"]["replicas"]
+        return body
+
+    def read_namespaced_endpoints(self, name, namespace):
+        service = self.read("service", name)
+        deployment = service.spec.selector["app"]
+        addresses = [client.V1EndpointAddress(ip="127.0.0.1")] if self.replicas.get(deployment) else None
+        return client.V1Endpoints(subsets=[client.V1EndpointSubset(addresses=addresses)] if addresses else None)
+
+    def list_namespaced_deployment(self, namespace, **kwargs):
+        return self.list("deployment", **kwargs)
+
+    def list_namespaced_horizontal_pod_autoscaler(self, namespace, **kwargs):
+        return self.list("autoscaler", **kwargs)
+
+    def list_namespaced_service(self, namespace, **kwargs):
+        return self.list("service", **kwargs)
+
+    def list_namespaced_endpoint_slice(self, namespace, **kwargs):
+        return self.list("endpointslice", **kwargs)
@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import orjson
+
+
+class FakeModelServer:
+    """Minimal HTTP/1.1 keep-alive server standing in for a model pod.
+
+    Every POST is answered after latency_ms with a JSON prediction of about payload_bytes.
+    A JSON array body (a micro-batch from the router) gets an array of as many predictions.
+    Written on bare asyncio streams so the stub costs far less CPU than the router under test.
+    """
+
+    def __init__(self, latency_ms: float = 5.0, payload_bytes: int = 256):
+        self.latency = latency_ms / 1000.0
+        self.prediction = orjson.dumps({"prediction": "x" * max(payload_bytes - 17, 0)})
+        self.requests = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                content_length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        content_length = int(value)
+                body = await reader.readexactly(content_length) if content_length else b""
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if body.startswith(b"["):
+                    content = b"[" + b",".join([self.prediction] * len(orjson.loads(body))) + b"]"
+                else:
+                    content = self.prediction
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\ncontent-length: %d\r\n\r\n%s"
+                    % (len(content), content)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub model server for router benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18500)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(FakeModelServer(args.latency_ms, args.payload_bytes).serve(args.host, args.port))
@@ -0,0 +1,51 @@
+"""Compare two bench.run JSON reports: `python -m bench.compare baseline.json candidate.json`.
+
+Prints every metric that changed and exits with status 1 if any got worse by more than --threshold.
+"""
+from typing import Dict, Iterator, Tuple
+import argparse
+import json
+import sys
+
+# Metric name suffixes where bigger is better; every *_ms latency is better when smaller
+HIGHER_IS_BETTER = ("rps", "per_second")
+
+
+def metrics(node, path: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from metrics(value, f"{path}.{key}" if path else key)
+    elif isinstance(node, list):
+        for index, value in enumerate(node):
+            yield from metrics(value, f"{path}[{index}]")
+    elif isinstance(node, (int, float)) and (path.endswith("_ms") or path.endswith(HIGHER_IS_BETTER)):
+        if not path.endswith("target_rps"):
+            yield path, float(node)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two router benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+    before: Dict[str, float] = dict(metrics(baseline["results"]))
+    regressions = 0
+    print(f"{'metric':60} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for path, value in metrics(candidate["results"]):
+        if path not in before or before[path] == 0:
+            continue
+        change = (value - before[path]) / before[path] * 100.0
+        worse = -change if path.endswith(HIGHER_IS_BETTER) else change
+        regressed = worse > args.threshold
+        regressions += regressed
+        print(f"{path:60} {before[path]:12.3f} {value:12.3f} {change:+8.1f}%{'  REGRESSION' if regressed else ''}")
+    print(f"{baseline['commit'][:12]} -> {candidate['commit'][:12]}: {regressions} regressions over {args.threshold}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Router benchmark suite: deploy throughput, metadata lookup latency and open-loop inference load.
+
+Everything runs on one machine: a FakeModelServer and the router (bench.BenchRouter, backed by
+FakeKubernetes) are started as subprocesses, and metadata lives in the Postgres named by the
+usual POSTGRES_* variables (e.g. `docker run -p 5432:5432 -e POSTGRES_PASSWORD=... postgres:16`).
+Benchmark models are named bench-* and deleted afterwards. Run from python/model-router:
+
+    python -m bench.run --output results.json
+    python -m bench.compare baseline.json results.json
+"""
+from typing import Callable, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+MODEL_ROUTER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(latencies: List[float]) -> dict:
+    """Latency percentiles in milliseconds (nearest rank)."""
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(int(len(ordered) * p / 100.0), len(ordered) - 1)] * 1000.0, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000.0, 3),
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000.0, 3),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=MODEL_ROUTER_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def bench_model(index: int, model_port: int, **settings) -> dict:
+    return {"image_url": "bench/model:latest", "exposed_port": model_port, "name": f"bench-{index}",
+            "version": "v1", "endpoint": "/predict", **settings}
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("Router did not start, see its log")
+        await asyncio.sleep(0.2)
+
+
+async def bench_deploy(client: httpx.AsyncClient, models: int, model_port: int) -> dict:
+    """Deploy half of the models in one batch call and half through the background job queue."""
+    batch = [bench_model(index, model_port) for index in range(models // 2)]
+    started = time.perf_counter()
+    response = (await client.post("/models:batch", json=batch, timeout=None)).json()
+    batch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    jobs = [
+        (await client.post("/model", json=bench_model(index, model_port))).json()["status_url"]
+        for index in range(models // 2, models)
+    ]
+    pending, failed = set(jobs), 0
+    while pending:
+        await asyncio.sleep(0.05)
+        for status_url in list(pending):
+            status = (await client.get(status_url)).json()["status"]
+            if status in ("succeeded", "failed"):
+                pending.discard(status_url)
+                failed += status == "failed"
+    jobs_seconds = time.perf_counter() - started
+
+    return {
+        "batch": {"models": len(batch), "failed": response["failed"], "seconds": round(batch_seconds, 3),
+                  "models_per_second": round(len(batch) / batch_seconds, 1)},
+        "jobs": {"models": len(jobs), "failed": failed, "seconds": round(jobs_seconds, 3),
+                 "models_per_second": round(len(jobs) / jobs_seconds, 1)},
+    }
+
+
+def bench_persistence(models: int, iterations: int) -> dict:
+    """Time MLModelPersistence lookups directly, without HTTP in the way."""
+    sys.path.insert(0, MODEL_ROUTER_DIR)
+    from models.Database import Database
+    from models.MLModelPersistence import MLModelPersistence
+
+    db = Database.from_env()
+    persistence = MLModelPersistence(db)
+    results = {}
+    try:
+        for name, lookup in (("get_routing", persistence.get_routing), ("get", persistence.get)):
+            latencies = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                lookup(f"bench-{random.randrange(models)}", "v1")
+                latencies.append(time.perf_counter() - started)
+            results[name] = summarize(latencies)
+    finally:
+        db.close()
+    return results
+
+
+async def closed_loop(request: Callable, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                ok = (await request()).status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return {**summarize(latencies), "errors": errors, "rps": round(len(latencies) / duration, 1)}
+
+
+async def open_loop(request: Callable, rps: float, duration: float) -> dict:
+    """Send requests at a fixed rate whatever the response times (no coordinated omission).
+
+    Latency is measured from when each request was due, so a stalled generator shows up too.
+    """
+    loop = asyncio.get_running_loop()
+    latencies, errors, tasks = [], 0, []
+    started = loop.time()
+
+    async def one(due: float):
+        nonlocal errors
+        try:
+            ok = (await request()).status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        latencies.append(loop.time() - due)
+        errors += not ok
+
+    for index in range(int(rps * duration)):
+        due = started + index / rps
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(due)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - started
+    return {
+        "target_rps": rps,
+        "achieved_rps": round(len(latencies) / elapsed, 1),
+        "errors": errors,
+        **summarize(latencies),
+    }
+
+
+async def run(args) -> Dict[str, dict]:
+    results = {}
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.router_port}", limits=limits, timeout=30.0) as client:
+        await wait_until_up(client)
+        await client.request("DELETE", "/models:batch", json=[{"name": f"bench-{index}", "version": "v1"} for index in range(args.models + 2)])
+        try:
+            results["deploy"] = await bench_deploy(client, args.models, args.model_port)
+            # Models with micro-batching and response caching on top of the plain ones
+            await client.post("/models:batch", json=[
+                bench_model(args.models, args.model_port, batch_max_size=16, batch_max_wait_ms=2),
+                bench_model(args.models + 1, args.model_port, cache_ttl_seconds=60),
+            ])
+            results["lookup"] = {
+                "persistence": await asyncio.to_thread(bench_persistence, args.models, args.lookups),
+                "http": await closed_loop(
+                    lambda: client.get(f"/model/bench-{random.randrange(args.models)}/v1"), args.concurrency, args.duration
+                ),
+            }
+
+            body = json.dumps({"inputs": [random.random() for _ in range(args.request_floats)]}).encode()
+            targets = {
+                "plain": lambda: client.post(f"/predict/bench-{random.randrange(args.models)}/v1", content=body),
+                "batched": lambda: client.post(f"/predict/bench-{args.models}/v1", content=body),
+                "cached": lambda: client.post(f"/predict/bench-{args.models + 1}/v1", content=body),
+            }
+            results["inference"] = {}
+            for name, request in targets.items():
+                for _ in range(min(args.concurrency, 50)):
+                    await request()  # Warm up routes and upstream connections
+                results["inference"][name] = [await open_loop(request, rps, args.duration) for rps in args.rps]
+        finally:
+            await client.request("DELETE", "/models:batch", json=[{"name": f"bench-{index}", "version": "v1"} for index in range(args.models + 2)])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the model router end to end on one machine")
+    parser.add_argument("--models", type=int, default=200, help="Models to deploy (and to spread lookups over)")
+    parser.add_argument("--k8s-latency-ms", type=float, default=10.0, help="Simulated Kubernetes API round trip")
+    parser.add_argument("--model-latency-ms", type=float, default=5.0)
+    parser.add_argument("--payload-bytes", type=int, default=256, help="Size of each model response")
+    parser.add_argument("--request-floats", type=int, default=64, help="Floats in each inference request body")
+    parser.add_argument("--rps", type=float, nargs="+", default=[200.0, 500.0, 1000.0], help="Open-loop request rates")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per load step")
+    parser.add_argument("--concurrency", type=int, default=32, help="Closed-loop workers for lookups")
+    parser.add_argument("--lookups", type=int, default=2000, help="Direct persistence lookups per operation")
+    parser.add_argument("--connections", type=int, default=512)
+    parser.add_argument("--router-port", type=int, default=18400)
+    parser.add_argument("--model-port", type=int, default=18500)
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    env = {**os.environ, "RECONCILER_ENABLED": "false", "ENDPOINT_BALANCING": "false", "TRACING_ENABLED": "false",
+           "IMAGE_PREPULL_ENABLED": "false"}
+    log = tempfile.NamedTemporaryFile(prefix="bench-", suffix=".log", delete=False)
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "bench.FakeModelServer", "--port", str(args.model_port),
+             "--latency-ms", str(args.model_latency_ms), "--payload-bytes", str(args.payload_bytes)],
+            cwd=MODEL_ROUTER_DIR, env=env, stdout=log, stderr=log,
+        ),
+        subprocess.Popen(
+            [sys.executable, "-m", "bench.BenchRouter", "--port", str(args.router_port),
+             "--k8s-latency-ms", str(args.k8s_latency_ms)],
+            cwd=MODEL_ROUTER_DIR, env=env, stdout=log, stderr=log,
+        ),
+    ]
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+    print(f"Router and model server log: {log.name}", file=sys.stderr)
+
+    report = json.dumps({
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
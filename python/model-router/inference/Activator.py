@@ -0,0 +1,171 @@
+from typing import Awaitable, Callable, Dict, Set, Tuple
+import asyncio
+import os
+import time
+from monitoring.ColdStartStats import ColdStartStats
+
+
+class ActivatorQueueFull(Exception):
+    pass
+
+
+class ActivationTimeout(Exception):
+    pass
+
+
+class Activator:
+    """Scales idle scale-to-zero models down to zero replicas and wakes them on demand.
+
+    Requests for a cold model wait in a bounded per-model queue while one activation scales the
+    Deployment to a single replica and polls until its Service has a ready endpoint. The idle
+    reaper only scales a model down once no router replica has served it within its idle window;
+    replicas share their last activity through an annotation on the Deployment. Requests arriving
+    while this replica scales a model down wait until its pods are gone, then start it again.
+    `call(method, *args)` runs an MLDeployer method off the event loop (DeploymentJobQueue.call).
+    """
+
+    def __init__(
+        self,
+        call: Callable[..., Awaitable],
+        default_idle_timeout: float = 900.0,
+        max_queue: int = 100,
+        cold_start_timeout: float = 300.0,
+        poll_interval: float = 0.5,
+        reap_interval: float = 10.0,
+    ):
+        self.call = call
+        self.default_idle_timeout = default_idle_timeout
+        self.max_queue = max_queue
+        self.cold_start_timeout = cold_start_timeout
+        self.poll_interval = poll_interval
+        self.reap_interval = reap_interval
+        self.idle_timeouts: Dict[Tuple[str, str], float] = {}
+        self.last_request: Dict[Tuple[str, str], float] = {}
+        self.last_published: Dict[Tuple[str, str], float] = {}
+        self.warm: Set[Tuple[str, str]] = set()
+        self.activations: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.draining: Dict[Tuple[str, str], asyncio.Event] = {}
+        self.waiting: Dict[Tuple[str, str], int] = {}
+        self.cold_starts: Dict[Tuple[str, str], ColdStartStats] = {}
+        self.reaper_task = None
+
+    @classmethod
+    def from_env(cls, call: Callable[..., Awaitable]):
+        """Factory method to create an Activator from environment variables."""
+        return cls(
+            call,
+            default_idle_timeout=float(os.getenv('SCALE_TO_ZERO_IDLE_SECONDS', 900.0)),
+            max_queue=int(os.getenv('ACTIVATOR_MAX_QUEUE', 100)),
+            cold_start_timeout=float(os.getenv('ACTIVATOR_COLD_START_TIMEOUT', 300.0)),
+            poll_interval=float(os.getenv('ACTIVATOR_POLL_INTERVAL', 0.5)),
+            reap_interval=float(os.getenv('ACTIVATOR_REAP_INTERVAL', 10.0)),
+        )
+
+    def start(self):
+        self.reaper_task = asyncio.create_task(self.reaper())
+
+    async def stop(self):
+        if self.reaper_task is not None:
+            self.reaper_task.cancel()
+            await asyncio.gather(self.reaper_task, return_exceptions=True)
+        for task in list(self.activations.values()):
+            task.cancel()
+
+    async def ensure_ready(self, model_name: str, model_version: str, idle_timeout: float = None):
+        """Return once the model has a ready endpoint, activating it first if it is scaled to zero."""
+        key = (model_name, model_version)
+        now = time.monotonic()
+        idle_timeout = idle_timeout or self.default_idle_timeout
+        self.idle_timeouts[key] = idle_timeout
+        # Trust a warm model only while we ourselves have been sending it traffic; other replicas
+        # could have scaled it down after a longer silence on our side
+        fresh = now - self.last_request.get(key, float("-inf")) < idle_timeout
+        self.last_request[key] = now
+        if key in self.warm and fresh:
+            return
+
+        if self.waiting.get(key, 0) >= self.max_queue:
+            raise ActivatorQueueFull(f"Too many requests waiting for {model_name}:{model_version} to start")
+        self.waiting[key] = self.waiting.get(key, 0) + 1
+        try:
+            draining = self.draining.get(key)
+            if draining is not None:
+                await draining.wait()  # Its pod is terminating, it would look ready for a moment
+            activation = self.activations.get(key)
+            if activation is None:
+                activation = asyncio.create_task(self.activate(key))
+                self.activations[key] = activation
+                activation.add_done_callback(lambda done: self.activations.pop(key, None))
+            await asyncio.shield(activation)
+        finally:
+            self.waiting[key] -= 1
+
+    async def activate(self, key: Tuple[str, str]):
+        started_at = time.monotonic()
+        if await self.call("ready_endpoints", *key) > 0:
+            self.warm.add(key)
+            return
+        await self.call("scale_deployment", *key, 1)
+        deadline = started_at + self.cold_start_timeout
+        while await self.call("ready_endpoints", *key) == 0:
+            if time.monotonic() > deadline:
+                raise ActivationTimeout(f"Model {key[0]}:{key[1]} did not become ready within {self.cold_start_timeout}s")
+            await asyncio.sleep(self.poll_interval)
+        self.warm.add(key)
+        self.cold_starts.setdefault(key, ColdStartStats()).record(time.monotonic() - started_at)
+
+    def forget(self, model_name: str, model_version: str):
+        key = (model_name, model_version)
+        self.warm.discard(key)
+        self.idle_timeouts.pop(key, None)
+        self.last_request.pop(key, None)
+        self.last_published.pop(key, None)
+
+    async def reaper(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            for key in list(self.warm):
+                try:
+                    await self.reap(key)
+                except Exception as e:
+                    print(f"Exception when reaping {key[0]}:{key[1]}: {e}")
+
+    async def reap(self, key: Tuple[str, str]):
+        last_request = self.last_request.get(key)
+        if last_request is None:
+            return
+        if last_request > self.last_published.get(key, float("-inf")):
+            # Monotonic time is per process, so publish wall-clock time for the other replicas
+            await self.call("publish_last_request", *key, time.time() - (time.monotonic() - last_request))
+            self.last_published[key] = last_request
+            return
+        idle_timeout = self.idle_timeouts.get(key, self.default_idle_timeout)
+        if time.monotonic() - last_request < idle_timeout:
+            return
+        shared_last_request = await self.call("last_request", *key)
+        if shared_last_request is not None and time.time() - shared_last_request < idle_timeout:
+            return
+        if key in self.activations or self.waiting.get(key):
+            return
+        self.warm.discard(key)
+        draining = self.draining[key] = asyncio.Event()
+        try:
+            await self.call("scale_deployment", *key, 0)
+            # Requests that arrived meanwhile are held until the old pod left the endpoints
+            deadline = time.monotonic() + self.cold_start_timeout
+            while await self.call("ready_endpoints", *key) > 0 and time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            del self.draining[key]
+            draining.set()
+
+    def stats(self) -> dict:
+        return {
+            f"{name}:{version}": {
+                "warm": (name, version) in self.warm,
+                "draining": (name, version) in self.draining,
+                "waiting": self.waiting.get((name, version), 0),
+                **self.cold_starts.get((name, version), ColdStartStats()).to_dict(),
+            }
+            for name, version in self.idle_timeouts
+        }
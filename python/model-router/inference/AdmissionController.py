@@ -0,0 +1,143 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+# x-request-priority values; lower is more important
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+LOW_PRIORITY = PRIORITIES["low"]
+
+
+class AdmissionRejected(Exception):
+    status_code = 503
+    reason = "shed"
+
+
+class ModelSaturated(AdmissionRejected):
+    status_code = 429
+    reason = "queue_full"
+
+
+class DeadlineExceeded(AdmissionRejected):
+    reason = "deadline"
+
+
+class ModelGate:
+    __slots__ = ("active", "queued", "waiters", "admitted", "rejected", "shed", "expired")
+
+    def __init__(self):
+        self.active = 0
+        self.queued = 0
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []  # Heap of (priority, arrival order, future)
+        self.admitted = 0
+        self.rejected = 0
+        self.shed = 0
+        self.expired = 0
+
+
+class AdmissionController:
+    """Per-model limits on in-flight and queued requests for one router replica.
+
+    Requests over max_concurrency wait in a priority queue of at most max_queue_depth, where
+    freed slots go to the most important, then oldest, waiter. Low priority requests may only
+    fill half the queue, and when the queue is full a more important request displaces the
+    least important waiter, so low priority callers are shed first. Waiters give up at their
+    deadline. Every rejection is immediate, so an overloaded model answers fast instead of
+    piling up work. Only used from the event loop thread.
+    """
+
+    def __init__(self, default_queue_timeout_ms: float = 10000.0):
+        self.default_queue_timeout = default_queue_timeout_ms / 1000.0
+        self.gates: Dict[Tuple[str, str], ModelGate] = {}
+        self.order = itertools.count()
+
+    @classmethod
+    def from_env(cls):
+        """Factory method to create an AdmissionController from environment variables."""
+        return cls(default_queue_timeout_ms=float(os.getenv('ADMISSION_QUEUE_TIMEOUT_MS', 10000.0)))
+
+    def deadline(self, arrived_at: float, timeout_ms: Optional[float], queue_timeout_ms: Optional[float]) -> float:
+        """Monotonic time after which a request that arrived at arrived_at is no longer worth serving."""
+        timeout = queue_timeout_ms / 1000.0 if queue_timeout_ms else self.default_queue_timeout
+        if timeout_ms is not None:
+            timeout = min(timeout, timeout_ms / 1000.0)
+        return arrived_at + timeout
+
+    async def acquire(self, model_name: str, model_version: str, max_concurrency: int,
+                      max_queue_depth: Optional[int], priority: int, deadline: float):
+        """Wait for a slot to call the model; release() it afterwards. Raises AdmissionRejected."""
+        gate = self.gates.get((model_name, model_version))
+        if gate is None:
+            gate = self.gates[(model_name, model_version)] = ModelGate()
+        if gate.active < max_concurrency and not gate.queued:
+            gate.active += 1
+            gate.admitted += 1
+            return
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            gate.expired += 1
+            raise DeadlineExceeded(f"Request for {model_name}:{model_version} is already past its deadline")
+        max_queue_depth = max_concurrency if max_queue_depth is None else max_queue_depth
+        if gate.queued >= (max_queue_depth // 2 if priority >= LOW_PRIORITY else max_queue_depth):
+            victim = max((waiter for waiter in gate.waiters if not waiter[2].done()), default=None)
+            if victim is None or victim[0] <= priority or priority >= LOW_PRIORITY:
+                gate.rejected += 1
+                raise ModelSaturated(f"Model {model_name}:{model_version} is saturated")
+            gate.shed += 1
+            victim[2].set_exception(AdmissionRejected(
+                f"Request for {model_name}:{model_version} was shed for higher priority traffic"
+            ))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(gate.waiters, (priority, next(self.order), future))
+        gate.queued += 1
+        try:
+            await asyncio.wait_for(future, remaining)
+        except BaseException as e:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release(model_name, model_version)  # Granted just as we gave up, pass the slot on
+            if isinstance(e, asyncio.TimeoutError):
+                gate.expired += 1
+                raise DeadlineExceeded(f"Request for {model_name}:{model_version} expired in the queue")
+            raise
+        finally:
+            gate.queued -= 1
+        gate.admitted += 1
+
+    def try_acquire(self, model_name: str, model_version: str, max_concurrency: int) -> bool:
+        """Take a free slot without waiting, for extra calls made on behalf of an admitted request (hedges)."""
+        gate = self.gates.get((model_name, model_version))
+        if gate is None or gate.active >= max_concurrency or gate.queued:
+            return False
+        gate.active += 1
+        return True
+
+    def release(self, model_name: str, model_version: str):
+        gate = self.gates[(model_name, model_version)]
+        while gate.waiters:
+            _, _, future = heapq.heappop(gate.waiters)
+            if not future.done():
+                future.set_result(None)  # The slot moves straight to the waiter
+                return
+        gate.active -= 1
+
+    def forget(self, model_name: str, model_version: str):
+        gate = self.gates.get((model_name, model_version))
+        if gate is not None and not gate.active and not gate.queued:
+            del self.gates[(model_name, model_version)]
+
+    def stats(self) -> dict:
+        return {
+            f"{name}:{version}": {
+                "active": gate.active,
+                "queued": gate.queued,
+                "admitted": gate.admitted,
+                "rejected": gate.rejected,
+                "shed": gate.shed,
+                "expired": gate.expired,
+            }
+            for (name, version), gate in self.gates.items()
+        }
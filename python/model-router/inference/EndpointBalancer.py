@@ -0,0 +1,145 @@
+from typing import Callable, Collection, Dict, List, Optional, Tuple
+import os
+import random
+import time
+
+
+class PodEndpoint:
+    __slots__ = ("address", "outstanding", "failures", "ejections", "ejected_until", "removed")
+
+    def __init__(self, address: str):
+        self.address = address
+        self.outstanding = 0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.removed = False
+
+
+class EndpointBalancer:
+    """Balances inference requests across the ready pods of each model service.
+
+    Pod addresses come from the service's EndpointSlices (see MLDeployer.watch_endpoint_slices).
+    Each request goes to the less loaded of two randomly chosen pods (power of two choices over
+    outstanding requests), which with one or two pods is plain least-outstanding-requests. Pods
+    failing max_failures times in a row are ejected for an exponentially growing period; if every
+    pod is ejected they are all used again. Only used from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        max_failures: int = 3,
+        ejection_seconds: float = 5.0,
+        max_ejection_seconds: float = 60.0,
+        on_removed: Callable[[str], None] = None,
+    ):
+        self.max_failures = max(max_failures, 1)
+        self.ejection_seconds = ejection_seconds
+        self.max_ejection_seconds = max_ejection_seconds
+        self.on_removed = on_removed  # Called with a pod address once it is gone and has no requests left
+        self.slices: Dict[str, Dict[str, List[str]]] = {}
+        self.pods: Dict[str, Dict[str, PodEndpoint]] = {}
+        self.choices: Dict[str, List[PodEndpoint]] = {}
+
+    @classmethod
+    def from_env(cls, on_removed: Callable[[str], None] = None):
+        """Factory method to create an EndpointBalancer from environment variables."""
+        return cls(
+            max_failures=int(os.getenv('BALANCER_MAX_FAILURES', 3)),
+            ejection_seconds=float(os.getenv('BALANCER_EJECTION_SECONDS', 5.0)),
+            max_ejection_seconds=float(os.getenv('BALANCER_MAX_EJECTION_SECONDS', 60.0)),
+            on_removed=on_removed,
+        )
+
+    def sync(self, slices: Dict[Tuple[str, str], List[str]]):
+        """Replace all known endpoints with a full {(service, slice): addresses} listing."""
+        services = set(self.slices)
+        self.slices = {}
+        for (service_name, slice_name), addresses in slices.items():
+            self.slices.setdefault(service_name, {})[slice_name] = addresses
+        for service_name in services | set(self.slices):
+            self.rebuild(service_name)
+
+    def update(self, service_name: str, slice_name: str, addresses: Optional[List[str]]):
+        """Apply one EndpointSlice change; addresses is None when the slice was deleted."""
+        slices = self.slices.setdefault(service_name, {})
+        if addresses is None:
+            slices.pop(slice_name, None)
+        else:
+            slices[slice_name] = addresses
+        if not slices:
+            del self.slices[service_name]
+        self.rebuild(service_name)
+
+    def rebuild(self, service_name: str):
+        # Pods that stay keep their outstanding counts and ejection state
+        addresses = {address for addresses in self.slices.get(service_name, {}).values() for address in addresses}
+        current = self.pods.pop(service_name, {})
+        pods = {address: current.pop(address, None) or PodEndpoint(address) for address in sorted(addresses)}
+        for pod in current.values():
+            pod.removed = True
+            if pod.outstanding == 0:
+                self.removed(pod)
+        if pods:
+            self.pods[service_name] = pods
+            self.choices[service_name] = list(pods.values())
+        else:
+            self.choices.pop(service_name, None)
+
+    def removed(self, pod: PodEndpoint):
+        if self.on_removed is not None:
+            self.on_removed(pod.address)
+
+    def acquire(self, service_name: str, avoid: Collection[str] = ()) -> Optional[PodEndpoint]:
+        """Pick a pod for one request, or None if the service's endpoints are unknown.
+
+        Pods whose address is in `avoid` (e.g. already tried for a retry or hedge) are only picked
+        when there is no other.
+        """
+        pods = self.choices.get(service_name)
+        if not pods:
+            return None
+        if avoid:
+            pods = [pod for pod in pods if pod.address not in avoid] or pods
+        if len(pods) > 1:
+            now = time.monotonic()
+            pods = [pod for pod in pods if pod.ejected_until <= now] or pods
+        if len(pods) == 1:
+            pod = pods[0]
+        else:
+            first, second = random.sample(pods, 2)
+            pod = first if first.outstanding <= second.outstanding else second
+        pod.outstanding += 1
+        return pod
+
+    def release(self, pod: PodEndpoint, failed: bool):
+        pod.outstanding -= 1
+        if pod.removed:
+            if pod.outstanding == 0:
+                self.removed(pod)
+            return
+        now = time.monotonic()
+        if not failed:
+            pod.failures = 0
+            if pod.ejected_until <= now:
+                pod.ejections = 0
+            return
+        if pod.ejected_until > now:
+            return  # Requests sent before the ejection do not extend it
+        pod.failures += 1
+        if pod.failures >= self.max_failures:
+            pod.failures = 0
+            pod.ejections += 1
+            seconds = min(self.ejection_seconds * 2 ** (pod.ejections - 1), self.max_ejection_seconds)
+            pod.ejected_until = now + seconds
+            print(f"Ejected pod {pod.address} for {seconds}s after {self.max_failures} consecutive failures")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            service_name: [
+                {"address": pod.address, "outstanding": pod.outstanding, "ejected": pod.ejected_until > now}
+                for pod in pods.values()
+            ]
+            for service_name, pods in self.pods.items()
+        }
@@ -0,0 +1,203 @@
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Tuple
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from websockets.client import connect as connect_websocket
+from websockets.exceptions import ConnectionClosed
+import asyncio
+import httpx
+import os
+
+# Headers that only make sense for a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = frozenset({
+    b"connection",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"te",
+    b"trailer",
+    b"transfer-encoding",
+    b"upgrade",
+    b"host",
+    b"content-length",
+})
+# Negotiated separately for the upstream WebSocket connection
+WEBSOCKET_HEADERS = frozenset({
+    b"sec-websocket-key",
+    b"sec-websocket-version",
+    b"sec-websocket-extensions",
+    b"sec-websocket-protocol",
+})
+
+
+class InferenceProxy:
+    """Forwards inference requests to model services over long-lived pooled connections.
+
+    One httpx.AsyncClient is kept per model service so every prediction reuses an
+    already open keep-alive (or HTTP/2) connection instead of paying for a new TCP handshake.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        http2: bool = False,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    @classmethod
+    def from_env(cls):
+        """Factory method to create an InferenceProxy from environment variables."""
+        return cls(
+            max_connections=int(os.getenv('PROXY_MAX_CONNECTIONS', 100)),
+            max_keepalive_connections=int(os.getenv('PROXY_MAX_KEEPALIVE_CONNECTIONS', 20)),
+            keepalive_expiry=float(os.getenv('PROXY_KEEPALIVE_EXPIRY', 60.0)),
+            timeout=float(os.getenv('PROXY_TIMEOUT', 30.0)),
+            connect_timeout=float(os.getenv('PROXY_CONNECT_TIMEOUT', 5.0)),
+            http2=os.getenv('PROXY_HTTP2', 'false').lower() in ('1', 'true', 'yes'),
+        )
+
+    def client_for(self, service_name: str, port: int) -> httpx.AsyncClient:
+        key = f"{service_name}:{port}"
+        client = self.clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=f"http://{key}",
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+            self.clients[key] = client
+        return client
+
+    async def forward(
+        self,
+        service_name: str,
+        port: int,
+        endpoint: Optional[str],
+        body: bytes,
+        headers: Iterable[Tuple[bytes, bytes]],
+    ) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+        """POST the raw request body to the model service and return the raw upstream response.
+
+        Neither the request nor the response body is decoded, so compressed payloads are
+        passed through untouched together with their Content-Encoding header.
+        """
+        client = self.client_for(service_name, port)
+        request = client.build_request(
+            "POST",
+            endpoint or "/",
+            content=body,
+            headers=filter_headers(headers),
+        )
+        response = await client.send(request, stream=True)
+        try:
+            content = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        return response.status_code, filter_headers(response.headers.raw), content
+
+    async def open_stream(
+        self,
+        service_name: str,
+        port: int,
+        endpoint: Optional[str],
+        body: AsyncIterable[bytes],
+        headers: Iterable[Tuple[bytes, bytes]],
+    ) -> httpx.Response:
+        """POST the request body to the model service while it is still arriving and return the response unread.
+
+        Chunks are pulled from `body` only as fast as the upstream connection takes them, and the
+        caller reads the response with aiter_raw() at the pace of its own client, so backpressure
+        reaches both ends and memory per request stays at a chunk. The caller must aclose() it.
+        """
+        headers = list(headers)
+        # Keep the client's Content-Length so a fixed-size body is not re-sent with chunked encoding
+        content_length = [(key, value) for key, value in headers if key.lower() == b"content-length"]
+        client = self.client_for(service_name, port)
+        request = client.build_request(
+            "POST",
+            endpoint or "/",
+            content=body,
+            headers=filter_headers(headers) + content_length,
+        )
+        return await client.send(request, stream=True)
+
+    async def relay_websocket(
+        self,
+        websocket: WebSocket,
+        service_name: str,
+        port: int,
+        endpoint: Optional[str],
+    ):
+        """Connect to the model service's WebSocket, accept the client's and pass messages both ways until either side closes."""
+        headers = [
+            (key.decode("latin-1"), value.decode("latin-1"))
+            for key, value in filter_headers(websocket.headers.raw)
+            if key.lower() not in WEBSOCKET_HEADERS
+        ]
+        async with connect_websocket(
+            f"ws://{service_name}:{port}{endpoint or '/'}",
+            extra_headers=headers,
+            subprotocols=websocket.scope.get("subprotocols") or None,
+            open_timeout=self.timeout.connect,
+            max_size=None,  # Size limits are up to the model server
+            compression=None,  # Frames are passed through, not re-compressed
+        ) as upstream:
+            await websocket.accept(subprotocol=upstream.subprotocol)
+
+            async def to_client():
+                async for message in upstream:
+                    if isinstance(message, bytes):
+                        await websocket.send_bytes(message)
+                    else:
+                        await websocket.send_text(message)
+
+            async def to_model():
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        return
+                    await upstream.send(message["bytes"] if message.get("bytes") is not None else message["text"])
+
+            model_side, client_side = asyncio.ensure_future(to_client()), asyncio.ensure_future(to_model())
+            try:
+                done, _ = await asyncio.wait((model_side, client_side), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                model_side.cancel()
+                client_side.cancel()
+                await asyncio.gather(model_side, client_side, return_exceptions=True)
+            for task in done:
+                if task.exception() is not None and not isinstance(task.exception(), (ConnectionClosed, WebSocketDisconnect)):
+                    raise task.exception()
+            if model_side in done and client_side not in done:
+                # The model hung up first, pass its close code on (1005/1006 are never sent on the wire)
+                code = upstream.close_code if upstream.close_code not in (None, 1005, 1006) else 1011
+                await websocket.close(code=code, reason=upstream.close_reason or "")
+
+    async def close_client(self, service_name: str, port: int):
+        client = self.clients.pop(f"{service_name}:{port}", None)
+        if client is not None:
+            await client.aclose()
+
+    async def close_host(self, host: str):
+        """Close the clients for every port of a host, e.g. a pod that went away."""
+        for key in [key for key in self.clients if key.rpartition(":")[0] == host]:
+            await self.clients.pop(key).aclose()
+
+    async def aclose(self):
+        clients, self.clients = self.clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+def filter_headers(headers: Iterable[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    return [(key, value) for key, value in headers if key.lower() not in HOP_BY_HOP_HEADERS]
@@ -0,0 +1,112 @@
+from typing import Dict, Optional, Tuple
+import time
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from monitoring.Metrics import INFLIGHT_METRIC, REQUESTS_METRIC, RPS_METRIC
+# Latest request latencies kept per model for window_counts
+LATENCY_SAMPLES = 512
+
+
+class ModelLoad:
+    __slots__ = ("in_flight", "total", "counts", "errors", "seconds", "latencies", "latency_seconds", "next_latency")
+
+    def __init__(self, window: int):
+        self.in_flight = 0
+        self.total = 0
+        self.counts = [0] * window
+        self.errors = [0] * window
+        self.seconds = [0] * window
+        self.latencies = [0.0] * LATENCY_SAMPLES
+        self.latency_seconds = [0] * LATENCY_SAMPLES  # Second each latency was recorded in
+        self.next_latency = 0
+
+    def slot(self) -> int:
+        """Index of the current second's bucket, cleared when it last held an older second."""
+        second = int(time.monotonic())
+        slot = second % len(self.counts)
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = 0
+            self.errors[slot] = 0
+        return slot
+
+
+class LoadTracker:
+    """Per-model in-flight request counts and request rates, exported as Prometheus metrics.
+
+    The request path only does a few integer updates; RPS over the sliding window is computed
+    when /metrics is scraped. Registered as a custom collector on the Prometheus registry.
+    Requests finished with their latency also feed window_counts (latencies and errors).
+    """
+
+    def __init__(self, window_seconds: int = 10):
+        self.window = window_seconds
+        self.models: Dict[Tuple[str, str], ModelLoad] = {}
+
+    def start(self, model_name: str, model_version: str) -> ModelLoad:
+        load = self.models.get((model_name, model_version))
+        if load is None:
+            load = self.models[(model_name, model_version)] = ModelLoad(self.window)
+        load.counts[load.slot()] += 1
+        load.in_flight += 1
+        load.total += 1
+        return load
+
+    @staticmethod
+    def finish(load: ModelLoad, seconds: Optional[float] = None, failed: bool = False):
+        load.in_flight -= 1
+        if failed:
+            load.errors[load.slot()] += 1
+        if seconds is not None:
+            load.latencies[load.next_latency] = seconds
+            load.latency_seconds[load.next_latency] = int(time.monotonic())
+            load.next_latency = (load.next_latency + 1) % LATENCY_SAMPLES
+
+    def rps(self, load: ModelLoad) -> float:
+        now = int(time.monotonic())
+        return sum(
+            count for count, second in zip(load.counts, load.seconds) if now - second < self.window
+        ) / self.window
+
+    def window_counts(self, model_name: str, model_version: str) -> Optional[dict]:
+        """Request rate, errors and latencies of a model over the window, None if it got no requests.
+
+        Plain counts and samples rather than ratios or percentiles, so the numbers of several
+        router replicas can be merged (see FleetStats).
+        """
+        load = self.models.get((model_name, model_version))
+        if load is None:
+            return None
+        now = int(time.monotonic())
+        requests = errors = 0
+        for count, error_count, second in zip(load.counts, load.errors, load.seconds):
+            if now - second < self.window:
+                requests += count
+                errors += error_count
+        return {
+            "rps": requests / self.window,
+            "in_flight": load.in_flight,
+            "requests": load.total,
+            "window_requests": requests,
+            "window_errors": min(errors, requests),
+            "latencies": [
+                latency for latency, second in zip(load.latencies, load.latency_seconds) if second and now - second < self.window
+            ],
+        }
+
+    def forget(self, model_name: str, model_version: str):
+        self.models.pop((model_name, model_version), None)
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        in_flight = GaugeMetricFamily(INFLIGHT_METRIC, "Requests currently being served per model", labels=["model", "version"])
+        rps = GaugeMetricFamily(RPS_METRIC, f"Request rate per model over the last {self.window}s", labels=["model", "version"])
+        total = CounterMetricFamily(REQUESTS_METRIC, "Inference requests received per model", labels=["model", "version"])
+        for (model_name, model_version), load in list(self.models.items()):
+            in_flight.add_metric([model_name, model_version], load.in_flight)
+            rps.add_metric([model_name, model_version], self.rps(load))
+            total.add_metric([model_name, model_version], load.total)
+        yield in_flight
+        yield rps
+        yield total
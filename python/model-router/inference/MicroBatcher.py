@@ -0,0 +1,94 @@
+from typing import Awaitable, Callable, List, Optional, Tuple
+import asyncio
+import orjson
+
+# (status_code, raw headers, raw body) as returned by InferenceProxy.forward
+UpstreamResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+JSON_HEADERS = [(b"content-type", b"application/json")]
+
+
+class MicroBatcher:
+    """Coalesces concurrent inference requests for one model version into a single upstream call.
+
+    Requests are buffered until max_batch_size of them are waiting or the oldest has waited
+    max_wait_ms. The request bodies are concatenated into a JSON array without being re-encoded,
+    and the JSON array returned by the model is split back out to the individual callers.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytes], Awaitable[UpstreamResponse]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        on_queued: Callable[[float], None] = None,
+    ):
+        self.send = send
+        self.on_queued = on_queued  # Called with each request's seconds spent waiting for its batch
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max(max_wait_ms or 0.0, 0.0) / 1000.0
+        self.pending: List[Tuple[bytes, asyncio.Future, float]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.in_flight = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, body: bytes) -> UpstreamResponse:
+        orjson.loads(body)  # Reject invalid JSON here so it cannot fail the whole batch
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((body, future, loop.time()))
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif len(self.pending) == 1:
+            self.timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        batch = [(body, future, queued_at) for body, future, queued_at in batch if not future.cancelled()]
+        if not batch:
+            return
+        if self.on_queued is not None:
+            now = asyncio.get_running_loop().time()
+            for _, _, queued_at in batch:
+                self.on_queued(now - queued_at)
+        task = asyncio.get_running_loop().create_task(self.dispatch(batch))
+        self.in_flight.add(task)
+        task.add_done_callback(self.in_flight.discard)
+
+    async def dispatch(self, batch: List[Tuple[bytes, asyncio.Future, float]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            status_code, headers, content = await self.send(b"[" + b",".join(body for body, _, _ in batch) + b"]")
+            if status_code >= 300:
+                # Pass upstream errors through unchanged to every caller of the batch
+                results = [(status_code, headers, content)] * len(batch)
+            else:
+                try:
+                    predictions = orjson.loads(content)
+                except orjson.JSONDecodeError as e:
+                    # A plain ValueError, so callers do not mistake it for an invalid request body
+                    raise ValueError(f"Batched model returned invalid JSON: {e}") from None
+                if not isinstance(predictions, list) or len(predictions) != len(batch):
+                    raise ValueError(
+                        f"Batched model returned {type(predictions).__name__} for a batch of {len(batch)}; "
+                        "expected a JSON array of the same length"
+                    )
+                results = [(status_code, JSON_HEADERS, orjson.dumps(prediction)) for prediction in predictions]
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
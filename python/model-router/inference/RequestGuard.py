@@ -0,0 +1,331 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import os
+import time
+import httpx
+from inference.MicroBatcher import UpstreamResponse
+from inference.RouteTable import Route
+from monitoring.Metrics import MODEL_RESILIENCE_EVENTS
+
+# Upstream statuses worth another attempt on a different pod
+RETRIABLE_STATUSES = frozenset({502, 503, 504})
+
+
+class CircuitOpen(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LatencyWindow:
+    """The last `size` upstream latencies of a model, with a cached percentile."""
+    __slots__ = ("samples", "next", "count", "cached", "cached_at")
+
+    def __init__(self, size: int = 1000):
+        self.samples: List[float] = [0.0] * size
+        self.next = 0
+        self.count = 0
+        self.cached: Dict[float, float] = {}
+        self.cached_at = 0
+
+    def record(self, seconds: float):
+        self.samples[self.next] = seconds
+        self.next = (self.next + 1) % len(self.samples)
+        self.count += 1
+
+    def percentile(self, percent: float) -> float:
+        # Sorting is only redone every 100 samples, the percentile moves slowly anyway
+        if self.count - self.cached_at >= 100:
+            self.cached = {}
+        if percent not in self.cached:
+            samples = sorted(self.samples[:min(self.count, len(self.samples))])
+            self.cached[percent] = samples[min(int(len(samples) * percent / 100), len(samples) - 1)]
+            self.cached_at = self.count
+        return self.cached[percent]
+
+
+class RetryBudget:
+    """Token bucket shared by retries and hedges: every request adds percent/100 of a token, each extra attempt takes one."""
+    __slots__ = ("tokens", "burst")
+
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.burst = burst
+
+    def deposit(self, percent: float):
+        self.tokens = min(self.tokens + percent / 100, self.burst)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """Opens when the error rate over the last window_seconds reaches a threshold, then lets single probes through.
+
+    allow() hands out the breaker's generation as a token, which moves on whenever the breaker
+    changes state, so outcomes of requests admitted before a change are not counted and only
+    the probe decides whether a half open breaker closes.
+    """
+    __slots__ = ("window", "counts", "seconds", "opened_until", "generation", "probing", "trips")
+
+    def __init__(self, window_seconds: int):
+        self.window = window_seconds
+        self.counts = [[0, 0] for _ in range(window_seconds)]  # [requests, errors] per second
+        self.seconds = [0] * window_seconds
+        self.opened_until = 0.0
+        self.generation = 0
+        self.probing = 0  # Token of the outstanding probe, 0 when there is none
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if not self.opened_until:
+            return "closed"
+        return "open" if time.monotonic() < self.opened_until else "half_open"
+
+    def allow(self) -> Optional[int]:
+        """Token to record() the request's outcome with, or None when it is rejected."""
+        if not self.opened_until:
+            return self.generation
+        if time.monotonic() < self.opened_until or self.probing:
+            return None
+        self.generation += 1
+        self.probing = self.generation  # Half open: one request finds out whether the model recovered
+        return self.probing
+
+    def release(self, token: int):
+        """Give up a token without an outcome."""
+        if token == self.probing:
+            self.probing = 0  # Let the next request probe instead
+
+    def record(self, token: int, failed: bool, error_rate: float, min_requests: int, open_seconds: float) -> bool:
+        """Count one outcome; returns True when it trips the breaker."""
+        if token != self.generation:
+            return False  # Admitted before the breaker last changed state
+        now = time.monotonic()
+        if self.opened_until:
+            self.probing = 0
+            self.generation += 1
+            if failed:
+                self.opened_until = now + open_seconds
+                return False
+            self.opened_until = 0.0
+            self.counts = [[0, 0] for _ in range(self.window)]
+            return False
+        second = int(now)
+        slot = second % self.window
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = [0, 0]
+        self.counts[slot][0] += 1
+        if not failed:
+            return False
+        self.counts[slot][1] += 1
+        requests = errors = 0
+        for (slot_requests, slot_errors), slot_second in zip(self.counts, self.seconds):
+            if second - slot_second < self.window:
+                requests += slot_requests
+                errors += slot_errors
+        if requests >= min_requests and errors >= error_rate * requests:
+            self.opened_until = now + open_seconds
+            self.generation += 1
+            self.trips += 1
+            return True
+        return False
+
+
+class ModelGuard:
+    __slots__ = ("latency", "budget", "breaker", "events")
+
+    def __init__(self, budget_burst: float, window_seconds: int):
+        self.latency = LatencyWindow()
+        self.budget = RetryBudget(budget_burst)
+        self.breaker = CircuitBreaker(window_seconds)
+        self.events: Dict[str, int] = {}
+
+
+class RequestGuard:
+    """Per-model tail latency protection around forwarding a request: hedging, retries and a circuit breaker.
+
+    Each is enabled by its MLModel field. A hedge sends a second copy to another pod once the
+    first has been outstanding longer than the model's hedge_percentile latency and the first
+    answer wins, as long as it can take a concurrency slot of its own. Failed attempts (connection errors, timeouts, 502/503/504) are retried on
+    another pod up to max_retries times. Hedges and retries both draw on a retry budget refilled
+    by retry_budget_percent of the requests, so extra load stays bounded when a model is
+    struggling. The breaker fails requests fast for breaker_open_seconds once the error rate
+    (connection errors, timeouts and 5xx answers) over the last window reaches breaker_error_rate. Only used from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        window_seconds: int = 10,
+        breaker_min_requests: int = 20,
+        hedge_min_samples: int = 50,
+        budget_burst: float = 10.0,
+    ):
+        self.window_seconds = window_seconds
+        self.breaker_min_requests = breaker_min_requests
+        self.hedge_min_samples = hedge_min_samples
+        self.budget_burst = budget_burst
+        self.guards: Dict[Tuple[str, str], ModelGuard] = {}
+
+    @classmethod
+    def from_env(cls):
+        """Factory method to create a RequestGuard from environment variables."""
+        return cls(
+            window_seconds=int(os.getenv('BREAKER_WINDOW_SECONDS', 10)),
+            breaker_min_requests=int(os.getenv('BREAKER_MIN_REQUESTS', 20)),
+            hedge_min_samples=int(os.getenv('HEDGE_MIN_SAMPLES', 50)),
+            budget_burst=float(os.getenv('RETRY_BUDGET_BURST', 10.0)),
+        )
+
+    @staticmethod
+    def enabled(route: Route) -> bool:
+        return bool(route.hedge_percentile or route.max_retries or route.breaker_error_rate)
+
+    def event(self, guard: ModelGuard, model_name: str, model_version: str, event: str):
+        guard.events[event] = guard.events.get(event, 0) + 1
+        MODEL_RESILIENCE_EVENTS.labels(model_name, model_version, event).inc()
+
+    async def send(
+        self,
+        model_name: str,
+        model_version: str,
+        route: Route,
+        attempt: Callable[[Set[str]], Awaitable[UpstreamResponse]],
+        acquire_slot: Optional[Callable[[], bool]] = None,
+        release_slot: Optional[Callable[[], None]] = None,
+    ) -> UpstreamResponse:
+        """Run attempt(tried) under the route's policies; attempt adds the pod it used to `tried`.
+
+        With a concurrency limit, a hedge is only sent when acquire_slot() takes a free slot
+        without waiting, and release_slot() is called once it finished. Raises CircuitOpen while
+        the breaker is open, otherwise returns or raises what the last attempt did.
+        """
+        key = (model_name, model_version)
+        guard = self.guards.get(key)
+        if guard is None:
+            guard = self.guards[key] = ModelGuard(self.budget_burst, self.window_seconds)
+        token = guard.breaker.allow() if route.breaker_error_rate else None
+        if route.breaker_error_rate and token is None:
+            self.event(guard, model_name, model_version, "breaker_rejected")
+            retry_after = max(guard.breaker.opened_until - time.monotonic(), 1.0)
+            raise CircuitOpen(f"Circuit breaker for {model_name}:{model_version} is open", retry_after)
+        guard.budget.deposit(route.retry_budget_percent if route.retry_budget_percent is not None else 10.0)
+
+        tried: Set[str] = set()
+        retries_left = route.max_retries or 0
+        failed = None
+        try:
+            while True:
+                failed = True
+                try:
+                    response = await self.hedged(guard, model_name, model_version, route, attempt, tried,
+                                                 acquire_slot, release_slot)
+                except httpx.TransportError:
+                    if not (retries_left and self.retry(guard, model_name, model_version)):
+                        raise
+                else:
+                    failed = response[0] >= 500  # Any server error counts against the breaker
+                    if not (response[0] in RETRIABLE_STATUSES and retries_left
+                            and self.retry(guard, model_name, model_version)):
+                        return response
+                retries_left -= 1
+        except asyncio.CancelledError:
+            failed = None  # The caller went away, that says nothing about the model
+            raise
+        finally:
+            if route.breaker_error_rate:
+                self.record(guard, model_name, model_version, route, token, failed)
+
+    def retry(self, guard: ModelGuard, model_name: str, model_version: str) -> bool:
+        if not guard.budget.withdraw():
+            self.event(guard, model_name, model_version, "budget_exhausted")
+            return False
+        self.event(guard, model_name, model_version, "retry")
+        return True
+
+    def record(self, guard: ModelGuard, model_name: str, model_version: str, route: Route, token: int,
+               failed: Optional[bool]):
+        if failed is None:
+            guard.breaker.release(token)
+        elif guard.breaker.record(token, failed, route.breaker_error_rate, self.breaker_min_requests,
+                                  route.breaker_open_seconds or 30.0):
+            self.event(guard, model_name, model_version, "breaker_trip")
+            print(f"Circuit breaker for {model_name}:{model_version} opened")
+
+    async def timed_attempt(self, guard: ModelGuard, attempt: Callable[[Set[str]], Awaitable[UpstreamResponse]],
+                            tried: Set[str]) -> UpstreamResponse:
+        started = time.perf_counter()
+        try:
+            response = await attempt(tried)
+        except asyncio.CancelledError:
+            # A hedged attempt that lost; how long it was outstanding still belongs in the tail
+            guard.latency.record(time.perf_counter() - started)
+            raise
+        if response[0] not in RETRIABLE_STATUSES:
+            guard.latency.record(time.perf_counter() - started)
+        return response
+
+    async def hedged(self, guard: ModelGuard, model_name: str, model_version: str, route: Route,
+                     attempt: Callable[[Set[str]], Awaitable[UpstreamResponse]], tried: Set[str],
+                     acquire_slot: Optional[Callable[[], bool]], release_slot: Optional[Callable[[], None]],
+                     ) -> UpstreamResponse:
+        if not route.hedge_percentile or guard.latency.count < self.hedge_min_samples:
+            return await self.timed_attempt(guard, attempt, tried)
+
+        delay = guard.latency.percentile(route.hedge_percentile)
+        first = asyncio.ensure_future(self.timed_attempt(guard, attempt, tried))
+        try:
+            done, _ = await asyncio.wait((first,), timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done:
+            return await first
+        if acquire_slot is not None and not acquire_slot():
+            self.event(guard, model_name, model_version, "hedge_no_slot")
+            return await first
+        if not guard.budget.withdraw():
+            if release_slot is not None:
+                release_slot()
+            return await first
+        self.event(guard, model_name, model_version, "hedge")
+        second = asyncio.ensure_future(self.timed_attempt(guard, attempt, tried))
+        if release_slot is not None:
+            second.add_done_callback(lambda _: release_slot())
+        pending = {first, second}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                usable = [task for task in done
+                          if task.exception() is None and task.result()[0] not in RETRIABLE_STATUSES]
+                if usable:
+                    if usable[0] is second:
+                        self.event(guard, model_name, model_version, "hedge_won")
+                    return usable[0].result()
+                if not pending:
+                    return (second if second in done else first).result()  # Both failed, the retry loop decides
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def forget(self, model_name: str, model_version: str):
+        self.guards.pop((model_name, model_version), None)
+
+    def stats(self) -> dict:
+        return {
+            f"{name}:{version}": {
+                "breaker": guard.breaker.state,
+                "breaker_trips": guard.breaker.trips,
+                "retry_tokens": round(guard.budget.tokens, 2),
+                "latency_samples": min(guard.latency.count, len(guard.latency.samples)),
+                **guard.events,
+            }
+            for (name, version), guard in self.guards.items()
+        }
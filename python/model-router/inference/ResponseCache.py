@@ -0,0 +1,175 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import os
+import time
+from inference.MicroBatcher import UpstreamResponse
+
+# Rough per-entry bookkeeping cost on top of the cached bytes
+ENTRY_OVERHEAD_BYTES = 200
+
+
+@dataclass
+class CacheEntry:
+    model: Tuple[str, str]
+    expires_at: float
+    response: UpstreamResponse
+    size: int
+
+
+class ResponseCache:
+    """Content-addressed cache of inference responses, keyed by a hash of (name, version, request body).
+
+    Eviction is LRU bounded by the total size of the cached responses, each entry also expires
+    after its model's TTL, and concurrent identical misses share a single upstream call. Only
+    used from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[bytes, CacheEntry]" = OrderedDict()
+        self.keys_by_model: Dict[Tuple[str, str], Set[bytes]] = {}
+        self.generations: Dict[Tuple[str, str], int] = {}
+        self.epoch = 0  # Bumped by clear(); together with generations it detects invalidation of in-flight fetches
+        self.in_flight: Dict[bytes, asyncio.Task] = {}
+        self.lookups_by_model: Dict[Tuple[str, str], List[int]] = {}  # [hits, misses], coalesced count as hits
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        """Factory method to create a ResponseCache from environment variables."""
+        return cls(max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+
+    @staticmethod
+    def key(model_name: str, model_version: str, body: bytes) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(model_name.encode())
+        digest.update(b"\0")
+        digest.update(model_version.encode())
+        digest.update(b"\0")
+        digest.update(body)
+        return digest.digest()
+
+    async def get_or_fetch(
+        self,
+        model_name: str,
+        model_version: str,
+        body: bytes,
+        ttl: float,
+        fetch: Callable[[], Awaitable[UpstreamResponse]],
+    ) -> UpstreamResponse:
+        key = self.key(model_name, model_version, body)
+        model = (model_name, model_version)
+        lookups = self.lookups_by_model.get(model)
+        if lookups is None:
+            lookups = self.lookups_by_model[model] = [0, 0]
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                lookups[0] += 1
+                return entry.response
+            self.remove(key)
+
+        task = self.in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            lookups[1] += 1
+            generation = (self.epoch, self.generations.get(model, 0))
+            # The fetch runs as its own task so a disconnecting caller cannot cancel it for the others
+            task = asyncio.get_running_loop().create_task(fetch())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self.on_fetched(key, model, generation, ttl, done))
+        else:
+            self.coalesced += 1
+            lookups[0] += 1
+        return await asyncio.shield(task)
+
+    def on_fetched(self, key: bytes, model: Tuple[str, str], generation: Tuple[int, int], ttl: float,
+                   task: asyncio.Task):
+        self.in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if (self.epoch, self.generations.get(model, 0)) != generation:
+            return  # The model was invalidated while the request was in flight
+        response = task.result()
+        status_code, headers, content = response
+        if not 200 <= status_code < 300:
+            return
+        size = len(content) + sum(len(name) + len(value) for name, value in headers) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        self.remove(key)
+        self.entries[key] = CacheEntry(model, time.monotonic() + ttl, response, size)
+        self.keys_by_model.setdefault(model, set()).add(key)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key: bytes):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        keys = self.keys_by_model.get(entry.model)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_model[entry.model]
+
+    def invalidate_model(self, model_name: str, model_version: str):
+        model = (model_name, model_version)
+        self.generations[model] = self.generations.get(model, 0) + 1
+        self.lookups_by_model.pop(model, None)
+        for key in list(self.keys_by_model.get(model, ())):
+            self.remove(key)
+
+    def clear(self):
+        self.epoch += 1
+        self.entries.clear()
+        self.keys_by_model.clear()
+        self.lookups_by_model.clear()
+        self.bytes = 0
+
+    def on_change(self, change: Optional[Tuple[str, str]]):
+        """Same contract as RouteTable.on_change; must be called on the event loop thread."""
+        if change is None:
+            self.clear()
+        else:
+            self.invalidate_model(*change)
+
+    def model_stats(self, model_name: str, model_version: str) -> Optional[dict]:
+        """Lookups of one model since it was last changed, None if it had none."""
+        model = (model_name, model_version)
+        lookups = self.lookups_by_model.get(model)
+        if lookups is None:
+            return None
+        hits, misses = lookups
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": len(self.keys_by_model.get(model, ())),
+        }
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "models": len(self.keys_by_model),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
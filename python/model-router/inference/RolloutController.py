@@ -0,0 +1,137 @@
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import os
+import time
+from models.TrafficSplit import Rollout, TrafficSplit
+
+
+class VersionWindow:
+    __slots__ = ("requests", "errors", "seconds")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "avg_seconds": self.seconds / self.requests if self.requests else 0.0,
+        }
+
+
+class RolloutController:
+    """Drives progressive rollouts from the latency and error rate this router observes.
+
+    For every model with a rollout, requests served since its weights last changed are counted
+    per version (shadow requests included, so a candidate can be judged before it takes real
+    traffic). Once a step has lasted step_seconds and the candidate served min_requests, the
+    candidate either gains step_percent of the traffic or is rolled back if its error rate or
+    its mean latency relative to the other versions is out of bounds. Steps are conditional
+    updates in Postgres, so with several router replicas only one of them advances each step.
+    """
+
+    def __init__(
+        self,
+        load_rollouts: Callable[[], Awaitable[List[Tuple[str, TrafficSplit]]]],
+        advance: Callable[[str, datetime, Dict[str, float], Optional[Rollout], Optional[str]], Awaitable[bool]],
+        interval: float = 5.0,
+    ):
+        self.load_rollouts = load_rollouts
+        self.advance = advance
+        self.interval = interval
+        # Model name -> (updated_at of the step being measured, version -> window)
+        self.windows: Dict[str, Tuple[datetime, Dict[str, VersionWindow]]] = {}
+        self.task = None
+
+    @classmethod
+    def from_env(cls, load_rollouts, advance):
+        """Factory method to create a RolloutController from environment variables."""
+        return cls(load_rollouts, advance, interval=float(os.getenv('ROLLOUT_EVAL_INTERVAL', 5.0)))
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def record(self, model_name: str, model_version: str, seconds: float, failed: bool):
+        tracked = self.windows.get(model_name)
+        if tracked is None:
+            return  # Only models with a rollout in progress are measured
+        window = tracked[1].get(model_version)
+        if window is None:
+            window = tracked[1][model_version] = VersionWindow()
+        window.requests += 1
+        window.seconds += seconds
+        if failed:
+            window.errors += 1
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.evaluate()
+            except Exception as e:
+                print(f"Exception when evaluating rollouts: {e}")
+
+    async def evaluate(self):
+        rollouts = await self.load_rollouts()
+        for model_name in set(self.windows) - {model_name for model_name, _ in rollouts}:
+            del self.windows[model_name]
+        for model_name, split in rollouts:
+            tracked = self.windows.get(model_name)
+            if tracked is None or tracked[0] != split.updated_at:
+                self.windows[model_name] = (split.updated_at, {})  # A new step starts with a fresh window
+                continue
+            if time.time() - split.updated_at.timestamp() < split.rollout.step_seconds:
+                continue
+            step = self.next_step(split, tracked[1])
+            if step is None:
+                continue
+            weights, rollout, outcome = step
+            shadow_version = split.shadow_version
+            if rollout is None and shadow_version == split.rollout.candidate:
+                shadow_version = None  # Stop shadowing the candidate once its rollout is over
+            if await self.advance(model_name, split.updated_at, weights, rollout, shadow_version):
+                print(f"Rollout of {model_name}:{split.rollout.candidate} {outcome}, weights are now {weights}")
+
+    @staticmethod
+    def next_step(split: TrafficSplit, windows: Dict[str, VersionWindow]) -> Optional[Tuple[Dict[str, float], Optional[Rollout], str]]:
+        """(weights, rollout, outcome) to move to, or None while there is not enough traffic to decide."""
+        rollout = split.rollout
+        candidate = windows.get(rollout.candidate)
+        if candidate is None or candidate.requests < rollout.min_requests:
+            return None
+        baseline_requests = sum(window.requests for version, window in windows.items() if version != rollout.candidate)
+        baseline_seconds = sum(window.seconds for version, window in windows.items() if version != rollout.candidate)
+        others = {version: weight for version, weight in split.weights.items() if version != rollout.candidate and weight > 0}
+
+        latency = candidate.seconds / candidate.requests
+        baseline_latency = baseline_seconds / baseline_requests if baseline_requests else None
+        if candidate.errors / candidate.requests > rollout.max_error_rate or (
+            baseline_latency and latency > baseline_latency * rollout.max_latency_ratio
+        ):
+            return others, None, "rolled back"
+
+        share = split.weights.get(rollout.candidate, 0.0) / sum(split.weights.values()) * 100.0
+        share = min(share + rollout.step_percent, 100.0)
+        if share >= 100.0:
+            return {rollout.candidate: 100.0}, None, "completed"
+        others_total = sum(others.values())
+        weights = {version: weight / others_total * (100.0 - share) for version, weight in others.items()}
+        weights[rollout.candidate] = share
+        return weights, rollout, f"advanced to {share:g}%"
+
+    def stats(self) -> dict:
+        return {
+            model_name: {
+                "step_started_at": updated_at.isoformat() if updated_at else None,
+                "versions": {version: window.to_dict() for version, window in windows.items()},
+            }
+            for model_name, (updated_at, windows) in self.windows.items()
+        }
@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Tuple
+import os
+import threading
+import time
+from inference.TensorPayload import TensorSchema
+
+
+@dataclass(frozen=True)
+class Route:
+    service_name: str
+    port: int
+    endpoint: Optional[str]
+    batch_max_size: Optional[int] = None
+    batch_max_wait_ms: Optional[float] = None
+    cache_ttl_seconds: Optional[float] = None
+    min_replicas: Optional[int] = None
+    idle_timeout_seconds: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    max_queue_depth: Optional[int] = None
+    queue_timeout_ms: Optional[float] = None
+    streaming: Optional[bool] = None
+    payload_format: Optional[str] = None
+    input_schema: Optional[TensorSchema] = None
+    output_schema: Optional[TensorSchema] = None
+    hedge_percentile: Optional[float] = None
+    max_retries: Optional[int] = None
+    retry_budget_percent: Optional[float] = None
+    breaker_error_rate: Optional[float] = None
+    breaker_open_seconds: Optional[float] = None
+
+    @property
+    def scales_to_zero(self) -> bool:
+        return self.min_replicas == 0
+
+
+class RouteTable:
+    """Bounded in-process LRU/TTL cache of (name, version) -> Route in front of MLModelPersistence.
+
+    Only the fields the inference path needs are kept, so a hit is a dict lookup instead of
+    a Postgres round trip. Entries are dropped on local writes and on change notifications
+    from other router replicas; the TTL bounds staleness if a notification is ever missed.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, str], Awaitable[Route]],
+        max_entries: int = 4096,
+        ttl: float = 300.0,
+    ):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[float, Route]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0  # Bumped on every invalidation so in-flight loads cannot re-insert stale routes
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, loader: Callable[[str, str], Awaitable[Route]]):
+        """Factory method to create a RouteTable from environment variables."""
+        return cls(
+            loader,
+            max_entries=int(os.getenv('ROUTE_CACHE_MAX_ENTRIES', 4096)),
+            ttl=float(os.getenv('ROUTE_CACHE_TTL', 300.0)),
+        )
+
+    def get(self, model_name: str, model_version: str) -> Optional[Route]:
+        key = (model_name, model_version)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, route = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return route
+
+    def put(self, model_name: str, model_version: str, route: Route):
+        key = (model_name, model_version)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, route)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    async def lookup(self, model_name: str, model_version: str) -> Route:
+        """Return the cached route, loading it on a miss. Raises ValueError if the model is unknown."""
+        route = self.get(model_name, model_version)
+        if route is not None:
+            self.hits += 1
+            return route
+        self.misses += 1
+        generation = self.generation
+        route = await self.loader(model_name, model_version)
+        if generation == self.generation:
+            self.put(model_name, model_version, route)
+        return route
+
+    def invalidate(self, model_name: str, model_version: str):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop((model_name, model_version), None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def on_change(self, change: Optional[Tuple[str, str]]):
+        """Callback for MLModelPersistence.listen_for_changes; None means notifications may have been missed."""
+        if change is None:
+            self.clear()
+        else:
+            self.invalidate(*change)
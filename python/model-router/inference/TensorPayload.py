@@ -0,0 +1,266 @@
+from dataclasses import dataclass
+from itertools import chain
+from math import isfinite, prod
+from typing import Dict, Iterable, List, Optional, Tuple
+import orjson
+import struct
+
+# Binary payloads use the safetensors layout: an 8 byte little-endian header length, a JSON header
+# {"name": {"dtype": "F32", "shape": [2, 3], "data_offsets": [begin, end]}} and the raw little-endian
+# tensor buffers, so a client or model server can map each tensor (e.g. numpy.frombuffer) without copying
+SAFETENSORS_CONTENT_TYPE = "application/x-safetensors"
+JSON_CONTENT_TYPE = "application/json"
+PAYLOAD_FORMATS = {"json": JSON_CONTENT_TYPE, "safetensors": SAFETENSORS_CONTENT_TYPE}
+MAX_HEADER_BYTES = 16 * 1024 * 1024
+
+# dtype -> (safetensors code, item size, struct format or None when it has no JSON conversion)
+DTYPES = {
+    "float64": ("F64", 8, "d"),
+    "float32": ("F32", 4, "f"),
+    "float16": ("F16", 2, "e"),
+    "bfloat16": ("BF16", 2, None),
+    "int64": ("I64", 8, "q"),
+    "int32": ("I32", 4, "i"),
+    "int16": ("I16", 2, "h"),
+    "int8": ("I8", 1, "b"),
+    "uint64": ("U64", 8, "Q"),
+    "uint32": ("U32", 4, "I"),
+    "uint16": ("U16", 2, "H"),
+    "uint8": ("U8", 1, "B"),
+    "bool": ("BOOL", 1, "?"),
+}
+DTYPE_BY_CODE = {code: dtype for dtype, (code, _, _) in DTYPES.items()}
+
+
+class PayloadError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class TensorSpec:
+    name: str
+    dtype: str
+    shape: Optional[Tuple[int, ...]] = None  # -1 matches any size; None matches any shape
+
+
+@dataclass(frozen=True)
+class TensorSchema:
+    """Structured form of MLModel.input_schema / output_schema.
+
+    Written as JSON, e.g. {"features": {"dtype": "float32", "shape": [-1, 128]}}, and only read for
+    models that declare a payload_format; schemas that are not a JSON object are free-text
+    descriptions and are not enforced.
+    """
+    tensors: Tuple[TensorSpec, ...]
+
+    @classmethod
+    def parse(cls, text: Optional[str]) -> Optional["TensorSchema"]:
+        if not text or not text.lstrip().startswith("{"):
+            return None
+        try:
+            fields = orjson.loads(text)
+        except orjson.JSONDecodeError as e:
+            raise ValueError(f"Invalid tensor schema: {e}")
+        tensors = []
+        for name, spec in fields.items():
+            if not isinstance(spec, dict) or not isinstance(spec.get("dtype"), str) or spec["dtype"] not in DTYPES:
+                raise ValueError(f"Tensor {name} needs a dtype, one of {', '.join(DTYPES)}")
+            shape = spec.get("shape")
+            if shape is not None and not (
+                isinstance(shape, list) and all(isinstance(size, int) and size >= -1 for size in shape)
+            ):
+                raise ValueError(f"Tensor {name} has an invalid shape {shape}, expected a list of sizes (-1 for any)")
+            tensors.append(TensorSpec(name, spec["dtype"], None if shape is None else tuple(shape)))
+        return cls(tuple(tensors))
+
+    def dtype(self, name: str) -> Optional[str]:
+        return next((spec.dtype for spec in self.tensors if spec.name == name), None)
+
+    def validate(self, tensors: Dict[str, Tuple[str, Tuple[int, ...]]]):
+        """Check a {name: (dtype, shape)} mapping; raises PayloadError on any mismatch."""
+        expected = {spec.name for spec in self.tensors}
+        unknown = [name for name in tensors if name not in expected]
+        if unknown:
+            raise PayloadError(f"Unexpected tensors: {', '.join(unknown)}")
+        for spec in self.tensors:
+            if spec.name not in tensors:
+                raise PayloadError(f"Missing tensor {spec.name}")
+            dtype, shape = tensors[spec.name]
+            if dtype != spec.dtype:
+                raise PayloadError(f"Tensor {spec.name} has dtype {dtype}, expected {spec.dtype}")
+            if spec.shape is not None and (
+                len(shape) != len(spec.shape) or any(want not in (-1, size) for want, size in zip(spec.shape, shape))
+            ):
+                raise PayloadError(f"Tensor {spec.name} has shape {list(shape)}, expected {list(spec.shape)}")
+
+
+def payload_format(content_type: Optional[str]) -> str:
+    """Map a Content-Type header to "json" or "safetensors"; anything else is passed through as JSON."""
+    if content_type and content_type.split(";", 1)[0].strip().lower() == SAFETENSORS_CONTENT_TYPE:
+        return "safetensors"
+    return "json"
+
+
+def accepted_format(accept: Optional[str], default: str) -> str:
+    """Response format an Accept header prefers by q-value, or `default` when it names neither (or on a tie)."""
+    if not accept:
+        return default
+    qualities = {}
+    for media_range in accept.lower().split(","):
+        media_type, *params = media_range.split(";")
+        media_type = media_type.strip()
+        if media_type not in (JSON_CONTENT_TYPE, SAFETENSORS_CONTENT_TYPE):
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type] = max(quality, qualities.get(media_type, 0.0))
+    best = max(qualities.values(), default=0.0)
+    if best <= 0.0 or qualities.get(PAYLOAD_FORMATS[default]) == best:
+        return default
+    return next(payload for payload, media_type in PAYLOAD_FORMATS.items() if qualities.get(media_type) == best)
+
+
+def read_header(body: bytes) -> Dict[str, Tuple[str, Tuple[int, ...], int, int]]:
+    """Parse and bounds-check a safetensors header without touching the tensor data.
+
+    Returns {name: (dtype, shape, begin, end)} with offsets into `body`.
+    """
+    if len(body) < 8:
+        raise PayloadError("Tensor payload is shorter than its header length")
+    (header_size,) = struct.unpack_from("<Q", body)
+    if header_size > MAX_HEADER_BYTES or 8 + header_size > len(body):
+        raise PayloadError(f"Tensor payload header of {header_size} bytes does not fit the body")
+    try:
+        header = orjson.loads(memoryview(body)[8:8 + header_size])
+    except orjson.JSONDecodeError as e:
+        raise PayloadError(f"Invalid tensor payload header: {e}")
+    if not isinstance(header, dict):
+        raise PayloadError("Tensor payload header must be a JSON object")
+
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        try:
+            dtype = DTYPE_BY_CODE[info["dtype"]]
+            shape = tuple(info["shape"])
+            begin, end = info["data_offsets"]
+        except (KeyError, TypeError, ValueError):
+            raise PayloadError(f"Tensor {name} needs a known dtype, a shape and data_offsets")
+        if not all(isinstance(size, int) and size >= 0 for size in shape):
+            raise PayloadError(f"Tensor {name} has an invalid shape {list(shape)}")
+        if not (isinstance(begin, int) and isinstance(end, int) and 0 <= begin <= end <= len(body) - data_start):
+            raise PayloadError(f"Tensor {name} data_offsets [{begin}, {end}] fall outside the payload")
+        if end - begin != prod(shape) * DTYPES[dtype][1]:
+            raise PayloadError(f"Tensor {name} has {end - begin} bytes of data, its shape needs {prod(shape) * DTYPES[dtype][1]}")
+        tensors[name] = (dtype, shape, data_start + begin, data_start + end)
+    return tensors
+
+
+def validate(schema: Optional[TensorSchema], body: bytes) -> Dict[str, Tuple[str, Tuple[int, ...], int, int]]:
+    tensors = read_header(body)
+    if schema is not None:
+        schema.validate({name: (dtype, shape) for name, (dtype, shape, _, _) in tensors.items()})
+    return tensors
+
+
+def flatten(value) -> Tuple[Tuple[int, ...], list]:
+    """Flatten a nested list one level at a time, checking it is rectangular."""
+    shape = []
+    level = [value]
+    while level and isinstance(level[0], list):
+        size = len(level[0])
+        if any(not isinstance(item, list) or len(item) != size for item in level):
+            raise PayloadError("Tensors must be rectangular nested lists")
+        shape.append(size)
+        level = list(chain.from_iterable(level))
+    if any(isinstance(item, list) for item in level):
+        raise PayloadError("Tensors must be rectangular nested lists")
+    return tuple(shape), level
+
+
+def nest(flat: list, shape: Tuple[int, ...]):
+    """Inverse of flatten: regroup a flat list into nested lists of the given shape."""
+    if not shape:
+        return flat[0]
+    for axis in range(len(shape) - 1, 0, -1):
+        size, count = shape[axis], prod(shape[:axis])
+        flat = [flat[i * size:(i + 1) * size] for i in range(count)]
+    return flat
+
+
+def infer_dtype(values: list) -> str:
+    if all(isinstance(value, bool) for value in values) and values:
+        return "bool"
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in values) and values:
+        return "int64"
+    return "float32"
+
+
+def json_to_safetensors(body: bytes, schema: Optional[TensorSchema] = None) -> bytes:
+    """Encode a JSON object of named nested lists as a safetensors payload.
+
+    Each tensor takes its dtype from the schema, otherwise it is inferred from the values (bool,
+    int64 or float32). The schema is checked on the way.
+    """
+    try:
+        fields = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise PayloadError(f"Invalid JSON tensor payload: {e}")
+    if not isinstance(fields, dict):
+        raise PayloadError("JSON tensor payloads must be an object of named tensors")
+
+    header, buffers, offset, tensors = {}, [], 0, {}
+    for name, value in fields.items():
+        shape, values = flatten(value)
+        dtype = (schema.dtype(name) if schema is not None else None) or infer_dtype(values)
+        code, _, fmt = DTYPES[dtype]
+        if fmt is None:
+            raise PayloadError(f"Tensor {name} of dtype {dtype} cannot be converted from JSON")
+        try:
+            data = struct.pack(f"<{len(values)}{fmt}", *values)
+        except (struct.error, OverflowError) as e:
+            raise PayloadError(f"Tensor {name} does not fit dtype {dtype}: {e}")
+        header[name] = {"dtype": code, "shape": list(shape), "data_offsets": [offset, offset + len(data)]}
+        buffers.append(data)
+        offset += len(data)
+        tensors[name] = (dtype, shape)
+    if schema is not None:
+        schema.validate(tensors)
+
+    encoded = orjson.dumps(header)
+    encoded += b" " * (-len(encoded) % 8)  # Keep the tensor data 8 byte aligned
+    return b"".join(chain((struct.pack("<Q", len(encoded)), encoded), buffers))
+
+
+def safetensors_to_json(body: bytes, schema: Optional[TensorSchema] = None) -> bytes:
+    """Decode a safetensors payload into a JSON object of named nested lists, checking the schema.
+
+    Tensors with NaN or infinite values are rejected, as JSON has no representation for them.
+    """
+    tensors = validate(schema, body)
+    fields = {}
+    for name, (dtype, shape, begin, end) in tensors.items():
+        _, size, fmt = DTYPES[dtype]
+        if fmt is None:
+            raise PayloadError(f"Tensor {name} of dtype {dtype} cannot be converted to JSON")
+        values = list(struct.unpack_from(f"<{(end - begin) // size}{fmt}", body, begin))
+        if fmt in "efd" and not all(map(isfinite, values)):
+            raise PayloadError(f"Tensor {name} has NaN or infinite values, which JSON cannot represent")
+        fields[name] = nest(values, shape)
+    return orjson.dumps(fields)
+
+
+def with_content_type(headers: Iterable[Tuple[bytes, bytes]], content_type: str) -> List[Tuple[bytes, bytes]]:
+    return [(key, value) for key, value in headers if key.lower() != b"content-type"] + [
+        (b"content-type", content_type.encode("latin-1"))
+    ]
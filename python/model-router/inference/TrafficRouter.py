@@ -0,0 +1,73 @@
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from random import random
+import os
+import time
+from models.TrafficSplit import TrafficSplit
+
+# Resolution of the weighted selection table: weights are applied in steps of 0.1%
+SLOTS = 1000
+
+
+class WeightedSplit:
+    """A traffic split compiled into a fixed table of versions, so picking one is a single index."""
+    __slots__ = ("slots", "shadow_version", "shadow_percent")
+
+    def __init__(self, split: TrafficSplit):
+        weights = {version: weight for version, weight in split.weights.items() if weight > 0}
+        total = sum(weights.values())
+        # Largest remainder apportionment of the SLOTS between the versions
+        quotas = {version: weight / total * SLOTS for version, weight in weights.items()}
+        counts = {version: int(quota) for version, quota in quotas.items()}
+        by_remainder = sorted(quotas, key=lambda version: quotas[version] - counts[version], reverse=True)
+        for version in by_remainder[:SLOTS - sum(counts.values())]:
+            counts[version] += 1
+        self.slots: Tuple[str, ...] = tuple(version for version, count in counts.items() for _ in range(count))
+        self.shadow_version = split.shadow_version
+        self.shadow_percent = split.shadow_percent if split.shadow_version else 0.0
+
+    def pick(self) -> str:
+        return self.slots[int(random() * SLOTS)]
+
+    def shadow(self) -> Optional[str]:
+        """Version that should also receive a copy of this request, if any."""
+        if self.shadow_percent and random() * 100.0 < self.shadow_percent:
+            return self.shadow_version
+        return None
+
+
+class TrafficRouter:
+    """In-process TTL cache of model name -> WeightedSplit behind /predict/{model_name}.
+
+    Invalidated by the same change notifications as the RouteTable. Only used from the event
+    loop thread, so selection needs neither locks nor allocations.
+    """
+
+    def __init__(self, loader: Callable[[str], Awaitable[TrafficSplit]], ttl: float = 300.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.entries: Dict[str, Tuple[float, WeightedSplit]] = {}
+        self.generation = 0
+
+    @classmethod
+    def from_env(cls, loader: Callable[[str], Awaitable[TrafficSplit]]):
+        """Factory method to create a TrafficRouter from environment variables."""
+        return cls(loader, ttl=float(os.getenv('ROUTE_CACHE_TTL', 300.0)))
+
+    async def lookup(self, model_name: str) -> WeightedSplit:
+        """Return the model's compiled split. Raises ValueError if it has none."""
+        entry = self.entries.get(model_name)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        generation = self.generation
+        split = WeightedSplit(await self.loader(model_name))
+        if generation == self.generation:
+            self.entries[model_name] = (time.monotonic() + self.ttl, split)
+        return split
+
+    def invalidate(self, model_name: str):
+        self.generation += 1
+        self.entries.pop(model_name, None)
+
+    def clear(self):
+        self.generation += 1
+        self.entries.clear()
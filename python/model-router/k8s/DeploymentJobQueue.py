@@ -0,0 +1,243 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import functools
+import os
+import time
+import uuid
+from kubernetes.client.rest import ApiException
+from k8s.MLDeployer import MLDeployer
+from k8s.RateLimiter import RateLimiter
+from models.MLModel import MLModel
+
+# Kubernetes resources created for every model: name -> (create method, rollback method)
+RESOURCES = OrderedDict([
+    ("deployment", ("deploy_model", "delete_deployment")),
+    ("autoscaler", ("apply_horizontal_autoscaler", "delete_horizontal_autoscaler")),
+    ("service", ("create_cluster_ip_service", "delete_cluster_ip_service")),
+])
+
+
+@dataclass
+class DeploymentJob:
+    id: str
+    model: MLModel
+    status: str = "queued"  # queued -> running -> succeeded | failed
+    resources: Dict[str, str] = field(default_factory=lambda: {name: "pending" for name in RESOURCES})
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> dict:
+        created = sum(1 for state in self.resources.values() if state == "created")
+        return {
+            "job_id": self.id,
+            "model_name": self.model.name,
+            "model_version": self.model.version,
+            "status": self.status,
+            "progress": created / len(self.resources),
+            "resources": dict(self.resources),
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class DeploymentQueueFull(Exception):
+    pass
+
+
+class DeploymentJobQueue:
+    """Runs model deployments in the background on a bounded pool of workers.
+
+    Each job creates the Deployment, HPA and Service concurrently on a thread pool (the
+    kubernetes client is blocking), rolls back whatever was created if any step fails, and
+    only then calls on_deployed so metadata is persisted for fully deployed models only.
+    Every Kubernetes API call, including batch work, goes through one shared rate limiter.
+    """
+
+    def __init__(
+        self,
+        deployer: MLDeployer,
+        on_deployed: Callable[[MLModel], Awaitable[None]],
+        workers: int = 4,
+        max_pending: int = 256,
+        history_size: int = 1000,
+        api_qps: float = 50.0,
+        api_burst: int = 100,
+        api_concurrency: int = 16,
+    ):
+        self.deployer = deployer
+        self.on_deployed = on_deployed
+        self.workers = workers
+        self.max_pending = max_pending
+        self.history_size = history_size
+        self.jobs: "OrderedDict[str, DeploymentJob]" = OrderedDict()
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks = []
+        self.rate_limiter = RateLimiter(api_qps, api_burst)
+        self.executor = ThreadPoolExecutor(max_workers=api_concurrency, thread_name_prefix="k8s")
+
+    @classmethod
+    def from_env(cls, deployer: MLDeployer, on_deployed: Callable[[MLModel], Awaitable[None]]):
+        """Factory method to create a DeploymentJobQueue from environment variables."""
+        return cls(
+            deployer,
+            on_deployed,
+            workers=int(os.getenv('DEPLOY_WORKERS', 4)),
+            max_pending=int(os.getenv('DEPLOY_QUEUE_SIZE', 256)),
+            history_size=int(os.getenv('DEPLOY_JOB_HISTORY', 1000)),
+            api_qps=float(os.getenv('K8S_API_QPS', 50.0)),
+            api_burst=int(os.getenv('K8S_API_BURST', 100)),
+            api_concurrency=int(os.getenv('K8S_API_CONCURRENCY', 16)),
+        )
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.executor.shutdown(wait=False)
+
+    def submit(self, model: MLModel) -> DeploymentJob:
+        job = DeploymentJob(id=uuid.uuid4().hex, model=model)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise DeploymentQueueFull(f"Deployment queue is full ({self.max_pending} pending jobs)")
+        self.track(job)
+        return job
+
+    def track(self, job: DeploymentJob):
+        self.jobs[job.id] = job
+        self.trim_history()
+
+    def get(self, job_id: str) -> DeploymentJob:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Deployment job {job_id} not found")
+        return job
+
+    def active_models(self) -> Set[Tuple[str, str]]:
+        """(name, version) of every model with a queued or running deployment job."""
+        return {(job.model.name, job.model.version) for job in self.jobs.values() if not job.done}
+
+    def trim_history(self):
+        # Drop the oldest finished jobs; queued or running ones are always kept
+        excess = len(self.jobs) - self.history_size
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done][:max(excess, 0)]:
+            del self.jobs[job_id]
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.run(job)
+            except Exception as e:
+                job.status, job.error, job.finished_at = "failed", str(e), time.time()
+            finally:
+                self.queue.task_done()
+
+    async def call(self, method: str, *args):
+        await self.rate_limiter.acquire()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(getattr(self.deployer, method), *args))
+
+    async def create(self, job: DeploymentJob, resource: str):
+        job.resources[resource] = "creating"
+        try:
+            await self.call(RESOURCES[resource][0], job.model)
+        except Exception:
+            job.resources[resource] = "failed"
+            raise
+        job.resources[resource] = "created"
+
+    async def rollback(self, job: DeploymentJob):
+        async def delete(resource: str):
+            try:
+                await self.call(RESOURCES[resource][1], job.model.name, job.model.version)
+                job.resources[resource] = "rolled_back"
+            except Exception as e:
+                print(f"Exception when rolling back {resource} of {job.model.name}:{job.model.version}: {e}")
+                job.resources[resource] = "rollback_failed"
+
+        await asyncio.gather(*[delete(name) for name, state in job.resources.items() if state == "created"])
+
+    async def deploy(self, job: DeploymentJob) -> List[str]:
+        """Create all resources of the job concurrently and return the error of every failed step."""
+        job.status, job.started_at = "running", time.time()
+        results = await asyncio.gather(*[self.create(job, name) for name in RESOURCES], return_exceptions=True)
+        return [str(result) for result in results if isinstance(result, BaseException)]
+
+    async def finish(self, job: DeploymentJob, errors: List[str]):
+        if errors:
+            await self.rollback(job)
+            job.status, job.error = "failed", "; ".join(errors)
+        else:
+            job.status = "succeeded"
+        job.finished_at = time.time()
+
+    async def run(self, job: DeploymentJob):
+        errors = await self.deploy(job)
+        if not errors:
+            try:
+                await self.on_deployed(job.model)
+            except Exception as e:
+                errors.append(f"Failed to persist model metadata: {e}")
+        await self.finish(job, errors)
+
+    async def deploy_batch(
+        self,
+        models: List[MLModel],
+        on_deployed: Callable[[List[MLModel]], Awaitable[None]],
+    ) -> List[DeploymentJob]:
+        """Deploy many models at once, bypassing the queue, and persist the successful ones in one call.
+
+        Models whose resources could not all be created are rolled back individually; if the
+        single on_deployed call fails, every model of the batch is rolled back.
+        """
+        jobs = [DeploymentJob(id=uuid.uuid4().hex, model=model) for model in models]
+        for job in jobs:
+            self.track(job)
+        errors = await asyncio.gather(*[self.deploy(job) for job in jobs])
+        deployed = [job for job, job_errors in zip(jobs, errors) if not job_errors]
+        if deployed:
+            try:
+                await on_deployed([job.model for job in deployed])
+            except Exception as e:
+                for job_errors in errors:
+                    if not job_errors:
+                        job_errors.append(f"Failed to persist model metadata: {e}")
+        await asyncio.gather(*[self.finish(job, job_errors) for job, job_errors in zip(jobs, errors)])
+        return jobs
+
+    async def delete_batch(self, keys: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """Delete the Kubernetes resources of many models concurrently.
+
+        Returns one entry per key: None on success, otherwise the error. Resources that are
+        already gone are not treated as errors so a partially deleted model can be retried.
+        """
+        async def delete(model_name: str, model_version: str) -> Optional[str]:
+            results = await asyncio.gather(
+                *[self.call(rollback, model_name, model_version) for _, rollback in RESOURCES.values()],
+                return_exceptions=True,
+            )
+            errors = [
+                str(result) for result in results
+                if isinstance(result, BaseException) and not (isinstance(result, ApiException) and result.status == 404)
+            ]
+            return "; ".join(errors) or None
+
+        return list(await asyncio.gather(*[delete(name, version) for name, version in keys]))
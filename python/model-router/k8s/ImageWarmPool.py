@@ -0,0 +1,163 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import os
+import time
+from kubernetes.utils.quantity import parse_quantity
+from k8s.DeploymentJobQueue import DeploymentJobQueue
+from k8s.MLDeployer import normalize_image
+
+
+class ImageWarmPool:
+    """Keeps the images of the most recently used models pulled on every node, within a disk budget.
+
+    Images are ranked by the last time any router replica served one of their models (registration
+    time for models never used) and taken in that order until budget_bytes is spent, so rarely used
+    images are the first evicted from the warm set. Sizes come from the images nodes report, with
+    default_image_bytes for images not pulled anywhere yet. The set is applied as a pre-pull DaemonSet
+    (MLDeployer.apply_prepull_daemonset) whenever models change and every sync_interval; every router
+    replica computes the same set from Postgres, so they agree. An image the DaemonSet fails to pull
+    would keep its pods unready and stall the DaemonSet's rollout, so whichever replica sees the
+    failure records it in Postgres and every replica evicts the image for failed_retry_seconds
+    before it is tried again. Only used from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        jobs: DeploymentJobQueue,
+        load_images: Callable[[], Awaitable[List[str]]],
+        mark_used: Callable[[List[Tuple[str, str]]], Awaitable[None]],
+        load_failed: Callable[[float], Awaitable[List[str]]],
+        record_failed: Callable[[List[str]], Awaitable[None]],
+        request_counts: Callable[[], Dict[Tuple[str, str], int]],
+        budget_bytes: int = 50 * 1024 ** 3,
+        default_image_bytes: int = 2 * 1024 ** 3,
+        sync_interval: float = 300.0,
+        debounce_seconds: float = 5.0,
+        failed_retry_seconds: float = 3600.0,
+    ):
+        self.jobs = jobs
+        self.load_images = load_images
+        self.mark_used = mark_used
+        self.load_failed = load_failed
+        self.record_failed = record_failed
+        self.request_counts = request_counts
+        self.budget_bytes = budget_bytes
+        self.default_image_bytes = default_image_bytes
+        self.sync_interval = sync_interval
+        self.debounce_seconds = debounce_seconds
+        self.failed_retry_seconds = failed_retry_seconds
+        self.failed: Set[str] = set()  # normalized images recently failing to pre-pull
+        self.requests_seen: Dict[Tuple[str, str], int] = {}
+        self.applied: Optional[List[str]] = None
+        self.warm: Dict[str, int] = {}  # normalized image -> bytes counted against the budget
+        self.evicted: List[str] = []
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.syncs = 0
+        self.last_sync_at: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, jobs: DeploymentJobQueue, load_images: Callable[[], Awaitable[List[str]]],
+                 mark_used: Callable[[List[Tuple[str, str]]], Awaitable[None]],
+                 load_failed: Callable[[float], Awaitable[List[str]]],
+                 record_failed: Callable[[List[str]], Awaitable[None]],
+                 request_counts: Callable[[], Dict[Tuple[str, str], int]]):
+        """Factory method to create an ImageWarmPool from environment variables (sizes as Kubernetes quantities)."""
+        return cls(
+            jobs,
+            load_images,
+            mark_used,
+            load_failed,
+            record_failed,
+            request_counts,
+            budget_bytes=int(parse_quantity(os.getenv('IMAGE_PREPULL_DISK_BUDGET', '50Gi'))),
+            default_image_bytes=int(parse_quantity(os.getenv('IMAGE_PREPULL_DEFAULT_IMAGE_SIZE', '2Gi'))),
+            sync_interval=float(os.getenv('IMAGE_PREPULL_SYNC_INTERVAL', 300.0)),
+            failed_retry_seconds=float(os.getenv('IMAGE_PREPULL_FAILED_RETRY_SECONDS', 3600.0)),
+        )
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def on_change(self, *_):
+        """Called on the event loop for every model change notification."""
+        self.changed.set()
+
+    async def run(self):
+        while True:
+            try:
+                await self.record_usage()
+                await self.sync()
+            except Exception as e:
+                print(f"Exception when syncing the image warm pool: {e}")
+            try:
+                await asyncio.wait_for(self.changed.wait(), self.sync_interval)
+                await asyncio.sleep(self.debounce_seconds)  # Let a burst of registrations settle
+            except asyncio.TimeoutError:
+                pass
+            self.changed.clear()
+
+    async def record_usage(self):
+        """Publish which models this replica served since the last sync, judged by its total request counts."""
+        used = []
+        for key, total in self.request_counts().items():
+            if total != self.requests_seen.get(key):
+                self.requests_seen[key] = total
+                used.append(key)
+        if used:
+            await self.mark_used(used)
+
+    def select(self, images: List[str], sizes: Dict[str, int]) -> Tuple[Dict[str, int], List[str], List[str]]:
+        """Split images ranked by recent use into the ones that fit the budget and the evicted rest.
+
+        Returns the warm {normalized image: bytes}, the warm images as registered, and the evicted ones.
+        """
+        warm, wanted, evicted, seen, spent = {}, [], [], set(), 0
+        for image in images:
+            name = normalize_image(image)
+            if name in seen:
+                continue  # The same image registered under another spelling
+            seen.add(name)
+            size = sizes.get(name, self.default_image_bytes)
+            if name in self.failed or spent + size > self.budget_bytes:
+                evicted.append(image)  # Smaller, less recently used images may still fit after it
+                continue
+            warm[name] = size
+            wanted.append(image)
+            spent += size
+        return warm, wanted, evicted
+
+    async def sync(self):
+        failing = await self.jobs.call("failed_prepulls")
+        await self.record_failed(sorted({normalize_image(image) for image in failing}))
+        failed = set(await self.load_failed(self.failed_retry_seconds))
+        for image in failing:
+            if normalize_image(image) not in self.failed:
+                print(f"Image {image} could not be pre-pulled, leaving it out of the warm pool")
+        self.failed = failed
+        images = await self.load_images()
+        sizes = await self.jobs.call("image_sizes")
+        warm, wanted, self.evicted = self.select(images, sizes)
+        wanted.sort()  # Otherwise a change in the order of use alone would roll the DaemonSet
+        if wanted != self.applied:
+            await self.jobs.call("apply_prepull_daemonset", wanted)
+            self.applied = wanted
+        self.warm = warm
+        self.syncs += 1
+        self.last_sync_at = time.time()
+
+    def stats(self) -> dict:
+        return {
+            "images": [{"image": image, "bytes": size} for image, size in self.warm.items()],
+            "evicted": self.evicted,
+            "failed": sorted(self.failed),
+            "budget_bytes": self.budget_bytes,
+            "used_bytes": sum(self.warm.values()),
+            "syncs": self.syncs,
+            "last_sync_at": self.last_sync_at,
+        }
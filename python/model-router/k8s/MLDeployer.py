@@ -1,50 +1,162 @@
-from typing import Dict
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
 from kubernetes.client.rest import ApiException
-from kubernetes import client, config
+from kubernetes import client, config, watch
+from kubernetes.utils.quantity import parse_quantity
 from models.MLModel import MLModel
+from monitoring.Metrics import INFLIGHT_METRIC, K8S_CALL_ERRORS, K8S_CALL_SECONDS, RPS_METRIC, timed
 import os
+import re
+import threading
 
-kube_config_path = os.environ.get('KUBECONFIG')
-if kube_config_path and os.path.exists(kube_config_path):
-    config.load_kube_config()
-else:
-    config.load_incluster_config()
+# autoscaling_metric values backed by router metrics, mapped to their Prometheus names
+EXTERNAL_METRICS = {
+    "inflight": INFLIGHT_METRIC,
+    "rps": RPS_METRIC,
+}
+
+# EndpointSlice label naming the Service it belongs to
+SERVICE_NAME_LABEL = "kubernetes.io/service-name"
+
+# Deployment annotation where router replicas publish when a scale-to-zero model last served traffic
+LAST_REQUEST_ANNOTATION = "byoc.inference/last-request-at"
+
+# Thread pool sizes of common numeric runtimes, set from the container's CPU limit so a pod does not
+# start one thread per host core and thrash against its CFS quota
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+# anti_affinity values: spread a model's replicas over nodes if possible, or never co-locate them
+ANTI_AFFINITY_MODES = ("preferred", "required")
+HOSTNAME_TOPOLOGY_KEY = "kubernetes.io/hostname"
+# Kubernetes label syntax: an optional DNS subdomain prefix and "/", then a name of at most 63 characters
+# (values are the same kind of name, possibly empty)
+LABEL_NAME = re.compile(r"([A-Za-z0-9]([-A-Za-z0-9_.]{0,61}[A-Za-z0-9])?)?")
+LABEL_PREFIX = re.compile(r"[a-z0-9]([-a-z0-9]*[a-z0-9])?(\.[a-z0-9]([-a-z0-9]*[a-z0-9])?)*")
+ZONE_TOPOLOGY_KEY = "topology.kubernetes.io/zone"
+
+# Pod labels naming the model a pod serves; the pod start watcher selects on MODEL_LABEL
+MODEL_LABEL = "byoc.inference/model"
+VERSION_LABEL = "byoc.inference/version"
+
+# DaemonSet with one idle container per warm pool image, which keeps it pulled on every node (see ImageWarmPool)
+PREPULL_DAEMONSET = "byoc-image-prepuller"
+PREPULL_TOOLS_IMAGE = "busybox:1.36"
+# Container waiting reasons meaning its image cannot be pulled
+PULL_FAILURES = frozenset({"ErrImagePull", "ImagePullBackOff", "InvalidImageName"})
+PREPULL_RESOURCES = client.V1ResourceRequirements(
+    requests={"cpu": "10m", "memory": "16Mi"}, limits={"cpu": "100m", "memory": "64Mi"}
+)
+
+_kube_config_loaded = False
+
+
+def load_kube_config():
+    global _kube_config_loaded
+    if _kube_config_loaded:
+        return
+    # Attempt to load from environment variable first
+    kube_config_path = os.environ.get('KUBECONFIG')
+    if kube_config_path and os.path.exists(kube_config_path):
+        config.load_kube_config()
+    else:
+        config.load_incluster_config()
+    _kube_config_loaded = True
+
+
+def normalize_image(image: str) -> str:
+    """Fully qualified form of an image reference, as nodes report it: nginx -> docker.io/library/nginx:latest."""
+    name, _, digest = image.partition("@")
+    first, _, rest = name.partition("/")
+    if not rest:
+        name = f"docker.io/library/{name}"
+    elif "." not in first and ":" not in first and first != "localhost":
+        name = f"docker.io/{name}"
+    if digest:
+        return f"{name}@{digest}"
+    if ":" not in name.rpartition("/")[2]:
+        name += ":latest"
+    return name
 
 
 class MLDeployer:
-    def __init__(self):
-        self.apps_v1_api = client.AppsV1Api()
-        self.autoscaling_v1_api = client.AutoscalingV1Api()
-        self.core_v1_api = client.CoreV1Api()
+    def __init__(
+        self,
+        apps_v1_api=None,
+        autoscaling_v2_api=None,
+        core_v1_api=None,
+        discovery_v1_api=None,
+        default_cpu_request: Optional[str] = "250m",
+        default_memory_request: Optional[str] = "256Mi",
+    ):
+        """API clients can be injected (e.g. fakes in tests); otherwise they are built from the kube config.
+
+        The default requests apply to models without a resource profile, so the scheduler and the
+        CPU-based HPA always have a baseline to work from.
+        """
+        if apps_v1_api is None or autoscaling_v2_api is None or core_v1_api is None or discovery_v1_api is None:
+            load_kube_config()
+        self.apps_v1_api = apps_v1_api or client.AppsV1Api()
+        self.autoscaling_v2_api = autoscaling_v2_api or client.AutoscalingV2Api()
+        self.core_v1_api = core_v1_api or client.CoreV1Api()
+        self.discovery_v1_api = discovery_v1_api or client.DiscoveryV1Api()
+        self.default_cpu_request = default_cpu_request
+        self.default_memory_request = default_memory_request
+
+    @classmethod
+    def from_env(cls):
+        """Factory method to create an MLDeployer from environment variables (empty disables a default)."""
+        return cls(
+            default_cpu_request=os.getenv('MODEL_DEFAULT_CPU_REQUEST', '250m') or None,
+            default_memory_request=os.getenv('MODEL_DEFAULT_MEMORY_REQUEST', '256Mi') or None,
+        )
+
+    @staticmethod
+    def service_name(model_name: str, model_version: str) -> str:
+        return f"{model_name}-{model_version}-service"
+
+    @staticmethod
+    def resource_names(model_name: str, model_version: str) -> Dict[str, str]:
+        """Names of the Kubernetes objects created for a model, keyed like DeploymentJobQueue.RESOURCES."""
+        return {
+            "deployment": f"{model_name}-{model_version}",
+            "autoscaler": f"{model_name}-{model_version}-autoscaler",
+            "service": MLDeployer.service_name(model_name, model_version),
+        }
 
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
     def deploy_model(self, model: MLModel) -> MLModel:
         model_name = model.name
         model_version = model.version
         model_image_url = model.image_url
 
         model_exposed_port = model.exposed_port
+        resources = self.resource_requirements(model)
 
         deployment = client.V1Deployment(
             api_version="apps/v1",
             kind="Deployment",
             metadata=client.V1ObjectMeta(name=f"{model_name}-{model_version}"),
             spec=client.V1DeploymentSpec(
-                replicas=1,
+                # Scale-to-zero models (min_replicas=0) start cold and are woken by the router's activator
+                replicas=1 if model.min_replicas is None else min(model.min_replicas, 1),
                 selector=client.V1LabelSelector(
                     match_labels={"app": f"{model_name}-{model_version}"}
                 ),
                 template=client.V1PodTemplateSpec(
                     metadata=client.V1ObjectMeta(
-                        labels={"app": f"{model_name}-{model_version}"}
+                        labels={"app": f"{model_name}-{model_version}", MODEL_LABEL: model_name, VERSION_LABEL: model_version}
                     ),
                     spec=client.V1PodSpec(
                         containers=[
                             client.V1Container(
                                 name=f"{model_name}-{model_version}-container",
                                 image=model_image_url,
-                                ports=[client.V1ContainerPort(container_port=model_exposed_port)]
+                                ports=[client.V1ContainerPort(container_port=model_exposed_port)],
+                                resources=resources,
+                                env=self.container_env(model) or None,
                             )
-                        ]
+                        ],
+                        affinity=self.affinity(model),
+                        topology_spread_constraints=self.topology_spread(model),
                     )
                 )
             )
@@ -61,30 +173,236 @@ class MLDeployer:
 
         return model
 
+    def resource_requirements(self, model: MLModel) -> client.V1ResourceRequirements:
+        """Requests and limits from the model's resource profile, falling back to the default requests.
+
+        A limit without a request gets a request equal to the limit, as Kubernetes itself does.
+        """
+        limits = {
+            resource: value
+            for resource, value in (("cpu", model.cpu_limit), ("memory", model.memory_limit))
+            if value
+        }
+        requests = {
+            resource: value
+            for resource, value in (
+                ("cpu", model.cpu_request or model.cpu_limit or self.default_cpu_request),
+                ("memory", model.memory_request or model.memory_limit or self.default_memory_request),
+            )
+            if value
+        }
+        return client.V1ResourceRequirements(requests=requests or None, limits=limits or None)
+
+    @staticmethod
+    def check_resource_profile(model: MLModel):
+        """Raise ValueError for resource quantities and placement constraints Kubernetes would reject."""
+        for resource in ("cpu", "memory"):
+            request, limit = getattr(model, f"{resource}_request"), getattr(model, f"{resource}_limit")
+            try:
+                parsed = {value: parse_quantity(value) for value in (request, limit) if value}
+            except ValueError as e:
+                raise ValueError(f"Invalid {resource} quantity: {e}")
+            if any(quantity <= 0 for quantity in parsed.values()):
+                raise ValueError(f"{resource} requests and limits must be positive")
+            if request and limit and parsed[request] > parsed[limit]:
+                raise ValueError(f"{resource}_request {request} exceeds {resource}_limit {limit}")
+        if model.anti_affinity is not None and model.anti_affinity not in ANTI_AFFINITY_MODES:
+            raise ValueError(f"Unknown anti_affinity {model.anti_affinity}, expected {' or '.join(ANTI_AFFINITY_MODES)}")
+        for label, values in (model.node_affinity or {}).items():
+            prefix, _, name = label.rpartition("/")
+            if not name or not LABEL_NAME.fullmatch(name) or (
+                "/" in label and not (len(prefix) <= 253 and LABEL_PREFIX.fullmatch(prefix))
+            ):
+                raise ValueError(f"node_affinity label {label!r} is not a valid Kubernetes label key")
+            if not values:
+                raise ValueError(f"node_affinity label {label} needs at least one value")
+            invalid = [value for value in values if not LABEL_NAME.fullmatch(value)]
+            if invalid:
+                raise ValueError(f"node_affinity label {label} has invalid values: {', '.join(map(repr, invalid))}")
+
+    @staticmethod
+    def container_env(model: MLModel) -> List[client.V1EnvVar]:
+        """Thread counts derived from the model's CPU limit (or request), overridden by its own environment_variables.
+
+        The router's default CPU request does not set them, it is a scheduling baseline rather than a size.
+        """
+        env = {}
+        cpu = model.cpu_limit or model.cpu_request
+        if cpu:
+            threads = str(max(int(parse_quantity(cpu)), 1))
+            env.update((name, threads) for name in THREAD_ENV_VARS)
+        env.update(model.environment_variables or {})
+        return [client.V1EnvVar(name=name, value=str(value)) for name, value in env.items()]
+
+    @staticmethod
+    def affinity(model: MLModel) -> Optional[client.V1Affinity]:
+        node_affinity = None
+        if model.node_affinity:
+            # Every label must match one of its listed values
+            node_affinity = client.V1NodeAffinity(
+                required_during_scheduling_ignored_during_execution=client.V1NodeSelector(
+                    node_selector_terms=[client.V1NodeSelectorTerm(match_expressions=[
+                        client.V1NodeSelectorRequirement(key=label, operator="In", values=list(values))
+                        for label, values in model.node_affinity.items()
+                    ])]
+                )
+            )
+        pod_anti_affinity = None
+        if model.anti_affinity:
+            term = client.V1PodAffinityTerm(
+                label_selector=client.V1LabelSelector(match_labels={"app": f"{model.name}-{model.version}"}),
+                topology_key=HOSTNAME_TOPOLOGY_KEY,
+            )
+            if model.anti_affinity == "required":
+                pod_anti_affinity = client.V1PodAntiAffinity(
+                    required_during_scheduling_ignored_during_execution=[term]
+                )
+            else:
+                pod_anti_affinity = client.V1PodAntiAffinity(
+                    preferred_during_scheduling_ignored_during_execution=[
+                        client.V1WeightedPodAffinityTerm(weight=100, pod_affinity_term=term)
+                    ]
+                )
+        if node_affinity is None and pod_anti_affinity is None:
+            return None
+        return client.V1Affinity(node_affinity=node_affinity, pod_anti_affinity=pod_anti_affinity)
+
+    @staticmethod
+    def topology_spread(model: MLModel) -> Optional[List[client.V1TopologySpreadConstraint]]:
+        """Replicas that avoid sharing a node also spread over zones, as far as the scheduler can."""
+        if not model.anti_affinity:
+            return None
+        return [client.V1TopologySpreadConstraint(
+            max_skew=1,
+            topology_key=ZONE_TOPOLOGY_KEY,
+            when_unsatisfiable="ScheduleAnyway",
+            label_selector=client.V1LabelSelector(match_labels={"app": f"{model.name}-{model.version}"}),
+        )]
+
+    @staticmethod
+    def replicas_that_fit(free: Dict[str, Decimal], requests: Dict[str, Decimal]) -> int:
+        """How many pods with the given requests fit into the free cpu/memory/pods of one node."""
+        fits = int(free.get("pods", 0))
+        for resource, request in requests.items():
+            if request > 0:
+                fits = min(fits, int(free.get(resource, 0) // request))
+        return max(fits, 0)
+
+    @staticmethod
+    def node_eligible(node, model: MLModel) -> bool:
+        """Whether the scheduler could place the model's pods on the node at all."""
+        if node.spec.unschedulable:
+            return False
+        if any(taint.effect in ("NoSchedule", "NoExecute") for taint in node.spec.taints or []):
+            return False  # Model pods carry no tolerations
+        if not any(condition.type == "Ready" and condition.status == "True" for condition in node.status.conditions or []):
+            return False
+        labels = node.metadata.labels or {}
+        return all(labels.get(label) in values for label, values in (model.node_affinity or {}).items())
+
+    @staticmethod
+    def pod_requests(pod) -> Dict[str, Decimal]:
+        requested = {"cpu": Decimal(0), "memory": Decimal(0)}
+        for container in pod.spec.containers:
+            for resource, value in ((container.resources and container.resources.requests) or {}).items():
+                if resource in requested:
+                    requested[resource] += parse_quantity(value)
+        return requested
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def placement(self, model: MLModel) -> dict:
+        """Estimate how many more replicas of the model fit on the cluster right now.
+
+        Each eligible node's allocatable cpu, memory and pod count minus the requests of the pods
+        already running there is divided by the model's requests. Ignores preemption and the
+        scheduler's scoring, so it is an upper bound.
+        """
+        resources = self.resource_requirements(model)
+        requests = {resource: parse_quantity(value) for resource, value in (resources.requests or {}).items()}
+        requests["pods"] = Decimal(1)
+        used: Dict[str, Dict[str, Decimal]] = {}
+        replicas_on: Dict[str, int] = {}
+        pods = self.core_v1_api.list_pod_for_all_namespaces(
+            field_selector="status.phase!=Succeeded,status.phase!=Failed"
+        ).items
+        for pod in pods:
+            if not pod.spec.node_name:
+                continue
+            node_used = used.setdefault(pod.spec.node_name, {"cpu": Decimal(0), "memory": Decimal(0), "pods": Decimal(0)})
+            for resource, value in self.pod_requests(pod).items():
+                node_used[resource] += value
+            node_used["pods"] += 1
+            if (pod.metadata.labels or {}).get("app") == f"{model.name}-{model.version}":
+                replicas_on[pod.spec.node_name] = replicas_on.get(pod.spec.node_name, 0) + 1
+
+        nodes = []
+        for node in self.core_v1_api.list_node().items:
+            name = node.metadata.name
+            allocatable = {
+                resource: parse_quantity(value)
+                for resource, value in (node.status.allocatable or {}).items()
+                if resource in ("cpu", "memory", "pods")
+            }
+            node_used = used.get(name, {})
+            free = {resource: value - node_used.get(resource, 0) for resource, value in allocatable.items()}
+            eligible = self.node_eligible(node, model)
+            fits = self.replicas_that_fit(free, requests) if eligible else 0
+            if model.anti_affinity == "required":
+                fits = min(fits, 0 if replicas_on.get(name) else 1)
+            nodes.append({
+                "name": name,
+                "eligible": eligible,
+                "free_cpu": float(free.get("cpu", 0)),
+                "free_memory_bytes": int(free.get("memory", 0)),
+                "replicas_running": replicas_on.get(name, 0),
+                "replicas_that_fit": fits,
+            })
+        total = sum(node["replicas_that_fit"] for node in nodes)
+        return {
+            "requests": resources.requests,
+            "limits": resources.limits,
+            "replicas_that_fit": total,
+            "fits_max_replicas": total + sum(replicas_on.values()) >= (model.max_replicas or 1),
+            "nodes": nodes,
+        }
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
     def apply_horizontal_autoscaler(self, model: MLModel):
         model_name = model.name
         model_version = model.version
-        autoscaler = client.V1HorizontalPodAutoscaler(
-            api_version="autoscaling/v1",
+        behavior = None
+        if model.scale_up_stabilization_seconds is not None or model.scale_down_stabilization_seconds is not None:
+            behavior = client.V2HorizontalPodAutoscalerBehavior(
+                scale_up=client.V2HPAScalingRules(
+                    stabilization_window_seconds=model.scale_up_stabilization_seconds
+                ) if model.scale_up_stabilization_seconds is not None else None,
+                scale_down=client.V2HPAScalingRules(
+                    stabilization_window_seconds=model.scale_down_stabilization_seconds
+                ) if model.scale_down_stabilization_seconds is not None else None,
+            )
+        autoscaler = client.V2HorizontalPodAutoscaler(
+            api_version="autoscaling/v2",
             kind="HorizontalPodAutoscaler",
             metadata=client.V1ObjectMeta(
                 name=f"{model_name}-{model_version}-autoscaler",
                 labels={"app": f"{model_name}-{model_version}"},
             ),
-            spec=client.V1HorizontalPodAutoscalerSpec(
-                min_replicas=model.min_replicas,
+            spec=client.V2HorizontalPodAutoscalerSpec(
+                # The HPA cannot go below one replica; scaling to zero is done by the activator
+                min_replicas=max(model.min_replicas or 1, 1),
                 max_replicas=model.max_replicas,
-                scale_target_ref=client.V1CrossVersionObjectReference(
+                scale_target_ref=client.V2CrossVersionObjectReference(
                     api_version="apps/v1",
                     kind="Deployment",
                     name=f"{model_name}-{model_version}",
                 ),
-                target_cpu_utilization_percentage=80,
+                metrics=[self.autoscaling_metric(model)],
+                behavior=behavior,
             ),
         )
 
         try:
-            api_response = self.autoscaling_v1_api.create_namespaced_horizontal_pod_autoscaler(
+            api_response = self.autoscaling_v2_api.create_namespaced_horizontal_pod_autoscaler(
                 body=autoscaler, namespace="default"
             )
             print(f"Horizontal autoscaler created: {api_response.metadata.name}")
@@ -94,6 +412,40 @@ class MLDeployer:
 
         return model
 
+    @staticmethod
+    def autoscaling_metric(model: MLModel) -> client.V2MetricSpec:
+        """Metric the HPA scales on: pod CPU, or the router's per-model in-flight requests / RPS.
+
+        The router metrics reach the HPA as external metrics through prometheus-adapter
+        (k8s/scripts/prometheus-adapter-rules.yaml); autoscaling_target is the value per pod.
+        """
+        metric = model.autoscaling_metric or "cpu"
+        if metric == "cpu":
+            return client.V2MetricSpec(
+                type="Resource",
+                resource=client.V2ResourceMetricSource(
+                    name="cpu",
+                    target=client.V2MetricTarget(
+                        type="Utilization", average_utilization=int(model.autoscaling_target or 80)
+                    ),
+                ),
+            )
+        if metric not in EXTERNAL_METRICS:
+            raise ValueError(f"Unknown autoscaling metric {metric}, expected cpu, {' or '.join(EXTERNAL_METRICS)}")
+        if not model.autoscaling_target or model.autoscaling_target <= 0:
+            raise ValueError(f"autoscaling_target must be a positive per-pod value for the {metric} metric")
+        return client.V2MetricSpec(
+            type="External",
+            external=client.V2ExternalMetricSource(
+                metric=client.V2MetricIdentifier(
+                    name=EXTERNAL_METRICS[metric],
+                    selector=client.V1LabelSelector(match_labels={"model": model.name, "version": model.version}),
+                ),
+                target=client.V2MetricTarget(type="AverageValue", average_value=str(model.autoscaling_target)),
+            ),
+        )
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
     def create_cluster_ip_service(self, model: MLModel):
         model_name = model.name
         model_version = model.version
@@ -102,7 +454,7 @@ class MLDeployer:
             api_version="v1",
             kind="Service",
             metadata=client.V1ObjectMeta(
-                name=f"{model_name}-{model_version}-service",
+                name=self.service_name(model_name, model_version),
             ),
             spec=client.V1ServiceSpec(
                 type="ClusterIP",
@@ -122,21 +474,314 @@ class MLDeployer:
 
         return model
 
-    def delete_model(self, model_name: str, model_version: str):
-        try:
-            self.apps_v1_api.delete_namespaced_deployment(
-                name=f"{model_name}-{model_version}", namespace="default"
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def scale_deployment(self, model_name: str, model_version: str, replicas: int):
+        self.apps_v1_api.patch_namespaced_deployment_scale(
+            name=f"{model_name}-{model_version}",
+            namespace="default",
+            body={"spec": {"replicas": replicas}},
+        )
+        print(f"Deployment {model_name}-{model_version} scaled to {replicas}")
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def resize_autoscaler(self, model: MLModel):
+        """Apply the model's min_replicas/max_replicas to its HPA without touching the rest of its spec."""
+        self.autoscaling_v2_api.patch_namespaced_horizontal_pod_autoscaler(
+            name=f"{model.name}-{model.version}-autoscaler",
+            namespace="default",
+            body={"spec": {"minReplicas": max(model.min_replicas or 1, 1), "maxReplicas": model.max_replicas}},
+        )
+        if model.min_replicas != 0:
+            # The HPA leaves a Deployment at zero replicas alone, so wake a formerly scale-to-zero model
+            scale = self.apps_v1_api.read_namespaced_deployment_scale(
+                name=f"{model.name}-{model.version}", namespace="default"
             )
-            self.autoscaling_v1_api.delete_namespaced_horizontal_pod_autoscaler(
-                name=f"{model_name}-{model_version}-autoscaler", namespace="default"
+            if not scale.spec.replicas:
+                self.scale_deployment(model.name, model.version, 1)
+        print(f"Horizontal autoscaler of {model.name}-{model.version} resized to {model.min_replicas}-{model.max_replicas}")
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def deployment_replicas(self) -> Dict[str, Tuple[int, int]]:
+        """(desired, ready) replica counts of every Deployment by name, from a single list call."""
+        deployments = self.apps_v1_api.list_namespaced_deployment(namespace="default")
+        return {
+            deployment.metadata.name: (deployment.spec.replicas or 0, deployment.status.ready_replicas or 0)
+            for deployment in deployments.items
+        }
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def ready_endpoints(self, model_name: str, model_version: str) -> int:
+        """Number of ready pod addresses behind the model's ClusterIP service."""
+        try:
+            endpoints = self.core_v1_api.read_namespaced_endpoints(
+                name=self.service_name(model_name, model_version), namespace="default"
             )
-            self.core_v1_api.delete_namespaced_service(
-                name=f"{model_name}-{model_version}-service", namespace="default"
+        except ApiException as e:
+            if e.status == 404:
+                return 0
+            raise
+        return sum(len(subset.addresses or []) for subset in endpoints.subsets or [])
+
+    @staticmethod
+    def ready_addresses(endpoint_slice) -> List[str]:
+        # Only IPv4 slices: the addresses are used as bare hosts in URLs, and a dual-stack Service would
+        # list every pod twice. Services without one are reached through their name instead.
+        if endpoint_slice.address_type != "IPv4":
+            return []
+        return [
+            address
+            for endpoint in endpoint_slice.endpoints or []
+            if endpoint.conditions is None or endpoint.conditions.ready is not False
+            for address in endpoint.addresses or []
+        ]
+
+    def watch_endpoint_slices(
+        self,
+        on_sync: Callable[[Dict[Tuple[str, str], List[str]]], None],
+        on_change: Callable[[str, str, Optional[List[str]]], None],
+        stop: threading.Event,
+    ):
+        """Block streaming the ready pod addresses behind every Service until stop is set.
+
+        on_sync receives the full {(service, slice): addresses} state after each (re)list, then
+        on_change(service, slice, addresses) follows every EndpointSlice change, with addresses
+        None when the slice was deleted.
+        """
+        def synced(endpoint_slices):
+            on_sync({
+                (endpoint_slice.metadata.labels[SERVICE_NAME_LABEL], endpoint_slice.metadata.name):
+                    self.ready_addresses(endpoint_slice)
+                for endpoint_slice in endpoint_slices
+                if SERVICE_NAME_LABEL in (endpoint_slice.metadata.labels or {})
+            })
+
+        def changed(event_type: str, endpoint_slice):
+            service_name = (endpoint_slice.metadata.labels or {}).get(SERVICE_NAME_LABEL)
+            if service_name:
+                on_change(
+                    service_name,
+                    endpoint_slice.metadata.name,
+                    None if event_type == "DELETED" else self.ready_addresses(endpoint_slice),
+                )
+
+        self.list_and_watch(self.discovery_v1_api.list_namespaced_endpoint_slice, synced, changed, stop)
+
+    def watch_resources(
+        self,
+        resource: str,
+        on_sync: Callable[[Dict[str, str]], None],
+        on_change: Callable[[str, Optional[str]], None],
+        stop: threading.Event,
+    ):
+        """Block streaming the names and resourceVersions of every object of one resource kind.
+
+        resource is "deployment", "autoscaler" or "service" (see resource_names). on_sync gets
+        {name: resourceVersion} after each (re)list and on_change(name, resourceVersion) every
+        change, with None when the object was deleted.
+        """
+        list_method = {
+            "deployment": self.apps_v1_api.list_namespaced_deployment,
+            "autoscaler": self.autoscaling_v2_api.list_namespaced_horizontal_pod_autoscaler,
+            "service": self.core_v1_api.list_namespaced_service,
+        }[resource]
+        self.list_and_watch(
+            list_method,
+            lambda items: on_sync({item.metadata.name: item.metadata.resource_version for item in items}),
+            lambda event_type, item: on_change(
+                item.metadata.name, None if event_type == "DELETED" else item.metadata.resource_version
+            ),
+            stop,
+        )
+
+    def watch_model_pods(
+        self,
+        on_sync: Callable[[list], None],
+        on_change: Callable[[str, object], None],
+        stop: threading.Event,
+    ):
+        """Block streaming the pods of every model: on_sync(pods) after each (re)list, on_change(event_type, pod) after."""
+        self.list_and_watch(self.core_v1_api.list_namespaced_pod, on_sync, on_change, stop, label_selector=MODEL_LABEL)
+
+    @staticmethod
+    def list_and_watch(
+        list_method: Callable,
+        on_sync: Callable[[list], None],
+        on_event: Callable[[str, object], None],
+        stop: threading.Event,
+        timeout_seconds: int = 30,
+        label_selector: Optional[str] = None,
+    ):
+        """List the objects of list_method once, then watch them from that resourceVersion until stop is set.
+
+        Watches time out every timeout_seconds to check stop and resume from the last seen
+        resourceVersion; the objects are only listed again after the watch fails or expires (410).
+        """
+        resource_version = None
+        while not stop.is_set():
+            try:
+                selector = {} if label_selector is None else {"label_selector": label_selector}
+                if resource_version is None:
+                    listing = list_method(namespace="default", **selector)
+                    on_sync(listing.items)
+                    resource_version = listing.metadata.resource_version
+                for event in watch.Watch().stream(
+                    list_method,
+                    namespace="default",
+                    resource_version=resource_version,
+                    timeout_seconds=timeout_seconds,
+                    **selector,
+                ):
+                    resource_version = event["object"].metadata.resource_version
+                    on_event(event["type"], event["object"])
+                    if stop.is_set():
+                        break
+            except Exception as e:
+                # 410 Gone means our resource version expired; relist after any failure to be safe
+                if not (isinstance(e, ApiException) and e.status == 410):
+                    print(f"Exception while watching {list_method.__name__}: {e}")
+                    stop.wait(5.0)
+                resource_version = None
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def image_sizes(self) -> Dict[str, int]:
+        """Size in bytes of every image present on some node, keyed by its normalized names (see normalize_image)."""
+        sizes = {}
+        for node in self.core_v1_api.list_node().items:
+            for image in node.status.images or []:
+                for name in image.names or []:
+                    name = normalize_image(name)
+                    sizes[name] = max(sizes.get(name, 0), image.size_bytes or 0)
+        return sizes
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def apply_prepull_daemonset(self, images: List[str]):
+        """Create or replace the DaemonSet that keeps `images` pulled on every node.
+
+        Each image gets its own container that only sleeps in a static busybox copied in by an
+        init container, so any image works whatever it ships. Unlike init containers they are
+        pulled independently, so an image that cannot be pulled does not hold back the others
+        (see failed_prepulls).
+        """
+        labels = {"app": PREPULL_DAEMONSET}
+        tools = client.V1VolumeMount(name="tools", mount_path="/prepull")
+        containers = [
+            client.V1Container(
+                name=f"image-{index}",
+                image=image,
+                image_pull_policy="IfNotPresent",
+                command=["/prepull/busybox", "sleep", "infinity"],
+                volume_mounts=[tools],
+                resources=PREPULL_RESOURCES,
             )
+            for index, image in enumerate(images)
+        ]
+        daemon_set = client.V1DaemonSet(
+            api_version="apps/v1",
+            kind="DaemonSet",
+            metadata=client.V1ObjectMeta(name=PREPULL_DAEMONSET, labels=labels),
+            spec=client.V1DaemonSetSpec(
+                selector=client.V1LabelSelector(match_labels=labels),
+                # Pull on a quarter of the nodes at a time rather than all at once
+                update_strategy=client.V1DaemonSetUpdateStrategy(
+                    type="RollingUpdate", rolling_update=client.V1RollingUpdateDaemonSet(max_unavailable="25%")
+                ),
+                template=client.V1PodTemplateSpec(
+                    metadata=client.V1ObjectMeta(labels=labels),
+                    spec=client.V1PodSpec(
+                        init_containers=[client.V1Container(
+                            name="tools",
+                            image=PREPULL_TOOLS_IMAGE,
+                            command=["cp", "/bin/busybox", "/prepull/busybox"],
+                            volume_mounts=[tools],
+                            resources=PREPULL_RESOURCES,
+                        )],
+                        containers=containers,
+                        termination_grace_period_seconds=0,  # Nothing to shut down, sleep ignores SIGTERM as PID 1
+                        volumes=[client.V1Volume(name="tools", empty_dir=client.V1EmptyDirVolumeSource())],
+                    ),
+                ),
+            ),
+        )
+        try:
+            self.apps_v1_api.create_namespaced_daemon_set(body=daemon_set, namespace="default")
+            print(f"Image pre-pull DaemonSet created with {len(images)} images")
+        except ApiException as e:
+            if e.status != 409:
+                raise
+            # A full replace, since a patch would merge the container lists
+            self.apps_v1_api.replace_namespaced_daemon_set(name=PREPULL_DAEMONSET, namespace="default", body=daemon_set)
+            print(f"Image pre-pull DaemonSet updated to {len(images)} images")
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def image_was_present(self, pod_name: str, container_name: str) -> Optional[bool]:
+        """Whether a container's image was already on its node when the pod started, from the kubelet's Pulled event.
+
+        None when the event is gone (events expire) or the image was not pulled yet.
+        """
+        events = self.core_v1_api.list_namespaced_event(
+            namespace="default", field_selector=f"involvedObject.name={pod_name},reason=Pulled"
+        )
+        for event in events.items:
+            if event.involved_object.field_path == f"spec.containers{{{container_name}}}":
+                return "already present" in (event.message or "")
+        return None
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def failed_prepulls(self) -> List[str]:
+        """Images the pre-pull DaemonSet's pods currently fail to pull on some node, as given to apply_prepull_daemonset."""
+        failed = set()
+        pods = self.core_v1_api.list_namespaced_pod(namespace="default", label_selector=f"app={PREPULL_DAEMONSET}")
+        for pod in pods.items:
+            images = {container.name: container.image for container in pod.spec.containers}
+            for status in (pod.status and pod.status.container_statuses) or []:
+                waiting = status.state and status.state.waiting
+                if waiting is not None and waiting.reason in PULL_FAILURES and status.name in images:
+                    failed.add(images[status.name])
+        return sorted(failed)
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def publish_last_request(self, model_name: str, model_version: str, timestamp: float):
+        self.apps_v1_api.patch_namespaced_deployment(
+            name=f"{model_name}-{model_version}",
+            namespace="default",
+            body={"metadata": {"annotations": {LAST_REQUEST_ANNOTATION: str(timestamp)}}},
+        )
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def last_request(self, model_name: str, model_version: str) -> Optional[float]:
+        deployment = self.apps_v1_api.read_namespaced_deployment(
+            name=f"{model_name}-{model_version}", namespace="default"
+        )
+        value = (deployment.metadata.annotations or {}).get(LAST_REQUEST_ANNOTATION)
+        return float(value) if value else None
+
+    def delete_model(self, model_name: str, model_version: str):
+        try:
+            self.delete_deployment(model_name, model_version)
+            self.delete_horizontal_autoscaler(model_name, model_version)
+            self.delete_cluster_ip_service(model_name, model_version)
         except ApiException as e:
             print(f"Exception when deleting model: {e}")
             raise
 
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def delete_deployment(self, model_name: str, model_version: str):
+        self.apps_v1_api.delete_namespaced_deployment(
+            name=f"{model_name}-{model_version}", namespace="default"
+        )
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def delete_horizontal_autoscaler(self, model_name: str, model_version: str):
+        self.autoscaling_v2_api.delete_namespaced_horizontal_pod_autoscaler(
+            name=f"{model_name}-{model_version}-autoscaler", namespace="default"
+        )
+
+    @timed(K8S_CALL_SECONDS, K8S_CALL_ERRORS)
+    def delete_cluster_ip_service(self, model_name: str, model_version: str):
+        self.core_v1_api.delete_namespaced_service(
+            name=self.service_name(model_name, model_version), namespace="default"
+        )
+
 
 if __name__ == "__main__":
     k8s = MLDeployer()
@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+import asyncio
+from k8s.MLDeployer import MODEL_LABEL, VERSION_LABEL
+from monitoring.ColdStartStats import ColdStartStats
+from monitoring.Metrics import MODEL_POD_READY_SECONDS
+
+
+class PodStartTracker:
+    """Time from creation to Ready of every new model pod, e.g. after a scale-out or a cold start.
+
+    Fed by MLDeployer.watch_model_pods and split by whether the model image was already on the
+    node when the pod started (image_was_present(pod name, container name), e.g.
+    MLDeployer.image_was_present), so the effect of pre-pulling shows up directly. Pods that
+    were already ready when a (re)list happened, or whose pull is no longer known, are not
+    counted. Only used from the event loop thread.
+    """
+
+    def __init__(self, image_was_present: Callable[[str, str], Awaitable[Optional[bool]]]):
+        self.image_was_present = image_was_present
+        self.lookups: Set[asyncio.Task] = set()
+        self.seen: Set[str] = set()  # uids of pods already counted
+        self.synced_at: Optional[datetime] = None
+        self.starts: Dict[Tuple[str, str, bool], ColdStartStats] = {}
+
+    @staticmethod
+    def ready_at(pod) -> Optional[datetime]:
+        for condition in (pod.status and pod.status.conditions) or []:
+            if condition.type == "Ready" and condition.status == "True":
+                return condition.last_transition_time
+        return None
+
+    def on_sync(self, pods: list):
+        uids = {pod.metadata.uid for pod in pods}
+        self.seen &= uids
+        if self.synced_at is None:
+            # The first listing only sets the baseline; later relists still count pods that got ready meanwhile
+            self.seen |= uids
+            self.synced_at = datetime.now().astimezone()
+            return
+        for pod in pods:
+            self.on_change("MODIFIED", pod)
+
+    def on_change(self, event_type: str, pod):
+        uid = pod.metadata.uid
+        if event_type == "DELETED":
+            self.seen.discard(uid)
+            return
+        ready_at = self.ready_at(pod)
+        if ready_at is None or uid in self.seen or pod.metadata.creation_timestamp is None:
+            return
+        self.seen.add(uid)
+        labels = pod.metadata.labels or {}
+        model = (labels.get(MODEL_LABEL), labels.get(VERSION_LABEL))
+        if None in model:
+            return
+        seconds = max((ready_at - pod.metadata.creation_timestamp).total_seconds(), 0.0)
+        lookup = asyncio.get_running_loop().create_task(
+            self.record(model, pod.metadata.name, pod.spec.containers[0].name, seconds)
+        )
+        self.lookups.add(lookup)
+        lookup.add_done_callback(self.lookups.discard)
+
+    async def record(self, model: Tuple[str, str], pod_name: str, container_name: str, seconds: float):
+        try:
+            prepulled = await self.image_was_present(pod_name, container_name)
+        except Exception as e:
+            print(f"Exception when reading the image pull of pod {pod_name}: {e}")
+            return
+        if prepulled is None:
+            return
+        self.starts.setdefault((*model, prepulled), ColdStartStats()).record(seconds)
+        MODEL_POD_READY_SECONDS.labels(*model, str(prepulled).lower()).observe(seconds)
+
+    def forget(self, model_name: str, model_version: str):
+        for prepulled in (True, False):
+            self.starts.pop((model_name, model_version, prepulled), None)
+
+    def stats(self) -> dict:
+        stats: Dict[str, dict] = {}
+        for (name, version, prepulled), starts in self.starts.items():
+            model_stats = stats.setdefault(f"{name}:{version}", {})
+            model_stats["prepulled" if prepulled else "not_prepulled"] = {
+                "pods": starts.count,
+                "avg_seconds": starts.total_seconds / starts.count,
+                "max_seconds": starts.max_seconds,
+                "last_seconds": starts.last_seconds,
+            }
+        return stats
@@ -0,0 +1,138 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import os
+import time
+from kubernetes.client.rest import ApiException
+from k8s.DeploymentJobQueue import RESOURCES, DeploymentJobQueue
+from k8s.MLDeployer import MLDeployer
+from models.MLModel import MLModel
+
+
+class Reconciler:
+    """Recreates the missing Deployments, autoscalers and Services of the models registered in Postgres.
+
+    Watches (MLDeployer.watch_resources) keep the name and resourceVersion of every object in
+    memory, so in steady state the API server only serves one idle watch per resource kind.
+    Once all kinds are listed, and again grace_seconds after any object is deleted, the models
+    in the database are diffed against that cache and every missing object is created
+    concurrently through the rate-limited DeploymentJobQueue. The grace period lets a model
+    deletion, which removes the cluster objects before the row, finish first. Only used from
+    the event loop thread.
+    """
+
+    def __init__(
+        self,
+        jobs: DeploymentJobQueue,
+        load_models: Callable[[], Awaitable[List[MLModel]]],
+        grace_seconds: float = 30.0,
+    ):
+        self.jobs = jobs
+        self.load_models = load_models
+        self.grace_seconds = grace_seconds
+        self.observed: Dict[str, Dict[str, str]] = {}  # resource -> object name -> resourceVersion
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.task: Optional[asyncio.Task] = None
+        self.rerun = False
+        self.runs = 0
+        self.repaired = 0
+        self.failed = 0
+        self.last_run_seconds: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, jobs: DeploymentJobQueue, load_models: Callable[[], Awaitable[List[MLModel]]]):
+        """Factory method to create a Reconciler from environment variables."""
+        return cls(jobs, load_models, grace_seconds=float(os.getenv('RECONCILE_GRACE_SECONDS', 30.0)))
+
+    def on_sync(self, resource: str, objects: Dict[str, str]):
+        self.observed[resource] = objects
+        if len(self.observed) == len(RESOURCES):
+            self.schedule(0)
+
+    def on_change(self, resource: str, name: str, resource_version: Optional[str]):
+        observed = self.observed.get(resource)
+        if observed is None:
+            return  # Covered by the upcoming on_sync
+        if resource_version is not None:
+            observed[name] = resource_version
+        elif observed.pop(name, None) is not None:
+            self.schedule(self.grace_seconds)
+
+    def schedule(self, delay: float):
+        loop = asyncio.get_running_loop()
+        if self.timer is not None:
+            if self.timer.when() <= loop.time() + delay:
+                return  # A run is already due no later than this one
+            self.timer.cancel()
+        self.timer = loop.call_later(delay, self.start)
+
+    def start(self):
+        self.timer = None
+        if self.task is not None:
+            self.rerun = True
+            return
+        self.task = asyncio.create_task(self.reconcile())
+        self.task.add_done_callback(self.finished)
+
+    def finished(self, task: asyncio.Task):
+        self.task = None
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Exception when reconciling models: {task.exception()}")
+            self.schedule(self.grace_seconds)
+        if self.rerun:
+            self.rerun = False
+            self.schedule(0)
+
+    async def stop(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    async def reconcile(self):
+        started = time.monotonic()
+        models = await self.load_models()
+        deploying = self.jobs.active_models()
+        missing = [
+            (model, resource)
+            for model in models
+            if (model.name, model.version) not in deploying
+            for resource, name in MLDeployer.resource_names(model.name, model.version).items()
+            if name not in self.observed[resource]
+        ]
+        results = await asyncio.gather(*[self.repair(model, resource) for model, resource in missing])
+        for (model, resource), repaired in zip(missing, results):
+            if repaired:
+                # Until its watch event arrives; a deletion racing with it then triggers another run
+                self.observed[resource].setdefault(MLDeployer.resource_names(model.name, model.version)[resource], "")
+        self.runs += 1
+        self.repaired += sum(results)
+        self.failed += len(results) - sum(results)
+        self.last_run_seconds = time.monotonic() - started
+        if missing:
+            print(f"Reconciled {len(models)} models: recreated {sum(results)} of {len(missing)} missing resources "
+                  f"in {self.last_run_seconds:.2f}s")
+        if not all(results):
+            self.schedule(self.grace_seconds)
+
+    async def repair(self, model: MLModel, resource: str) -> bool:
+        try:
+            await self.jobs.call(RESOURCES[resource][0], model)
+        except ApiException as e:
+            # Another router replica (or a deployment job) created it in the meantime
+            return e.status == 409
+        except Exception as e:
+            print(f"Exception when recreating {resource} of {model.name}:{model.version}: {e}")
+            return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "synced": len(self.observed) == len(RESOURCES),
+            "runs": self.runs,
+            "repaired": self.repaired,
+            "failed": self.failed,
+            "last_run_seconds": self.last_run_seconds,
+            "observed": {resource: len(objects) for resource, objects in self.observed.items()},
+        }
@@ -1,69 +1,522 @@
-from fastapi import FastAPI, HTTPException
-from kubernetes import client, config
-import requests
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketException, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
+from starlette.websockets import WebSocketState
+from websockets.exceptions import InvalidHandshake
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from typing import Dict, List, Optional, Set, Tuple
+import httpx
+import json
+import math
+import orjson
 import psycopg2
+import socket
+import time
+from kubernetes.client.rest import ApiException
+from inference.Activator import ActivationTimeout, Activator, ActivatorQueueFull
+from inference.AdmissionController import PRIORITIES, AdmissionController, AdmissionRejected
+from inference.EndpointBalancer import EndpointBalancer
+from inference.InferenceProxy import InferenceProxy, filter_headers
+from inference.LoadTracker import LoadTracker
+from inference.MicroBatcher import JSON_HEADERS, MicroBatcher
+from inference.RequestGuard import CircuitOpen, RequestGuard
+from inference.ResponseCache import ResponseCache
+from inference.RolloutController import RolloutController
+from inference.RouteTable import Route, RouteTable
+from inference.TensorPayload import (
+    JSON_CONTENT_TYPE,
+    PAYLOAD_FORMATS,
+    PayloadError,
+    TensorSchema,
+    accepted_format,
+    json_to_safetensors,
+    payload_format,
+    safetensors_to_json,
+    validate,
+    with_content_type,
+)
+from inference.TrafficRouter import TrafficRouter
+from k8s.DeploymentJobQueue import RESOURCES, DeploymentJobQueue, DeploymentQueueFull
+from k8s.ImageWarmPool import ImageWarmPool
 from k8s.MLDeployer import MLDeployer
+from k8s.PodStartTracker import PodStartTracker
+from k8s.Reconciler import Reconciler
 from models.Database import Database
-from models.MLModel import MLModel
-from models.MLModelPersistence import MLModelPersistence
+from models.MLModel import MLModel, MLModelKey, ReplicaRange
+from models.MLModelPersistence import COLUMNS, MLModelPersistence, ModelInUse
+from models.RouterStatsPersistence import RouterStatsPersistence
+from models.SchemaMigrations import SchemaMigrator
+from models.TrafficSplit import TrafficSplit
+from models.TrafficSplitPersistence import TrafficSplitPersistence
+from monitoring.Metrics import (
+    ADMISSION_REJECTIONS,
+    MODEL_QUEUE_SECONDS,
+    MODEL_UPSTREAM_ERRORS,
+    MODEL_UPSTREAM_FIRST_BYTE_SECONDS,
+    MODEL_UPSTREAM_SECONDS,
+    RequestMetricsMiddleware,
+    forget_model_metrics,
+)
+from monitoring.FleetStats import FLEET_COLUMNS, FleetStats, latency_histogram
+from monitoring.Tracing import Tracer
+import asyncio
 import os
+import threading
 
-app = FastAPI()
-k8s = MLDeployer()
 
-# Attempt to load from environment variable first
-kube_config_path = os.environ.get('KUBECONFIG')
-if kube_config_path and os.path.exists(kube_config_path):
-    config.load_kube_config()
-else:
-    config.load_incluster_config()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.run(SchemaMigrator(db).migrate)
+    loop = asyncio.get_running_loop()
+    stop_threads = threading.Event()
+    threading.Thread(
+        target=ml_persistence.listen_for_changes,
+        args=(model_change_listener(loop), stop_threads),
+        name="ml-models-listener",
+        daemon=True,
+    ).start()
+    if endpoint_balancing:
+        # Pod addresses are applied on the event loop, which owns the balancer
+        threading.Thread(
+            target=k8s.watch_endpoint_slices,
+            args=(
+                lambda slices: loop.call_soon_threadsafe(endpoint_balancer.sync, slices),
+                lambda *change: loop.call_soon_threadsafe(endpoint_balancer.update, *change),
+                stop_threads,
+            ),
+            name="endpoint-slice-watcher",
+            daemon=True,
+        ).start()
+    if reconciling:
+        for resource in RESOURCES:
+            threading.Thread(
+                target=k8s.watch_resources,
+                args=(
+                    resource,
+                    lambda objects, resource=resource: loop.call_soon_threadsafe(reconciler.on_sync, resource, objects),
+                    lambda *change, resource=resource: loop.call_soon_threadsafe(reconciler.on_change, resource, *change),
+                    stop_threads,
+                ),
+                name=f"{resource}-watcher",
+                daemon=True,
+            ).start()
+    if prepulling:
+        threading.Thread(
+            target=k8s.watch_model_pods,
+            args=(
+                lambda pods: loop.call_soon_threadsafe(pod_starts.on_sync, pods),
+                lambda *change: loop.call_soon_threadsafe(pod_starts.on_change, *change),
+                stop_threads,
+            ),
+            name="model-pod-watcher",
+            daemon=True,
+        ).start()
+        warm_pool.start()
+    deployment_jobs.start()
+    activator.start()
+    rollouts.start()
+    fleet_stats.start()
+    yield
+    await fleet_stats.stop()
+    await warm_pool.stop()
+    await rollouts.stop()
+    await reconciler.stop()
+    await activator.stop()
+    await deployment_jobs.stop()
+    stop_threads.set()
+    await inference_proxy.aclose()
+    db.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestMetricsMiddleware)
+k8s = MLDeployer.from_env()
+inference_proxy = InferenceProxy.from_env()
+tracer = Tracer.from_env()
+# Without pod endpoints (disabled, not synced yet or RBAC missing) requests go to the ClusterIP service
+endpoint_balancing = os.getenv('ENDPOINT_BALANCING', 'true').lower() == 'true'
+endpoint_balancer = EndpointBalancer.from_env(
+    on_removed=lambda address: asyncio.ensure_future(inference_proxy.close_host(address))
+)
+# Upstream statuses that mean the pod itself is unhealthy rather than the request being bad
+UNAVAILABLE_STATUSES = frozenset({502, 503, 504})
 
 db = Database.from_env()
 ml_persistence = MLModelPersistence(db)
+traffic_persistence = TrafficSplitPersistence(db)
+
+
+def stored_schema(model_name: str, model_version: str, payload_format: Optional[str], text: Optional[str]) -> Optional[TensorSchema]:
+    """Tensor schema of a model that declares a payload_format; anything else is a plain description."""
+    if payload_format is None:
+        return None
+    try:
+        return TensorSchema.parse(text)
+    except ValueError as e:
+        print(f"Not enforcing the schema of {model_name}:{model_version}: {e}")
+        return None
+
+
+async def load_route(model_name: str, model_version: str) -> Route:
+    routing = await db.run(ml_persistence.get_routing, model_name, model_version)
+    payload_format = routing["payload_format"]
+    return Route(
+        service_name=MLDeployer.service_name(model_name, model_version),
+        port=routing.pop("exposed_port"),
+        input_schema=stored_schema(model_name, model_version, payload_format, routing.pop("input_schema")),
+        output_schema=stored_schema(model_name, model_version, payload_format, routing.pop("output_schema")),
+        **routing,
+    )
+
+
+route_table = RouteTable.from_env(load_route)
+batchers: Dict[Tuple[str, str], Tuple[Route, MicroBatcher]] = {}
+response_cache = ResponseCache.from_env()
+load_tracker = LoadTracker(window_seconds=int(os.getenv('LOAD_WINDOW_SECONDS', 10)))
+REGISTRY.register(load_tracker)
+traffic_router = TrafficRouter.from_env(lambda model_name: db.run(traffic_persistence.get_traffic, model_name))
+rollouts = RolloutController.from_env(
+    lambda: db.run(traffic_persistence.get_rollouts),
+    lambda *step: db.run(traffic_persistence.advance_rollout, *step),
+)
+admission = AdmissionController.from_env()
+admission_retry_after = os.getenv('ADMISSION_RETRY_AFTER', '1')
+request_guard = RequestGuard.from_env()
+shadow_tasks: Set[asyncio.Task] = set()
+shadow_max_in_flight = int(os.getenv('SHADOW_MAX_IN_FLIGHT', 100))
+
+
+def forget_model(model_name: str, model_version: str):
+    """Drop every piece of cached state about a model version after it changed or was deleted."""
+    route_table.invalidate(model_name, model_version)
+    batchers.pop((model_name, model_version), None)
+    response_cache.invalidate_model(model_name, model_version)
+    activator.forget(model_name, model_version)
+    load_tracker.forget(model_name, model_version)
+    pod_starts.forget(model_name, model_version)
+    admission.forget(model_name, model_version)
+    request_guard.forget(model_name, model_version)
+    forget_model_metrics(model_name, model_version)
+
+
+def model_change_listener(loop: asyncio.AbstractEventLoop):
+    # Runs on the listener thread; everything but the route table is owned by the event loop
+    def on_change(change: Optional[Tuple[str, str]]):
+        if change is not None and change[1] is None:
+            loop.call_soon_threadsafe(traffic_router.invalidate, change[0])  # Traffic split of the model changed
+            return
+        route_table.on_change(change)
+        loop.call_soon_threadsafe(response_cache.on_change, change)
+        if prepulling:
+            loop.call_soon_threadsafe(warm_pool.on_change, change)  # A model was registered or deleted
+        if change is None:
+            loop.call_soon_threadsafe(traffic_router.clear)
+    return on_change
+
+
+async def forward(model_name: str, model_version: str, route: Route, body: bytes,
+                  headers: List[Tuple[bytes, bytes]], tried: Optional[Set[str]] = None):
+    """Send one request (or one batch) to one of the model's pods, recording its upstream latency.
+
+    Pods already in `tried` are avoided when there is another, and the pod used is added to it.
+    """
+    started = time.perf_counter()
+    pod = endpoint_balancer.acquire(route.service_name, tried or ())
+    host = route.service_name if pod is None else pod.address
+    if tried is not None:
+        tried.add(host)
+    failed = False
+    try:
+        with tracer.span("upstream", model=model_name, version=model_version, host=host):
+            response = await inference_proxy.forward(host, route.port, route.endpoint, body, tracer.inject(headers))
+        failed = response[0] in UNAVAILABLE_STATUSES
+        return response
+    except Exception as e:
+        failed = isinstance(e, httpx.TransportError)
+        MODEL_UPSTREAM_ERRORS.labels(model_name, model_version).inc()
+        raise
+    finally:
+        if pod is not None:
+            endpoint_balancer.release(pod, failed)
+        MODEL_UPSTREAM_SECONDS.labels(model_name, model_version).observe(time.perf_counter() - started)
+
+
+async def guarded_forward(model_name: str, model_version: str, route: Route, body: bytes,
+                          headers: List[Tuple[bytes, bytes]]):
+    """forward() with the model's hedging, retry and circuit breaker settings; raises CircuitOpen."""
+    if not RequestGuard.enabled(route):
+        return await forward(model_name, model_version, route, body, headers)
+    acquire_slot = release_slot = None
+    if route.max_concurrency:
+        # A hedge is one more call to the model, it only goes out if it can take a free admission slot
+        acquire_slot = lambda: admission.try_acquire(model_name, model_version, route.max_concurrency)
+        release_slot = lambda: admission.release(model_name, model_version)
+    return await request_guard.send(
+        model_name, model_version, route, lambda tried: forward(model_name, model_version, route, body, headers, tried),
+        acquire_slot, release_slot,
+    )
+
+
+def batcher_for(model_name: str, model_version: str, route: Route) -> MicroBatcher:
+    entry = batchers.get((model_name, model_version))
+    if entry is None or entry[0] != route:
+        # A changed route (e.g. re-registered with other batch settings) gets a fresh batcher
+        batcher = MicroBatcher(
+            lambda body: guarded_forward(model_name, model_version, route, body, JSON_HEADERS),
+            route.batch_max_size,
+            route.batch_max_wait_ms,
+            on_queued=MODEL_QUEUE_SECONDS.labels(model_name, model_version, "batch").observe,
+        )
+        entry = batchers[(model_name, model_version)] = (route, batcher)
+    return entry[1]
+
+
+async def on_model_deployed(model: MLModel):
+    await db.run(ml_persistence.save, model)
+    forget_model(model.name, model.version)
+
+
+deployment_jobs = DeploymentJobQueue.from_env(k8s, on_model_deployed)
+batch_max_models = int(os.getenv('BATCH_MAX_MODELS', 500))
+activator = Activator.from_env(deployment_jobs.call)
+# Recreates the cluster resources of registered models that went missing, e.g. after a cluster rebuild
+reconciling = os.getenv('RECONCILER_ENABLED', 'true').lower() == 'true'
+reconciler = Reconciler.from_env(deployment_jobs, lambda: db.run(ml_persistence.get_all))
+fleet_max_models = int(os.getenv('FLEET_MAX_MODELS', 1000))
+
+
+router_stats_persistence = RouterStatsPersistence(db)
+# Pod name under Kubernetes; keys the numbers this replica publishes for the fleet dashboard
+router_replica = os.getenv('ROUTER_REPLICA_NAME') or socket.gethostname()
+
+
+def model_live_stats() -> List[Tuple[str, str, dict]]:
+    """This router replica's mergeable traffic, cache and batching numbers of every model it served (see FleetStats.merge)."""
+    stats = []
+    for model_name, model_version in set(load_tracker.models) | set(response_cache.lookups_by_model) | set(batchers):
+        traffic = load_tracker.window_counts(model_name, model_version)
+        if traffic is not None:
+            traffic["latency_histogram"] = latency_histogram(traffic.pop("latencies"))
+        entry = batchers.get((model_name, model_version))
+        stats.append((model_name, model_version, {
+            "traffic": traffic,
+            "cache": response_cache.model_stats(model_name, model_version),
+            "batching": None if entry is None else {"batches": entry[1].batches, "items": entry[1].items},
+        }))
+    return stats
+
+
+fleet_stats = FleetStats.from_env(
+    lambda: db.run(lambda: list(ml_persistence.list_models(FLEET_COLUMNS, fleet_max_models))),
+    lambda: deployment_jobs.call("deployment_replicas"),
+    model_live_stats,
+    lambda stats, retention: db.run(router_stats_persistence.publish, router_replica, stats, retention),
+    lambda max_age: db.run(router_stats_persistence.load, max_age),
+)
+# Keeps recently used model images pulled on every node and reports how fast new model pods get ready
+prepulling = os.getenv('IMAGE_PREPULL_ENABLED', 'true').lower() == 'true'
+warm_pool = ImageWarmPool.from_env(
+    deployment_jobs,
+    lambda: db.run(ml_persistence.images_by_recent_use),
+    lambda keys: db.run(ml_persistence.mark_used, keys),
+    lambda max_age: db.run(ml_persistence.pull_failures, max_age),
+    lambda images: db.run(ml_persistence.record_pull_failures, images),
+    lambda: {key: load.total for key, load in load_tracker.models.items()},
+)
+pod_starts = PodStartTracker(lambda pod, container: deployment_jobs.call("image_was_present", pod, container))
+
+
+async def on_models_deployed(models: List[MLModel]):
+    await db.run(ml_persistence.save_many, models)
+    for model in models:
+        forget_model(model.name, model.version)
+
+
+def check_model(model: MLModel):
+    """Reject settings that would only fail later, in the deployment job or on the inference path."""
+    try:
+        MLDeployer.autoscaling_metric(model)
+        MLDeployer.check_resource_profile(model)
+        if model.payload_format is not None:
+            # Without a payload_format the schemas are free-text descriptions
+            TensorSchema.parse(model.input_schema)
+            TensorSchema.parse(model.output_schema)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Model {model.name}:{model.version}: {e}")
+    if model.payload_format is not None and model.payload_format not in PAYLOAD_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model {model.name}:{model.version}: payload_format must be one of {', '.join(PAYLOAD_FORMATS)}",
+        )
+    if model.payload_format == "safetensors" and model.batch_max_size:
+        raise HTTPException(status_code=400, detail=f"Model {model.name}:{model.version}: batching requires JSON payloads")
+    if model.hedge_percentile is not None and not 0 < model.hedge_percentile < 100:
+        raise HTTPException(status_code=400, detail=f"Model {model.name}:{model.version}: hedge_percentile must be between 0 and 100")
+    if model.breaker_error_rate is not None and not 0 < model.breaker_error_rate <= 1:
+        raise HTTPException(status_code=400, detail=f"Model {model.name}:{model.version}: breaker_error_rate must be in (0, 1]")
+    for field in ("max_retries", "retry_budget_percent", "breaker_open_seconds"):
+        if (getattr(model, field) or 0) < 0:
+            raise HTTPException(status_code=400, detail=f"Model {model.name}:{model.version}: {field} must not be negative")
+
+
+def check_batch(keys: List[tuple]):
+    if len(keys) > batch_max_models:
+        raise HTTPException(status_code=413, detail=f"Batch of {len(keys)} models exceeds the limit of {batch_max_models}")
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=400, detail="Batch contains duplicate (name, version) pairs")
+
 
 @app.get("/db/version")
 async def get_db_version():
-    version = db.db_version()
+    version = await db.run(db.db_version)
     return {"message": "Connected to PostgreSQL", "db_version": version}
 
-@app.post("/model")
+
+@app.post("/model", status_code=202)
 async def create_model(model: MLModel):
+    check_model(model)
+
+    # Deployment, autoscaler and service are created in the background; poll /jobs/{job_id}
+    try:
+        job = deployment_jobs.submit(model)
+    except DeploymentQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    return {"status": "Model deployment queued", "job_id": job.id, "status_url": f"/jobs/{job.id}", **model.dict()}
+
+
+@app.post("/placement")
+async def estimate_placement(model: MLModel):
+    """How many replicas of a model (registered or not) would fit on the cluster's nodes right now."""
+    check_model(model)
     try:
-        model = k8s.deploy_model(model)  # Deploy the model with a single pod
-        model = k8s.apply_horizontal_autoscaler(model)  # Create the horizontal autoscaler
-        model = k8s.create_cluster_ip_service(model)  # Create the ClusterIP service
+        return await deployment_jobs.call("placement", model)
+    except ApiException as e:
+        raise HTTPException(status_code=502, detail=f"Failed to read cluster capacity: {e.reason}")
+
 
+@app.get("/jobs/{job_id}")
+async def get_deployment_job(job_id: str):
+    try:
+        job = deployment_jobs.get(job_id)
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=404, detail=str(e))
 
-    ml_persistence.save(model)
-    return {"status": "Model deployed", **model.dict()}
+    return job.to_dict()
 
 
 @app.delete("/model/{model_name}/{model_version}")
-def delete_model(model_name: str, model_version: str):
+async def delete_model(model_name: str, model_version: str):
+    # Checked before any resource goes away; the delete itself refuses a version added to a split since
+    if await db.run(ml_persistence.in_traffic_splits, [(model_name, model_version)]):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Model {model_name}:{model_version} is still part of its traffic split, remove it from /traffic/{model_name} first",
+        )
     try:
-        k8s.delete_model(model_name, model_version)
+        await deployment_jobs.call("delete_model", model_name, model_version)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     try:
-        ml_persistence.delete(model_name, model_version)
+        await db.run(ml_persistence.delete, model_name, model_version)
+    except ModelInUse as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    finally:
+        forget_model(model_name, model_version)
 
     return {"status": "Model deleted"}
 
 
+@app.post("/models:batch")
+async def create_models(models: List[MLModel]):
+    check_batch([(model.name, model.version) for model in models])
+    for model in models:
+        check_model(model)
+    jobs = await deployment_jobs.deploy_batch(models, on_models_deployed)
+
+    return {
+        "deployed": sum(1 for job in jobs if job.status == "succeeded"),
+        "failed": sum(1 for job in jobs if job.status == "failed"),
+        "results": [job.to_dict() for job in jobs],
+    }
+
+
+@app.delete("/models:batch")
+async def delete_models(keys: List[MLModelKey]):
+    pairs = [(key.name, key.version) for key in keys]
+    check_batch(pairs)
+    in_use = set(await db.run(ml_persistence.in_traffic_splits, pairs))
+    deletable = [pair for pair in pairs if pair not in in_use]
+    deleted_resources = dict(zip(deletable, await deployment_jobs.delete_batch(deletable)))
+    errors = [
+        deleted_resources[pair] if pair in deleted_resources else f"Model {pair[0]}:{pair[1]} is still part of its traffic split"
+        for pair in pairs
+    ]
+
+    deleted = set()
+    try:
+        deleted = set(await db.run(ml_persistence.delete_many, [pair for pair, error in zip(pairs, errors) if error is None]))
+    except Exception as e:
+        errors = [error or f"Failed to delete model metadata: {e}" for error in errors]
+    finally:
+        for name, version in deletable:
+            forget_model(name, version)
+
+    results = []
+    for (name, version), error in zip(pairs, errors):
+        if error is None and (name, version) not in deleted:
+            error = f"Model metadata {name}:{version} not found"
+        results.append({"model_name": name, "model_version": version, "status": "failed" if error else "deleted", "error": error})
+    return {
+        "deleted": sum(1 for result in results if result["status"] == "deleted"),
+        "failed": sum(1 for result in results if result["status"] == "failed"),
+        "results": results,
+    }
+
+
+@app.get("/models")
+async def list_models(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    framework: Optional[str] = None,
+    author: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated subset of model fields to return"),
+):
+    try:
+        after = ml_persistence.decode_cursor(cursor) if cursor else None
+        columns = ml_persistence.projection([field.strip() for field in fields.split(",")]) if fields else COLUMNS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The page is bounded, so it is read in full before answering: no pooled connection waits on a slow
+    # client, and a database error is a 500 rather than a truncated 200. One row past the page size
+    # tells whether another page exists.
+    rows = await db.run(lambda: list(ml_persistence.list_models(
+        columns, limit + 1, after, name_prefix=name_prefix, tags=tags, framework=framework, author=author
+    )))
+    last = rows[limit - 1] if len(rows) > limit else None
+    next_cursor = ml_persistence.encode_cursor(last["name"], last["version"]) if last else None
+    items = b",".join(json.dumps(row).encode() for row in rows[:limit])
+    return Response(
+        content=b'{"items":[' + items + b'],"next_cursor":' + json.dumps(next_cursor).encode() + b"}",
+        media_type="application/json",
+    )
+
+
 @app.get("/model/{model_name}/{model_version}", response_model=MLModel)
 async def get_model(model_name: str, model_version: str):
     model: MLModel
     try:
-        model = ml_persistence.get(model_name, model_version)
+        model = await db.run(ml_persistence.get, model_name, model_version)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -73,34 +526,455 @@ async def get_model(model_name: str, model_version: str):
     }
 
 
-@app.get("/")
-def hello_world():
-    return {"Hello": "World"}
+@app.patch("/model/{model_name}/{model_version}/replicas")
+async def resize_model(model_name: str, model_version: str, replicas: ReplicaRange):
+    """Change a deployed model's replica range: its autoscaler is patched in place, then the stored range."""
+    try:
+        model = await db.run(ml_persistence.get, model_name, model_version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    model = model.model_copy(update=replicas.model_dump(exclude_none=True))
+    low, high = model.min_replicas, model.max_replicas
+    if low is None or high is None or not 0 <= low <= high or high < 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model {model_name}:{model_version}: need 0 <= min_replicas <= max_replicas and max_replicas >= 1",
+        )
 
+    try:
+        await deployment_jobs.call("resize_autoscaler", model)
+    except ApiException as e:
+        raise HTTPException(
+            status_code=404 if e.status == 404 else 502,
+            detail=f"Failed to resize the autoscaler of {model_name}:{model_version}: {e.reason}",
+        )
+    try:
+        await db.run(ml_persistence.set_replicas, model_name, model_version, low, high)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    # Only the route changed, the model's load, breaker, admission and metrics history stay
+    route_table.invalidate(model_name, model_version)
 
-if __name__ == "__main__":
-    import uvicorn
+    return {"status": "Model replicas updated", "min_replicas": model.min_replicas, "max_replicas": model.max_replicas}
+
+
+@app.put("/traffic/{model_name}")
+async def put_traffic(model_name: str, split: TrafficSplit):
+    try:
+        await db.run(traffic_persistence.save_traffic, model_name, split)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    traffic_router.invalidate(model_name)
+
+    return await db.run(traffic_persistence.get_traffic, model_name)
 
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
 
+@app.get("/traffic/{model_name}", response_model=TrafficSplit)
+async def get_traffic(model_name: str):
+    try:
+        return await db.run(traffic_persistence.get_traffic, model_name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.delete("/traffic/{model_name}")
+async def delete_traffic(model_name: str):
+    try:
+        await db.run(traffic_persistence.delete_traffic, model_name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    finally:
+        traffic_router.invalidate(model_name)
+
+    return {"status": "Traffic split deleted"}
+
+
+@app.post("/predict/{model_name}")
+async def predict_any_version(model_name: str, request: Request):
+    """Serve the request from a version picked by the model's traffic split (PUT /traffic/{model_name})."""
+    try:
+        split = await traffic_router.lookup(model_name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    model_version = split.pick()
+    shadow_version = split.shadow()
+    if shadow_version is not None and len(shadow_tasks) < shadow_max_in_flight:
+        task = asyncio.create_task(shadow(model_name, shadow_version, await request.body(), request.headers.raw))
+        shadow_tasks.add(task)
+        task.add_done_callback(shadow_tasks.discard)
+
+    started = time.perf_counter()
+    failed = True
+    try:
+        with tracer.span("predict", request.headers.raw, model=model_name, version=model_version):
+            response = await serve_prediction(model_name, model_version, request)
+        failed = response.status_code >= 500
+    except HTTPException as e:
+        failed = e.status_code >= 500
+        raise
+    finally:
+        rollouts.record(model_name, model_version, time.perf_counter() - started, failed)
+    response.headers["x-model-version"] = model_version
+    return response
+
+
+async def shadow(model_name: str, model_version: str, body: bytes, headers: List[Tuple[bytes, bytes]]):
+    """Send a copy of a request to a shadow version, only recording how it fared.
+
+    The copy takes the same path a direct request to that version would, converted to its
+    payload format and through its batcher, so it fails only where the version itself would.
+    """
+    started = time.perf_counter()
+    failed = True
+    try:
+        route = await route_table.lookup(model_name, model_version)
+        body, headers = convert_request(route, body, headers, payload_format(Headers(raw=headers).get("content-type")))
+        if route.scales_to_zero:
+            await activator.ensure_ready(model_name, model_version, route.idle_timeout_seconds)
+            started = time.perf_counter()
+        if route.batch_max_size:
+            status_code, _, _ = await batcher_for(model_name, model_version, route).submit(body)
+        else:
+            status_code, _, _ = await forward(model_name, model_version, route, body, headers)
+        failed = status_code >= 500
+    except (PayloadError, orjson.JSONDecodeError):
+        failed = None  # An invalid request body says nothing about the shadow version
+    except Exception as e:
+        print(f"Shadow request to {model_name}:{model_version} failed: {e}")
+    finally:
+        if failed is not None:
+            rollouts.record(model_name, model_version, time.perf_counter() - started, failed)
+
+
+@app.post("/predict/{model_name}/{model_version}")
+async def predict(model_name: str, model_version: str, request: Request):
+    with tracer.span("predict", request.headers.raw, model=model_name, version=model_version):
+        return await serve_prediction(model_name, model_version, request)
+
+
+def admission_headers(headers: Headers) -> Tuple[int, Optional[float]]:
+    """Parse the x-request-priority (high, normal or low) and x-request-timeout-ms headers."""
+    priority = headers.get("x-request-priority", "normal").lower()
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid x-request-priority {priority}, expected one of {', '.join(PRIORITIES)}")
+    timeout_ms = headers.get("x-request-timeout-ms")
+    if timeout_ms is not None:
+        try:
+            timeout_ms = float(timeout_ms)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid x-request-timeout-ms {timeout_ms}")
+    return PRIORITIES[priority], timeout_ms
+
+
+async def serve_prediction(model_name: str, model_version: str, request: Request) -> Response:
+    arrived_at = time.monotonic()
+    try:
+        route = await route_table.lookup(model_name, model_version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    priority = deadline = None
+    if route.max_concurrency:
+        priority, timeout_ms = admission_headers(request.headers)
+        deadline = admission.deadline(arrived_at, timeout_ms, route.queue_timeout_ms)
+
+    if route.scales_to_zero:
+        await activate(model_name, model_version, route)
+
+    async def fetch():
+        # Cache hits skip admission, only calls to the model take one of its slots
+        await admit(model_name, model_version, route, priority, deadline)
+        # Only requests that reach the model count towards its load (not cache hits)
+        load = load_tracker.start(model_name, model_version)
+        started = time.perf_counter()
+        failed = True
+        try:
+            if route.batch_max_size:
+                response = await batcher_for(model_name, model_version, route).submit(body)
+            else:
+                response = await guarded_forward(model_name, model_version, route, body, headers)
+            failed = response[0] >= 500
+            return response
+        finally:
+            load_tracker.finish(load, time.perf_counter() - started, failed)
+            if route.max_concurrency:
+                admission.release(model_name, model_version)
+
+    try:
+        if route.streaming:
+            return await stream_prediction(model_name, model_version, route, request, priority, deadline)
+        client_format = payload_format(request.headers.get("content-type"))
+        body, headers = convert_request(route, await request.body(), request.headers.raw, client_format)
+        if route.cache_ttl_seconds:
+            status_code, headers, content = await response_cache.get_or_fetch(
+                model_name, model_version, body, route.cache_ttl_seconds, fetch
+            )
+        else:
+            status_code, headers, content = await fetch()
+        if 200 <= status_code < 300:
+            wanted_format = accepted_format(request.headers.get("accept"), client_format)
+            headers, content = convert_response(route, headers, content, wanted_format)
+    except AdmissionRejected as e:
+        ADMISSION_REJECTIONS.labels(model_name, model_version, e.reason).inc()
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": admission_retry_after})
+    except CircuitOpen as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except PayloadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Batched models require a JSON request body: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=f"Model {model_name}:{model_version} returned an invalid batch: {e}")
+    except httpx.TimeoutException as e:
+        raise HTTPException(status_code=504, detail=f"Model {model_name}:{model_version} timed out: {e}")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Model {model_name}:{model_version} unreachable: {e}")
+
+    response = Response(content=content, status_code=status_code)
+    response.raw_headers.extend(headers)
+    return response
+
+
+def convert_request(route: Route, body: bytes, headers: List[Tuple[bytes, bytes]],
+                    client_format: str) -> Tuple[bytes, List[Tuple[bytes, bytes]]]:
+    """Convert a request body to the model's payload format, validating tensor payloads against its input schema.
+
+    A tensor payload that is already in the model's format is only checked by its header and
+    forwarded as the very same bytes; JSON for a JSON model is passed through without parsing.
+    """
+    model_format = route.payload_format or "json"
+    if client_format == model_format:
+        if client_format == "safetensors":
+            validate(route.input_schema, body)
+        return body, headers
+    if model_format == "safetensors":
+        body = json_to_safetensors(body, route.input_schema)
+    else:
+        body = safetensors_to_json(body, route.input_schema)
+    return body, with_content_type(headers, PAYLOAD_FORMATS[model_format])
+
+
+def convert_response(route: Route, headers: List[Tuple[bytes, bytes]], content: bytes,
+                     wanted_format: str) -> Tuple[List[Tuple[bytes, bytes]], bytes]:
+    """Convert a successful model response to the format the client asked for; bad tensor output is a 502."""
+    content_type = next((value.decode("latin-1") for key, value in headers if key.lower() == b"content-type"), None)
+    response_format = payload_format(content_type)
+    if response_format == "json" and JSON_CONTENT_TYPE not in (content_type or "").lower():
+        return headers, content  # Neither JSON nor tensors, e.g. text or an image
+    try:
+        if response_format == wanted_format:
+            if response_format == "safetensors":
+                validate(route.output_schema, content)
+            return headers, content
+        if wanted_format == "safetensors":
+            content = json_to_safetensors(content, route.output_schema)
+        else:
+            content = safetensors_to_json(content, route.output_schema)
+    except PayloadError as e:
+        raise PayloadError(f"Model returned an invalid tensor payload: {e}", status_code=502)
+    return with_content_type(headers, PAYLOAD_FORMATS[wanted_format]), content
+
+
+async def activate(model_name: str, model_version: str, route: Route):
+    started = time.perf_counter()
+    try:
+        await activator.ensure_ready(model_name, model_version, route.idle_timeout_seconds)
+    except ActivatorQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ActivationTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ApiException as e:
+        raise HTTPException(status_code=502, detail=f"Failed to activate {model_name}:{model_version}: {e.reason}")
+    finally:
+        MODEL_QUEUE_SECONDS.labels(model_name, model_version, "activation").observe(time.perf_counter() - started)
 
-"""
-@app.get("/test2")
-def test():
-    service_name = "nginx-v1-service"
-    url = f"http://{service_name}/"
 
+async def admit(model_name: str, model_version: str, route: Route, priority: Optional[int], deadline: Optional[float]):
+    """Wait for one of the model's admission slots if it has a concurrency limit; raises AdmissionRejected."""
+    if not route.max_concurrency:
+        return
+    started = time.perf_counter()
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for HTTP errors (4xx, 5xx)
+        await admission.acquire(model_name, model_version, route.max_concurrency, route.max_queue_depth, priority, deadline)
+    finally:
+        MODEL_QUEUE_SECONDS.labels(model_name, model_version, "admission").observe(time.perf_counter() - started)
 
-        # Print the response
-        print(f"Response from {url}:")
-        print(response.text)
 
-        return {"status_code": response.status_code, "response": response.text}
+async def stream_prediction(model_name: str, model_version: str, route: Route, request: Request,
+                            priority: Optional[int], deadline: Optional[float]) -> StreamingResponse:
+    """Relay the request body to a pod as it arrives and its response back as it is produced.
+
+    Nothing is buffered or decoded: chunks are read from one side only when the other side has
+    taken the previous one. The admission slot, load count and pod are held until the response
+    has been fully sent or the client went away.
+    """
+    await admit(model_name, model_version, route, priority, deadline)
+    load = load_tracker.start(model_name, model_version)
+    started = time.perf_counter()
+    pod = endpoint_balancer.acquire(route.service_name)
+    host = route.service_name if pod is None else pod.address
+    upstream = None
+    failed = False
+    finished = False
+
+    async def finish():
+        # Runs from the body iterator and from the response's background task, whichever comes first
+        nonlocal finished
+        if finished:
+            return
+        finished = True
+        if upstream is not None:
+            await upstream.aclose()
+        if pod is not None:
+            endpoint_balancer.release(pod, failed)
+        load_tracker.finish(load, time.perf_counter() - started, failed)
+        if route.max_concurrency:
+            admission.release(model_name, model_version)
+        MODEL_UPSTREAM_SECONDS.labels(model_name, model_version).observe(time.perf_counter() - started)
+
+    async def relay():
+        nonlocal failed
+        first = True
+        try:
+            async for chunk in upstream.aiter_raw():
+                if first:
+                    MODEL_UPSTREAM_FIRST_BYTE_SECONDS.labels(model_name, model_version).observe(time.perf_counter() - started)
+                    first = False
+                yield chunk
+        except httpx.HTTPError as e:
+            # Headers are already sent; raising drops the connection so the client sees a truncated
+            # response rather than one that ends cleanly
+            failed = isinstance(e, httpx.TransportError)
+            MODEL_UPSTREAM_ERRORS.labels(model_name, model_version).inc()
+            raise
+        finally:
+            await finish()
+
+    try:
+        with tracer.span("upstream", model=model_name, version=model_version, host=host):
+            upstream = await inference_proxy.open_stream(
+                host, route.port, route.endpoint, request.stream(), tracer.inject(request.headers.raw)
+            )
+        failed = upstream.status_code in UNAVAILABLE_STATUSES
+    except BaseException as e:
+        if isinstance(e, Exception):
+            failed = isinstance(e, httpx.TransportError)
+            MODEL_UPSTREAM_ERRORS.labels(model_name, model_version).inc()
+        await finish()
+        raise
+    response = StreamingResponse(relay(), status_code=upstream.status_code, background=BackgroundTask(finish))
+    response.raw_headers.extend(filter_headers(upstream.headers.raw))
+    return response
+
+
+@app.websocket("/predict/{model_name}/{model_version}")
+async def predict_websocket(websocket: WebSocket, model_name: str, model_version: str):
+    """Relay a WebSocket session to one of the model's pods, e.g. for bidirectional token streaming."""
+    arrived_at = time.monotonic()
+    try:
+        route = await route_table.lookup(model_name, model_version)
+    except ValueError as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+    priority = deadline = None
+    try:
+        if route.max_concurrency:
+            priority, timeout_ms = admission_headers(websocket.headers)
+            deadline = admission.deadline(arrived_at, timeout_ms, route.queue_timeout_ms)
+        if route.scales_to_zero:
+            await activate(model_name, model_version, route)
+    except HTTPException as e:
+        code = status.WS_1013_TRY_AGAIN_LATER if e.status_code >= 500 else status.WS_1008_POLICY_VIOLATION
+        raise WebSocketException(code=code, reason=e.detail)
+    try:
+        # A session holds its admission slot for as long as it stays open
+        await admit(model_name, model_version, route, priority, deadline)
+    except AdmissionRejected as e:
+        ADMISSION_REJECTIONS.labels(model_name, model_version, e.reason).inc()
+        raise WebSocketException(code=status.WS_1013_TRY_AGAIN_LATER, reason=str(e))
+
+    load = load_tracker.start(model_name, model_version)
+    pod = endpoint_balancer.acquire(route.service_name)
+    host = route.service_name if pod is None else pod.address
+    failed = False
+    try:
+        await inference_proxy.relay_websocket(websocket, host, route.port, route.endpoint)
+    except (OSError, asyncio.TimeoutError, InvalidHandshake) as e:
+        failed = not isinstance(e, InvalidHandshake)
+        MODEL_UPSTREAM_ERRORS.labels(model_name, model_version).inc()
+        print(f"WebSocket to {model_name}:{model_version} failed: {e}")
+        if websocket.client_state == WebSocketState.CONNECTING:
+            raise WebSocketException(code=status.WS_1011_INTERNAL_ERROR, reason=f"Model {model_name}:{model_version} unreachable")
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+    finally:
+        if pod is not None:
+            endpoint_balancer.release(pod, failed)
+        load_tracker.finish(load, failed=failed)
+        if route.max_concurrency:
+            admission.release(model_name, model_version)
+
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return response_cache.stats()
+
+
+@app.get("/balancer/stats")
+async def get_balancer_stats():
+    return endpoint_balancer.stats()
+
+
+@app.get("/rollouts/stats")
+async def get_rollout_stats():
+    return rollouts.stats()
+
+
+@app.get("/reconciler/stats")
+async def get_reconciler_stats():
+    return reconciler.stats()
+
+
+@app.get("/warmpool/stats")
+async def get_warm_pool_stats():
+    return warm_pool.stats()
+
+
+@app.get("/startup/stats")
+async def get_startup_stats():
+    return pod_starts.stats()
+
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    return admission.stats()
+
+
+@app.get("/resilience/stats")
+async def get_resilience_stats():
+    return request_guard.stats()
+
+
+@app.get("/fleet/stats")
+async def get_fleet_stats():
+    return await fleet_stats.get()
+
+
+@app.get("/activator/stats")
+async def get_activator_stats():
+    return activator.stats()
+
+
+@app.get("/")
+def hello_world():
+    return {"Hello": "World"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
 
-    except requests.exceptions.RequestException as e:
-        print(f"RequestException: {e}")
-        return {"error": str(e)}
-"""
\ No newline at end of file
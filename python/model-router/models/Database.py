@@ -1,6 +1,27 @@
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Sequence
+import asyncio
+import functools
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
 import os
+import select
+import threading
+import time
+from monitoring.Metrics import DB_OPERATION_ERRORS, DB_OPERATION_SECONDS, DB_POOL_WAIT_SECONDS, timed
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers its server-side prepared statements and last use."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.last_used = time.monotonic()
+
 
 @dataclass
 class Database:
@@ -9,6 +30,14 @@ class Database:
     db_password: str
     db_host: str
     db_port: int  # Make port an integer for type safety
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    pool_check_interval: float = 30.0  # Idle seconds after which a pooled connection is health checked
+    statements: Dict[str, str] = field(default_factory=dict, init=False, repr=False)
+    _pool: Optional[psycopg2.pool.ThreadedConnectionPool] = field(default=None, init=False, repr=False)
+    _pool_slots: Optional[threading.BoundedSemaphore] = field(default=None, init=False, repr=False)
+    _pool_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, init=False, repr=False)
 
     @classmethod
     def from_env(cls):
@@ -19,22 +48,147 @@ class Database:
             db_password=os.getenv('POSTGRES_PASSWORD'),
             db_host=os.getenv('POSTGRES_HOST'),
             db_port=int(os.getenv('POSTGRES_PORT', 5432)),
+            pool_min_size=int(os.getenv('POSTGRES_POOL_MIN_SIZE', 1)),
+            pool_max_size=int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+            pool_check_interval=float(os.getenv('POSTGRES_POOL_CHECK_INTERVAL', 30.0)),
         )
 
-    def connect(self):
-        """Establish a connection to the database."""
-        db_config = {
+    def connection_config(self):
+        return {
             'dbname': self.db_name,
             'user': self.db_user,
             'password': self.db_password,
             'host': self.db_host,
             'port': self.db_port,
         }
-        return psycopg2.connect(**db_config)
 
+    def pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool_slots = threading.BoundedSemaphore(self.pool_max_size)
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        self.pool_min_size,
+                        self.pool_max_size,
+                        connection_factory=PooledConnection,
+                        **self.connection_config(),
+                    )
+        return self._pool
+
+    def checkout(self) -> PooledConnection:
+        """Borrow a healthy connection from the pool, blocking while all of them are in use."""
+        started = time.perf_counter()
+        pool = self.pool()
+        self._pool_slots.acquire()
+        try:
+            while True:
+                conn = pool.getconn()
+                if not conn.closed and (time.monotonic() - conn.last_used < self.pool_check_interval
+                                        or self.is_healthy(conn)):
+                    DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+                    return conn
+                pool.putconn(conn, close=True)
+        except BaseException:
+            self._pool_slots.release()
+            raise
+
+    def checkin(self, conn: PooledConnection, broken: bool = False):
+        conn.last_used = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            self._pool_slots.release()
+
+    @staticmethod
+    def is_healthy(conn: PooledConnection) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextmanager
+    def connect(self):
+        """Borrow a pooled connection for one transaction; commits on success, rolls back on error."""
+        conn = self.checkout()
+        broken = False
+        try:
+            with conn:
+                yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.checkin(conn, broken)
+
+    def prepare(self, name: str, sql: str):
+        """Register a statement (using $1, $2... placeholders) to be prepared lazily on each connection."""
+        self.statements[name] = sql
+
+    def execute_prepared(self, cursor, name: str, params: Sequence):
+        conn = cursor.connection
+        if name not in conn.prepared:
+            cursor.execute(f"PREPARE {name} AS {self.statements[name]}")
+            conn.prepared.add(name)
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._pool_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.pool_max_size, thread_name_prefix="db"
+                    )
+        return self._executor
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run a blocking database call on the bounded DB thread pool without stalling the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor(), functools.partial(fn, *args, **kwargs))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
     def db_version(self):
         with self.connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("SELECT version();")
                 record = cursor.fetchone()
-                return record[0]
\ No newline at end of file
+                return record[0]
+
+    def listen(self, channel: str, callback: Callable[[str], None], stop: threading.Event,
+               on_connect: Callable[[], None] = None):
+        """Block on LISTEN <channel>, invoking callback with each NOTIFY payload until stop is set.
+
+        Uses a dedicated connection outside the pool. Reconnects on failure; on_connect runs
+        after every (re)connect since notifications sent while disconnected are lost.
+        """
+        while not stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.connection_config())
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {channel};")
+                if on_connect:
+                    on_connect()
+                while not stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        callback(conn.notifies.pop(0).payload)
+            except psycopg2.Error as e:
+                print(f"Exception while listening on {channel}: {e}")
+                stop.wait(5.0)
+            finally:
+                if conn is not None:
+                    conn.close()
@@ -23,3 +23,60 @@ class MLModel(BaseModel):
     metrics: Optional[Dict[str, float]] = None
     endpoint: Optional[str] = None
     environment_variables: Optional[Dict[str, str]] = None
+    # Dynamic micro-batching: when batch_max_size is set the router buffers concurrent requests for up to
+    # batch_max_wait_ms and sends the endpoint a JSON array of request bodies, expecting an array of
+    # responses of the same length back.
+    batch_max_size: Optional[int] = None
+    batch_max_wait_ms: Optional[float] = None
+    # Opt-in response cache: identical request bodies are answered from the router for this many seconds
+    cache_ttl_seconds: Optional[float] = None
+    # With min_replicas=0 the model is scaled to zero after this many idle seconds (router default otherwise)
+    idle_timeout_seconds: Optional[float] = None
+    # HPA signal: "cpu" (default, target in % utilization), "inflight" or "rps" (target per pod, from router metrics)
+    autoscaling_metric: Optional[str] = None
+    autoscaling_target: Optional[float] = None
+    scale_up_stabilization_seconds: Optional[int] = None
+    scale_down_stabilization_seconds: Optional[int] = None
+    # Admission control per router replica: at most max_concurrency requests in flight to the model, up to
+    # max_queue_depth more waiting (defaults to max_concurrency) for at most queue_timeout_ms unless the caller
+    # sends a shorter x-request-timeout-ms
+    max_concurrency: Optional[int] = None
+    max_queue_depth: Optional[int] = None
+    queue_timeout_ms: Optional[float] = None
+    # Relay request and response bodies chunk by chunk (chunked transfer, SSE) instead of buffering them, for
+    # large payloads and token streaming; takes precedence over batching and response caching
+    streaming: Optional[bool] = None
+    # Body format the endpoint expects, "json" (default) or "safetensors"; the router converts requests sent in
+    # the other format. When it is set, input_schema/output_schema given as JSON, e.g. {"features": {"dtype":
+    # "float32", "shape": [-1, 128]}}, are enforced on tensor payloads; otherwise they stay free text
+    payload_format: Optional[str] = None
+    # Resource profile as Kubernetes quantities (e.g. "2", "500m", "4Gi"); requests default to the limits or the
+    # router's defaults, and thread-count env vars (OMP_NUM_THREADS, ...) follow the CPU limit
+    cpu_request: Optional[str] = None
+    cpu_limit: Optional[str] = None
+    memory_request: Optional[str] = None
+    memory_limit: Optional[str] = None
+    # Node label -> allowed values, all required to match; anti_affinity "preferred" or "required" keeps
+    # replicas on separate nodes
+    node_affinity: Optional[Dict[str, List[str]]] = None
+    anti_affinity: Optional[str] = None
+    # Tail latency protection: hedge_percentile (e.g. 95) sends a second copy to another pod once a request is
+    # slower than that percentile, max_retries retries failed attempts on another pod; both spend a budget of
+    # retry_budget_percent (default 10) of the requests. The breaker fails fast for breaker_open_seconds
+    # (default 30) once breaker_error_rate (0-1) of the recent requests failed (5xx or no answer)
+    hedge_percentile: Optional[float] = None
+    max_retries: Optional[int] = None
+    retry_budget_percent: Optional[float] = None
+    breaker_error_rate: Optional[float] = None
+    breaker_open_seconds: Optional[float] = None
+
+
+class MLModelKey(BaseModel):
+    name: str
+    version: str
+
+
+class ReplicaRange(BaseModel):
+    # Fields left out keep their current value
+    min_replicas: Optional[int] = None
+    max_replicas: Optional[int] = None
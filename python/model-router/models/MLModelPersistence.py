@@ -1,128 +1,403 @@
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+import base64
 import json
+import threading
+import psycopg2.extras
 from models.MLModel import MLModel  # Correct the import path
 from models.Database import Database  # Correct the import path
+from monitoring.Metrics import DB_OPERATION_ERRORS, DB_OPERATION_SECONDS, timed
+
+# NOTIFY channel used to tell every router replica that a model row changed
+CHANGE_CHANNEL = "ml_models_changed"
+
+# ml_models columns in MLModel field order; JSON_COLUMNS are stored as JSONB
+COLUMNS = (
+    "image_url", "exposed_port", "name", "version", "min_replicas", "max_replicas", "description",
+    "created_at", "author", "tags", "dependencies", "input_schema", "output_schema", "license",
+    "framework", "hyperparameters", "metrics", "endpoint", "environment_variables",
+    "batch_max_size", "batch_max_wait_ms", "cache_ttl_seconds", "idle_timeout_seconds",
+    "autoscaling_metric", "autoscaling_target", "scale_up_stabilization_seconds", "scale_down_stabilization_seconds",
+    "max_concurrency", "max_queue_depth", "queue_timeout_ms", "streaming", "payload_format",
+    "cpu_request", "cpu_limit", "memory_request", "memory_limit", "node_affinity", "anti_affinity",
+    "hedge_percentile", "max_retries", "retry_budget_percent", "breaker_error_rate", "breaker_open_seconds",
+)
+JSON_COLUMNS = frozenset({"dependencies", "hyperparameters", "metrics", "environment_variables", "node_affinity"})
+# Columns the inference path needs to route a request, see get_routing
+ROUTING_COLUMNS = (
+    "exposed_port", "endpoint", "batch_max_size", "batch_max_wait_ms", "cache_ttl_seconds",
+    "min_replicas", "idle_timeout_seconds", "max_concurrency", "max_queue_depth", "queue_timeout_ms",
+    "streaming", "payload_format", "input_schema", "output_schema",
+    "hedge_percentile", "max_retries", "retry_budget_percent", "breaker_error_rate", "breaker_open_seconds",
+)
+# Columns always returned by list_models since the pagination cursor is built from them
+KEY_COLUMNS = ("name", "version")
+
+# Whether a traffic split still routes to, shadows or rolls out the ml_models row; such a version cannot be deleted
+IN_TRAFFIC_SPLIT_SQL = """
+    EXISTS (
+        SELECT 1 FROM model_traffic
+        WHERE model_traffic.name = ml_models.name AND (
+            model_traffic.weights ? ml_models.version
+            OR model_traffic.shadow_version = ml_models.version
+            OR model_traffic.rollout->>'candidate' = ml_models.version
+        )
+    )
+"""
+
+# Re-registering a (name, version) replaces its metadata but keeps the original created_at
+UPSERT_CONFLICT_SQL = f"""
+    ON CONFLICT (name, version) DO UPDATE SET
+    {", ".join(f"{column} = EXCLUDED.{column}" for column in COLUMNS if column not in ("name", "version", "created_at"))}
+"""
+UPSERT_SQL = f"""
+    INSERT INTO ml_models ({", ".join(COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(COLUMNS))})
+    {UPSERT_CONFLICT_SQL}
+"""
+# Multi-row variant for psycopg2.extras.execute_values
+UPSERT_MANY_SQL = f"""
+    INSERT INTO ml_models ({", ".join(COLUMNS)})
+    VALUES %s
+    {UPSERT_CONFLICT_SQL}
+"""
+
+
+class ModelInUse(Exception):
+    pass
+
 
 class MLModelPersistence:
     db: Database
     def __init__(self, db: Database):
         self.db = db
+        self.db.prepare(
+            "ml_models_get_routing",
+            f"SELECT {', '.join(ROUTING_COLUMNS)} FROM ml_models WHERE name = $1 AND version = $2"
+        )
 
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def get_routing(self, model_name: str, model_version: str) -> dict:
+        """Fetch only the ROUTING_COLUMNS needed to route an inference request."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                self.db.execute_prepared(cursor, "ml_models_get_routing", (model_name, model_version))
+                row = cursor.fetchone()
+                if row:
+                    return dict(zip(ROUTING_COLUMNS, row))
+                else:
+                    raise ValueError(f"Model {model_name}:{model_version} not found")
+
+    def listen_for_changes(self, callback: Callable[[Optional[Tuple[str, str]]], None], stop: threading.Event):
+        """Invoke callback with (name, version) whenever any replica saves or deletes a model.
+
+        callback(None) is sent after each (re)connect, meaning cached state should be dropped.
+        """
+        def on_notify(payload: str):
+            change = json.loads(payload)
+            callback((change["name"], change["version"]))
+
+        self.db.listen(CHANGE_CHANNEL, on_notify, stop, on_connect=lambda: callback(None))
+
+    @staticmethod
+    def notify_change(cursor, model_name: str, model_version: str):
+        cursor.execute(
+            "SELECT pg_notify(%s, %s)",
+            (CHANGE_CHANNEL, json.dumps({"name": model_name, "version": model_version}))
+        )
+
+    @staticmethod
+    def notify_changes(cursor, keys: List[Tuple[str, str]]):
+        cursor.execute(
+            "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+            (CHANGE_CHANNEL, [json.dumps({"name": name, "version": version}) for name, version in keys])
+        )
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
     def get(self, model_name: str, model_version: str) -> MLModel:
         with self.db.connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
-                    """
-                    SELECT * FROM ml_models
+                    f"""
+                    SELECT {", ".join(COLUMNS)} FROM ml_models
                     WHERE name = %s AND version = %s
                     """,
                     (model_name, model_version)
                 )
                 row = cursor.fetchone()
                 if row:
-                    return MLModel(
-                        image_url=row[1],
-                        exposed_port=row[2],
-                        name=row[3],
-                        version=row[4],
-                        min_replicas=row[5],
-                        max_replicas=row[6],
-                        description=row[7],
-                        created_at=row[8].strftime('%Y-%m-%d %H:%M:%S.%f %z') if row[8] else None,
-                        author=row[9],
-                        tags=row[10],
-                        dependencies=row[11],
-                        input_schema=row[12],
-                        output_schema=row[13],
-                        license=row[14],
-                        framework=row[15],
-                        hyperparameters=row[16],
-                        metrics=row[17],
-                        endpoint=row[18],
-                        environment_variables=row[19]
-                    )
+                    return self.row_to_model(row)
                 else:
                     raise ValueError(f"Model {model_name}:{model_version} not found")
 
-    def create_table(self):
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def get_all(self) -> List[MLModel]:
         with self.db.connect() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS ml_models (
-                        id SERIAL PRIMARY KEY,
-                        image_url TEXT NOT NULL,
-                        exposed_port INTEGER NOT NULL,
-                        name TEXT NOT NULL,
-                        version TEXT NOT NULL,
-                        min_replicas INTEGER DEFAULT 1,
-                        max_replicas INTEGER DEFAULT 10,
-                        description TEXT,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                        author TEXT,
-                        tags TEXT[],
-                        dependencies JSONB,
-                        input_schema TEXT,
-                        output_schema TEXT,
-                        license TEXT,
-                        framework TEXT,
-                        hyperparameters JSONB,
-                        metrics JSONB,
-                        endpoint TEXT,
-                        environment_variables JSONB
-                    )
-                    """
-                )
-                conn.commit()
+                cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM ml_models")
+                return [self.row_to_model(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def row_to_model(row) -> MLModel:
+        fields = dict(zip(COLUMNS, row))
+        if fields["created_at"]:
+            fields["created_at"] = fields["created_at"].strftime('%Y-%m-%d %H:%M:%S.%f %z')
+        return MLModel(**fields)
 
+    @staticmethod
+    def model_to_row(model: MLModel) -> tuple:
+        row = []
+        for column in COLUMNS:
+            value = getattr(model, column)
+            if column in JSON_COLUMNS:
+                value = json.dumps(value) if value else None
+            row.append(value)
+        return tuple(row)
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
     def delete(self, model_name: str, model_version: str) -> bool:
         with self.db.connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
-                    """
+                    f"""
                     DELETE FROM ml_models
-                    WHERE name = %s AND version = %s
+                    WHERE name = %s AND version = %s AND NOT {IN_TRAFFIC_SPLIT_SQL}
                     """,
                     (model_name, model_version)
                 )
+                deleted = cursor.rowcount
+                if deleted > 0:
+                    self.notify_change(cursor, model_name, model_version)
                 conn.commit()
-                if cursor.rowcount > 0:
+                if deleted > 0:
                     return True
+                elif self.in_traffic_splits([(model_name, model_version)]):
+                    raise ModelInUse(f"Model {model_name}:{model_version} is still part of its traffic split")
                 else:
                     raise ValueError(f"Model metadata {model_name}:{model_version} not found")
 
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def in_traffic_splits(self, keys: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """The (name, version) keys a traffic split routes to, shadows or rolls out."""
+        if not keys:
+            return []
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                rows = psycopg2.extras.execute_values(
+                    cursor,
+                    f"""
+                    SELECT ml_models.name, ml_models.version FROM ml_models
+                    JOIN (VALUES %s) AS wanted (name, version)
+                    ON ml_models.name = wanted.name AND ml_models.version = wanted.version
+                    WHERE {IN_TRAFFIC_SPLIT_SQL}
+                    """,
+                    keys,
+                    page_size=len(keys),
+                    fetch=True,
+                )
+                return [tuple(row) for row in rows]
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
     def save(self, model: MLModel):
-        self.create_table()
+        """Insert the model, or update it in place if (name, version) is already registered."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(UPSERT_SQL, self.model_to_row(model))
+                self.notify_change(cursor, model.name, model.version)
+                conn.commit()
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def set_replicas(self, model_name: str, model_version: str, min_replicas: int, max_replicas: int):
+        """Update only the replica range of a registered model, leaving its other columns as they are."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE ml_models SET min_replicas = %s, max_replicas = %s
+                    WHERE name = %s AND version = %s
+                    """,
+                    (min_replicas, max_replicas, model_name, model_version)
+                )
+                if cursor.rowcount == 0:
+                    raise ValueError(f"Model metadata {model_name}:{model_version} not found")
+                self.notify_change(cursor, model_name, model_version)
+                conn.commit()
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def save_many(self, models: List[MLModel]):
+        """Upsert many models with a single multi-row INSERT in one transaction."""
+        if not models:
+            return
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                psycopg2.extras.execute_values(
+                    cursor, UPSERT_MANY_SQL, [self.model_to_row(model) for model in models], page_size=len(models)
+                )
+                self.notify_changes(cursor, [(model.name, model.version) for model in models])
+                conn.commit()
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def delete_many(self, keys: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Delete many (name, version) rows in one transaction and return the keys deleted.
+
+        Versions still in a traffic split are left in place, as delete() refuses them.
+        """
+        if not keys:
+            return []
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                deleted = psycopg2.extras.execute_values(
+                    cursor,
+                    f"""
+                    DELETE FROM ml_models
+                    USING (VALUES %s) AS doomed (name, version)
+                    WHERE ml_models.name = doomed.name AND ml_models.version = doomed.version
+                    AND NOT {IN_TRAFFIC_SPLIT_SQL}
+                    RETURNING ml_models.name, ml_models.version
+                    """,
+                    keys,
+                    page_size=len(keys),
+                    fetch=True,
+                )
+                deleted = [tuple(row) for row in deleted]
+                if deleted:
+                    self.notify_changes(cursor, deleted)
+                conn.commit()
+                return deleted
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def mark_used(self, keys: List[Tuple[str, str]]):
+        """Record that (name, version) models just served traffic; no change notification is sent."""
+        if not keys:
+            return
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    """
+                    UPDATE ml_models SET last_used_at = now()
+                    FROM (VALUES %s) AS used (name, version)
+                    WHERE ml_models.name = used.name AND ml_models.version = used.version
+                    """,
+                    keys,
+                    page_size=len(keys),
+                )
+                conn.commit()
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def images_by_recent_use(self) -> List[str]:
+        """Distinct model images, most recently used first (models never used count from their registration)."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT image_url FROM ml_models
+                    GROUP BY image_url
+                    ORDER BY max(coalesce(last_used_at, created_at)) DESC NULLS LAST, image_url
+                    """
+                )
+                return [row[0] for row in cursor.fetchall()]
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def record_pull_failures(self, images: List[str]):
+        """Record that the pre-pull DaemonSet just failed to pull these (normalized) images."""
+        if not images:
+            return
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    """
+                    INSERT INTO image_pull_failures (image) VALUES %s
+                    ON CONFLICT (image) DO UPDATE SET failed_at = CURRENT_TIMESTAMP
+                    """,
+                    [(image,) for image in images],
+                    page_size=len(images),
+                )
+                conn.commit()
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def pull_failures(self, max_age_seconds: float) -> List[str]:
+        """Images any router replica saw failing to pre-pull within the last max_age_seconds."""
         with self.db.connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
                     """
-                    INSERT INTO ml_models (
-                        image_url, exposed_port, name, version, min_replicas, max_replicas, description, created_at, author, tags, 
-                        dependencies, input_schema, output_schema, license, framework, hyperparameters, metrics, endpoint, environment_variables
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                    )
+                    SELECT image FROM image_pull_failures
+                    WHERE failed_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    ORDER BY image
+                    """,
+                    (max_age_seconds,)
+                )
+                return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def projection(fields: Sequence[str]) -> Tuple[str, ...]:
+        """Validate a requested field subset and return it as a column tuple including the key columns."""
+        unknown = [field for field in fields if field not in COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown model fields: {', '.join(unknown)}")
+        return KEY_COLUMNS + tuple(field for field in COLUMNS if field in fields and field not in KEY_COLUMNS)
+
+    @staticmethod
+    def encode_cursor(model_name: str, model_version: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps([model_name, model_version]).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, str]:
+        try:
+            model_name, model_version = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return str(model_name), str(model_version)
+        except Exception:
+            raise ValueError(f"Invalid cursor {cursor}")
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def list_models(
+        self,
+        columns: Sequence[str] = COLUMNS,
+        limit: int = 100,
+        after: Optional[Tuple[str, str]] = None,
+        name_prefix: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        framework: Optional[str] = None,
+        author: Optional[str] = None,
+    ) -> Iterator[dict]:
+        """Yield up to `limit` models ordered by (name, version), starting after the `after` key.
+
+        Rows are read through a server-side cursor so memory stays flat however large the
+        page is, and only the requested columns are fetched.
+        """
+        conditions, params = [], []
+        if after:
+            conditions.append("(name, version) > (%s, %s)")
+            params.extend(after)
+        if name_prefix:
+            conditions.append("name LIKE %s")
+            params.append(name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if tags:
+            conditions.append("tags @> %s::text[]")
+            params.append(tags)
+        if framework:
+            conditions.append("framework = %s")
+            params.append(framework)
+        if author:
+            conditions.append("author = %s")
+            params.append(author)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.db.connect() as conn:
+            with conn.cursor(name="list_models") as cursor:
+                cursor.itersize = min(limit, 500)
+                cursor.execute(
+                    f"""
+                    SELECT {", ".join(columns)} FROM ml_models
+                    {where}
+                    ORDER BY name, version
+                    LIMIT %s
                     """,
-                    (
-                        model.image_url,
-                        model.exposed_port,
-                        model.name,
-                        model.version,
-                        model.min_replicas,
-                        model.max_replicas,
-                        model.description,
-                        model.created_at,
-                        model.author,
-                        model.tags,
-                        json.dumps(model.dependencies) if model.dependencies else None,
-                        model.input_schema,
-                        model.output_schema,
-                        model.license,
-                        model.framework,
-                        json.dumps(model.hyperparameters) if model.hyperparameters else None,
-                        json.dumps(model.metrics) if model.metrics else None,
-                        model.endpoint,
-                        json.dumps(model.environment_variables) if model.environment_variables else None
-                    )
+                    params + [limit]
                 )
-                conn.commit()
\ No newline at end of file
+                for row in cursor:
+                    fields = dict(zip(columns, row))
+                    if fields.get("created_at"):
+                        fields["created_at"] = fields["created_at"].strftime('%Y-%m-%d %H:%M:%S.%f %z')
+                    yield fields
@@ -0,0 +1,53 @@
+from typing import List, Tuple
+import json
+import psycopg2.extras
+from models.Database import Database
+from monitoring.Metrics import DB_OPERATION_ERRORS, DB_OPERATION_SECONDS, timed
+
+
+class RouterStatsPersistence:
+    """Live per-model stats each router replica publishes, so any replica can report the whole fleet."""
+    db: Database
+    def __init__(self, db: Database):
+        self.db = db
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def publish(self, replica: str, stats: List[Tuple[str, str, dict]], retention_seconds: float):
+        """Replace a replica's (name, version, stats) rows, and drop rows of replicas silent for retention_seconds."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                if stats:
+                    psycopg2.extras.execute_values(
+                        cursor,
+                        """
+                        INSERT INTO router_model_stats (replica, name, version, stats) VALUES %s
+                        ON CONFLICT (replica, name, version) DO UPDATE SET
+                        stats = EXCLUDED.stats, published_at = EXCLUDED.published_at
+                        """,
+                        [(replica, name, version, json.dumps(model_stats)) for name, version, model_stats in stats],
+                        page_size=len(stats),
+                    )
+                # CURRENT_TIMESTAMP is the transaction start, so this keeps exactly the rows just written
+                cursor.execute(
+                    """
+                    DELETE FROM router_model_stats
+                    WHERE (replica = %s AND published_at < CURRENT_TIMESTAMP)
+                    OR published_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    """,
+                    (replica, retention_seconds)
+                )
+                conn.commit()
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def load(self, max_age_seconds: float) -> List[Tuple[str, str, str, dict]]:
+        """(replica, name, version, stats) of every replica that published within the last max_age_seconds."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT replica, name, version, stats FROM router_model_stats
+                    WHERE published_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    """,
+                    (max_age_seconds,)
+                )
+                return [tuple(row) for row in cursor.fetchall()]
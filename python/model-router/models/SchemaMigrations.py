@@ -0,0 +1,214 @@
+from typing import List, Tuple
+from models.Database import Database
+
+# Arbitrary key for pg_advisory_xact_lock so concurrently starting router replicas migrate one at a time
+MIGRATION_LOCK_ID = 0x6279_6f63
+
+# (version, description, sql) - append only, never edit a migration that has shipped
+MIGRATIONS: List[Tuple[int, str, str]] = [
+    (
+        1,
+        "create ml_models",
+        """
+        CREATE TABLE IF NOT EXISTS ml_models (
+            id SERIAL PRIMARY KEY,
+            image_url TEXT NOT NULL,
+            exposed_port INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            version TEXT NOT NULL,
+            min_replicas INTEGER DEFAULT 1,
+            max_replicas INTEGER DEFAULT 10,
+            description TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            author TEXT,
+            tags TEXT[],
+            dependencies JSONB,
+            input_schema TEXT,
+            output_schema TEXT,
+            license TEXT,
+            framework TEXT,
+            hyperparameters JSONB,
+            metrics JSONB,
+            endpoint TEXT,
+            environment_variables JSONB
+        )
+        """,
+    ),
+    (
+        2,
+        "unique (name, version) index and GIN index on tags",
+        """
+        DELETE FROM ml_models older
+        USING ml_models newer
+        WHERE older.name = newer.name AND older.version = newer.version AND older.id < newer.id;
+        CREATE UNIQUE INDEX IF NOT EXISTS ml_models_name_version_key ON ml_models (name, version);
+        CREATE INDEX IF NOT EXISTS ml_models_tags_idx ON ml_models USING GIN (tags);
+        """,
+    ),
+    (
+        3,
+        "name prefix index for model listing",
+        """
+        CREATE INDEX IF NOT EXISTS ml_models_name_pattern_idx ON ml_models (name text_pattern_ops);
+        """,
+    ),
+    (
+        4,
+        "micro-batching settings",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS batch_max_size INTEGER;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS batch_max_wait_ms DOUBLE PRECISION;
+        """,
+    ),
+    (
+        5,
+        "response cache TTL",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS cache_ttl_seconds DOUBLE PRECISION;
+        """,
+    ),
+    (
+        6,
+        "scale-to-zero idle timeout",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS idle_timeout_seconds DOUBLE PRECISION;
+        """,
+    ),
+    (
+        7,
+        "autoscaling policy",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS autoscaling_metric TEXT;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS autoscaling_target DOUBLE PRECISION;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS scale_up_stabilization_seconds INTEGER;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS scale_down_stabilization_seconds INTEGER;
+        """,
+    ),
+    (
+        8,
+        "model traffic splits",
+        """
+        CREATE TABLE IF NOT EXISTS model_traffic (
+            name TEXT PRIMARY KEY,
+            weights JSONB NOT NULL,
+            shadow_version TEXT,
+            shadow_percent DOUBLE PRECISION NOT NULL DEFAULT 0,
+            rollout JSONB,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS model_traffic_rollout_idx ON model_traffic (name) WHERE rollout IS NOT NULL;
+        """,
+    ),
+    (
+        9,
+        "admission control limits",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS max_concurrency INTEGER;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS max_queue_depth INTEGER;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS queue_timeout_ms DOUBLE PRECISION;
+        """,
+    ),
+    (
+        10,
+        "streaming passthrough",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS streaming BOOLEAN;
+        """,
+    ),
+    (
+        11,
+        "tensor payload format",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS payload_format TEXT;
+        """,
+    ),
+    (
+        12,
+        "resource profiles and placement",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS cpu_request TEXT;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS cpu_limit TEXT;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS memory_request TEXT;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS memory_limit TEXT;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS node_affinity JSONB;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS anti_affinity TEXT;
+        """,
+    ),
+    (
+        13,
+        "last use of each model for the image warm pool",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS last_used_at TIMESTAMP WITH TIME ZONE;
+        """,
+    ),
+    (
+        14,
+        "hedging, retries and circuit breakers",
+        """
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS hedge_percentile DOUBLE PRECISION;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS max_retries INTEGER;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS retry_budget_percent DOUBLE PRECISION;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS breaker_error_rate DOUBLE PRECISION;
+        ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS breaker_open_seconds DOUBLE PRECISION;
+        """,
+    ),
+    (
+        15,
+        "image pre-pull failures",
+        """
+        CREATE TABLE IF NOT EXISTS image_pull_failures (
+            image TEXT PRIMARY KEY,
+            failed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    ),
+    (
+        16,
+        "live model stats per router replica",
+        """
+        CREATE TABLE IF NOT EXISTS router_model_stats (
+            replica TEXT NOT NULL,
+            name TEXT NOT NULL,
+            version TEXT NOT NULL,
+            stats JSONB NOT NULL,
+            published_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (replica, name, version)
+        );
+        """,
+    ),
+]
+
+
+class SchemaMigrator:
+    db: Database
+    def __init__(self, db: Database):
+        self.db = db
+
+    def migrate(self) -> int:
+        """Apply every pending migration in one transaction and return the resulting schema version."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+                cursor.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """
+                )
+                cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+                current = cursor.fetchone()[0]
+                for version, description, sql in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    print(f"Applying schema migration {version}: {description}")
+                    cursor.execute(sql)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (version, description)
+                    )
+                    current = version
+                conn.commit()
+                return current
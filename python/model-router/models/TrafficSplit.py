@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+from datetime import datetime
+
+
+class Rollout(BaseModel):
+    # Version being rolled out; every step_seconds it gains step_percent of the traffic while its error rate
+    # and mean latency (relative to the other versions) stay within bounds, otherwise it is rolled back
+    candidate: str
+    step_percent: float = 10.0
+    step_seconds: float = 60.0
+    max_error_rate: float = 0.01
+    max_latency_ratio: float = 1.5
+    min_requests: int = 20
+
+
+class TrafficSplit(BaseModel):
+    # Relative weight of each version served behind /predict/{model_name}
+    weights: Dict[str, float]
+    # Percentage of requests also sent to shadow_version, whose responses are discarded
+    shadow_version: Optional[str] = None
+    shadow_percent: float = 0.0
+    rollout: Optional[Rollout] = None
+    updated_at: Optional[datetime] = None
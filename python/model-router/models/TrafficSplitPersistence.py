@@ -0,0 +1,127 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import json
+from models.Database import Database
+from models.MLModelPersistence import MLModelPersistence
+from models.TrafficSplit import Rollout, TrafficSplit
+from monitoring.Metrics import DB_OPERATION_ERRORS, DB_OPERATION_SECONDS, timed
+
+TRAFFIC_COLUMNS = ("weights", "shadow_version", "shadow_percent", "rollout", "updated_at")
+
+
+class TrafficSplitPersistence:
+    db: Database
+    def __init__(self, db: Database):
+        self.db = db
+
+    @staticmethod
+    def row_to_split(row) -> TrafficSplit:
+        return TrafficSplit(**dict(zip(TRAFFIC_COLUMNS, row)))
+
+    @staticmethod
+    def validate(model_name: str, split: TrafficSplit, cursor):
+        if not split.weights or any(weight < 0 for weight in split.weights.values()) or sum(split.weights.values()) <= 0:
+            raise ValueError("weights must be non-negative and add up to more than zero")
+        if not 0 <= split.shadow_percent <= 100:
+            raise ValueError("shadow_percent must be between 0 and 100")
+        if split.rollout and not any(
+            weight > 0 for version, weight in split.weights.items() if version != split.rollout.candidate
+        ):
+            raise ValueError("A rollout needs another version with traffic to compare the candidate against")
+        versions = set(split.weights)
+        if split.shadow_version:
+            versions.add(split.shadow_version)
+        if split.rollout:
+            versions.add(split.rollout.candidate)
+        cursor.execute(
+            "SELECT version FROM ml_models WHERE name = %s AND version = ANY(%s)",
+            (model_name, sorted(versions))
+        )
+        missing = versions - {row[0] for row in cursor.fetchall()}
+        if missing:
+            raise ValueError(f"Unknown versions of model {model_name}: {', '.join(sorted(missing))}")
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def get_traffic(self, model_name: str) -> TrafficSplit:
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT {', '.join(TRAFFIC_COLUMNS)} FROM model_traffic WHERE name = %s",
+                    (model_name,)
+                )
+                row = cursor.fetchone()
+                if row:
+                    return self.row_to_split(row)
+                else:
+                    raise ValueError(f"No traffic split for model {model_name}")
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def save_traffic(self, model_name: str, split: TrafficSplit):
+        """Create or replace the traffic split of a model; raises ValueError if it names unknown versions."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                self.validate(model_name, split, cursor)
+                cursor.execute(
+                    """
+                    INSERT INTO model_traffic (name, weights, shadow_version, shadow_percent, rollout, updated_at)
+                    VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (name) DO UPDATE SET
+                    weights = EXCLUDED.weights, shadow_version = EXCLUDED.shadow_version,
+                    shadow_percent = EXCLUDED.shadow_percent, rollout = EXCLUDED.rollout, updated_at = EXCLUDED.updated_at
+                    """,
+                    (
+                        model_name,
+                        json.dumps(split.weights),
+                        split.shadow_version,
+                        split.shadow_percent,
+                        split.rollout.json() if split.rollout else None,
+                    )
+                )
+                self.notify_change(cursor, model_name)
+                conn.commit()
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def delete_traffic(self, model_name: str):
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM model_traffic WHERE name = %s", (model_name,))
+                deleted = cursor.rowcount
+                if deleted > 0:
+                    self.notify_change(cursor, model_name)
+                conn.commit()
+                if deleted == 0:
+                    raise ValueError(f"No traffic split for model {model_name}")
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def get_rollouts(self) -> List[Tuple[str, TrafficSplit]]:
+        """(name, split) of every model with a rollout in progress."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT name, {', '.join(TRAFFIC_COLUMNS)} FROM model_traffic WHERE rollout IS NOT NULL"
+                )
+                return [(row[0], self.row_to_split(row[1:])) for row in cursor.fetchall()]
+
+    @timed(DB_OPERATION_SECONDS, DB_OPERATION_ERRORS)
+    def advance_rollout(self, model_name: str, updated_at: datetime, weights: Dict[str, float],
+                        rollout: Optional[Rollout], shadow_version: Optional[str]) -> bool:
+        """Move a rollout to its next weights unless another replica already did since updated_at."""
+        with self.db.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE model_traffic SET weights = %s, rollout = %s, shadow_version = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE name = %s AND updated_at = %s
+                    """,
+                    (json.dumps(weights), rollout.json() if rollout else None, shadow_version, model_name, updated_at)
+                )
+                advanced = cursor.rowcount > 0
+                if advanced:
+                    self.notify_change(cursor, model_name)
+                conn.commit()
+                return advanced
+
+    @staticmethod
+    def notify_change(cursor, model_name: str):
+        # Shares the ml_models channel; a null version marks a change of the model's traffic split
+        MLModelPersistence.notify_change(cursor, model_name, None)
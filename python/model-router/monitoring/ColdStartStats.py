@@ -0,0 +1,23 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class ColdStartStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seconds: float = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "cold_starts": self.count,
+            "avg_seconds": self.total_seconds / self.count if self.count else 0.0,
+            "max_seconds": self.max_seconds,
+            "last_seconds": self.last_seconds,
+        }
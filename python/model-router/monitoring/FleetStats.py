@@ -0,0 +1,181 @@
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import os
+import time
+from k8s.MLDeployer import MLDeployer
+
+# ml_models columns shown on the fleet dashboard
+FLEET_COLUMNS = ("name", "version", "min_replicas", "max_replicas", "batch_max_size", "cache_ttl_seconds", "streaming")
+# Upper bounds of the latency histogram buckets router replicas publish: 1ms growing by 25% up to about
+# 2 minutes (anything slower lands in the last bucket), so merged percentiles are within 25%
+LATENCY_BUCKETS_MS = tuple(1.25 ** index for index in range(53))
+
+
+def latency_histogram(latencies: List[float]) -> Dict[str, int]:
+    """Sparse {bucket index: count} histogram of latencies in seconds; keys are strings to survive JSON."""
+    histogram: Dict[str, int] = {}
+    for latency in latencies:
+        bucket = str(min(bisect_left(LATENCY_BUCKETS_MS, latency * 1000), len(LATENCY_BUCKETS_MS) - 1))
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+    return histogram
+
+
+def histogram_percentile(histogram: Dict[str, int], percent: float) -> Optional[float]:
+    """Upper bound in ms of the bucket holding the percentile, None for an empty histogram."""
+    buckets = sorted((int(bucket), count) for bucket, count in histogram.items())
+    rank = min(int(sum(count for _, count in buckets) * percent / 100), sum(count for _, count in buckets) - 1)
+    for bucket, count in buckets:
+        rank -= count
+        if rank < 0:
+            return LATENCY_BUCKETS_MS[bucket]
+    return None
+
+
+class FleetStats:
+    """One snapshot of every registered model's replica range, replica counts and live traffic.
+
+    Every router replica publishes its own mergeable per-model numbers (request and error counts,
+    a latency histogram, cache and batching counters) every publish_interval; a snapshot merges
+    those of every replica that published recently with a single database query and a single
+    Kubernetes list call, so the rates and percentiles are the fleet's, whichever replica answers,
+    and lag by at most publish_interval. Snapshots are cached for ttl seconds, so any number of
+    dashboards polling cost the same and concurrent requests for an expired snapshot share one
+    rebuild. Only used from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        load_models: Callable[[], Awaitable[List[dict]]],
+        load_replicas: Callable[[], Awaitable[Dict[str, Tuple[int, int]]]],
+        local_stats: Callable[[], List[Tuple[str, str, dict]]],
+        publish_stats: Callable[[List[Tuple[str, str, dict]], float], Awaitable[None]],
+        load_stats: Callable[[float], Awaitable[List[Tuple[str, str, str, dict]]]],
+        ttl: float = 2.0,
+        publish_interval: float = 5.0,
+    ):
+        self.load_models = load_models
+        self.load_replicas = load_replicas
+        self.local_stats = local_stats
+        self.publish_stats = publish_stats
+        self.load_stats = load_stats
+        self.ttl = ttl
+        self.publish_interval = publish_interval
+        self.snapshot: Optional[dict] = None
+        self.built_at = 0.0
+        self.building: Optional[asyncio.Task] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, load_models: Callable[[], Awaitable[List[dict]]],
+                 load_replicas: Callable[[], Awaitable[Dict[str, Tuple[int, int]]]],
+                 local_stats: Callable[[], List[Tuple[str, str, dict]]],
+                 publish_stats: Callable[[List[Tuple[str, str, dict]], float], Awaitable[None]],
+                 load_stats: Callable[[float], Awaitable[List[Tuple[str, str, str, dict]]]]):
+        """Factory method to create a FleetStats from environment variables."""
+        return cls(
+            load_models,
+            load_replicas,
+            local_stats,
+            publish_stats,
+            load_stats,
+            ttl=float(os.getenv('FLEET_STATS_TTL', 2.0)),
+            publish_interval=float(os.getenv('FLEET_STATS_PUBLISH_INTERVAL', 5.0)),
+        )
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    async def run(self):
+        while True:
+            try:
+                # Rows of replicas silent for a while are deleted by whichever replica publishes next
+                await self.publish_stats(self.local_stats(), self.publish_interval * 20)
+            except Exception as e:
+                print(f"Exception when publishing fleet stats: {e}")
+            await asyncio.sleep(self.publish_interval)
+
+    async def get(self) -> dict:
+        if self.snapshot is not None and time.monotonic() - self.built_at < self.ttl:
+            return self.snapshot
+        if self.building is None:
+            self.building = asyncio.get_running_loop().create_task(self.build())
+            self.building.add_done_callback(lambda _: setattr(self, "building", None))
+        # Shielded so a dashboard that goes away does not cancel the rebuild for the others
+        return await asyncio.shield(self.building)
+
+    @staticmethod
+    def merge(published: List[dict]) -> dict:
+        """Fleet-wide traffic, cache and batching numbers of a model from each replica's published stats."""
+        traffic = [stats["traffic"] for stats in published if stats.get("traffic")]
+        cache = [stats["cache"] for stats in published if stats.get("cache")]
+        batching = [stats["batching"] for stats in published if stats.get("batching")]
+        merged = {"traffic": None, "cache": None, "batching": None}
+        if traffic:
+            requests = sum(item["window_requests"] for item in traffic)
+            histogram: Dict[str, int] = {}
+            for item in traffic:
+                for bucket, count in item["latency_histogram"].items():
+                    histogram[bucket] = histogram.get(bucket, 0) + count
+            merged["traffic"] = {
+                "rps": sum(item["rps"] for item in traffic),
+                "in_flight": sum(item["in_flight"] for item in traffic),
+                "requests": sum(item["requests"] for item in traffic),
+                "error_rate": sum(item["window_errors"] for item in traffic) / requests if requests else 0.0,
+                "p50_ms": histogram_percentile(histogram, 50),
+                "p99_ms": histogram_percentile(histogram, 99),
+            }
+        if cache:
+            hits, misses = sum(item["hits"] for item in cache), sum(item["misses"] for item in cache)
+            merged["cache"] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+                "entries": sum(item["entries"] for item in cache),
+            }
+        if batching:
+            batches = sum(item["batches"] for item in batching)
+            merged["batching"] = {
+                "batches": batches,
+                "avg_batch_size": sum(item["items"] for item in batching) / batches if batches else 0.0,
+            }
+        return merged
+
+    async def build(self) -> dict:
+        models, replicas, published = await asyncio.gather(
+            self.load_models(), self.load_replicas(), self.load_stats(self.publish_interval * 3), return_exceptions=True
+        )
+        if isinstance(models, BaseException):
+            raise models
+        if isinstance(replicas, BaseException):
+            print(f"Exception when listing model replicas: {replicas}")
+            replicas = None
+        if isinstance(published, BaseException):
+            print(f"Exception when loading published fleet stats: {published}")
+            published = []
+
+        by_model: Dict[Tuple[str, str], List[dict]] = {}
+        for _, name, version, stats in published:
+            by_model.setdefault((name, version), []).append(stats)
+        items = []
+        for model in models:
+            name, version = model["name"], model["version"]
+            counts = None if replicas is None else replicas.get(MLDeployer.resource_names(name, version)["deployment"])
+            items.append({
+                **model,
+                "replicas": None if counts is None else {"desired": counts[0], "ready": counts[1]},
+                **self.merge(by_model.get((name, version), [])),
+            })
+        self.snapshot = {
+            "generated_at": time.time(),
+            "replicas_known": replicas is not None,
+            "routers": len({replica for replica, _, _, _ in published}),
+            "models": items,
+        }
+        self.built_at = time.monotonic()
+        return self.snapshot
@@ -0,0 +1,170 @@
+from functools import wraps
+from typing import Callable
+import inspect
+import time
+from prometheus_client import Counter, Histogram
+
+# Names of the per-model metrics LoadTracker publishes for the autoscaler (see MLDeployer.apply_horizontal_autoscaler)
+INFLIGHT_METRIC = "byoc_model_inflight_requests"
+RPS_METRIC = "byoc_model_requests_per_second"
+REQUESTS_METRIC = "byoc_model_requests"
+
+# Seconds; covers sub-millisecond cache hits up to slow cold starts and API server calls
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "byoc_http_request_duration_seconds", "Router HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUEST_ERRORS = Counter(
+    "byoc_http_request_errors", "Router HTTP requests answered with a 5xx status",
+    ["method", "route", "status"],
+)
+DB_OPERATION_SECONDS = Histogram(
+    "byoc_db_operation_duration_seconds", "Database operation latency, including waiting for a pooled connection",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+DB_OPERATION_ERRORS = Counter("byoc_db_operation_errors", "Database operations that raised", ["operation"])
+DB_POOL_WAIT_SECONDS = Histogram(
+    "byoc_db_pool_wait_seconds", "Time spent waiting for (and health checking) a pooled connection",
+    buckets=LATENCY_BUCKETS,
+)
+K8S_CALL_SECONDS = Histogram(
+    "byoc_k8s_api_call_duration_seconds", "Kubernetes API call latency", ["operation"], buckets=LATENCY_BUCKETS,
+)
+K8S_CALL_ERRORS = Counter("byoc_k8s_api_call_errors", "Kubernetes API calls that raised", ["operation"])
+MODEL_UPSTREAM_SECONDS = Histogram(
+    "byoc_model_upstream_duration_seconds", "Time for a model to answer a forwarded request (a whole batch when batching)",
+    ["model", "version"], buckets=LATENCY_BUCKETS,
+)
+MODEL_UPSTREAM_FIRST_BYTE_SECONDS = Histogram(
+    "byoc_model_upstream_first_byte_seconds", "Time until a streamed model response sent its first body chunk",
+    ["model", "version"], buckets=LATENCY_BUCKETS,
+)
+MODEL_UPSTREAM_ERRORS = Counter(
+    "byoc_model_upstream_errors", "Forwarded requests that failed before the model answered", ["model", "version"],
+)
+MODEL_QUEUE_SECONDS = Histogram(
+    "byoc_model_queue_duration_seconds", "Time a request waited in the router before being forwarded",
+    ["model", "version", "stage"], buckets=LATENCY_BUCKETS,
+)
+QUEUE_STAGES = ("batch", "activation", "admission")
+MODEL_POD_READY_SECONDS = Histogram(
+    "byoc_model_pod_ready_seconds", "Time from creation to Ready of new model pods, by whether the image was already on the node",
+    ["model", "version", "prepulled"], buckets=(1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0),
+)
+ADMISSION_REJECTIONS = Counter(
+    "byoc_admission_rejections", "Requests turned away by admission control", ["model", "version", "reason"],
+)
+REJECTION_REASONS = ("queue_full", "shed", "deadline")
+MODEL_RESILIENCE_EVENTS = Counter(
+    "byoc_model_resilience_events", "Hedged requests, retries and circuit breaker activity per model",
+    ["model", "version", "event"],
+)
+RESILIENCE_EVENTS = ("hedge", "hedge_won", "retry", "budget_exhausted", "breaker_trip", "breaker_rejected")
+
+
+def timed(histogram: Histogram, errors: Counter) -> Callable:
+    """Decorator recording a call's duration and failures, labelled with the function name.
+
+    ValueError is how lookups report "not found" in this codebase, so it is not counted as a
+    failure. Generator functions are timed until they are exhausted or closed.
+    """
+    def decorator(fn: Callable) -> Callable:
+        # Resolve the labelled children once so the call path only does the observation itself
+        observe = histogram.labels(fn.__name__).observe
+        failed = errors.labels(fn.__name__).inc
+
+        if inspect.isgeneratorfunction(fn):
+            @wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    yield from fn(*args, **kwargs)
+                except ValueError:
+                    raise
+                except Exception:
+                    failed()
+                    raise
+                finally:
+                    observe(time.perf_counter() - started)
+            return generator_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except ValueError:
+                raise
+            except Exception:
+                failed()
+                raise
+            finally:
+                observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def forget_model_metrics(model_name: str, model_version: str):
+    """Drop a model's labelled series so removed models do not accumulate in /metrics."""
+    for metric in (MODEL_UPSTREAM_SECONDS, MODEL_UPSTREAM_FIRST_BYTE_SECONDS, MODEL_UPSTREAM_ERRORS):
+        try:
+            metric.remove(model_name, model_version)
+        except KeyError:
+            pass
+    for stage in QUEUE_STAGES:
+        try:
+            MODEL_QUEUE_SECONDS.remove(model_name, model_version, stage)
+        except KeyError:
+            pass
+    for prepulled in ("true", "false"):
+        try:
+            MODEL_POD_READY_SECONDS.remove(model_name, model_version, prepulled)
+        except KeyError:
+            pass
+    for reason in REJECTION_REASONS:
+        try:
+            ADMISSION_REJECTIONS.remove(model_name, model_version, reason)
+        except KeyError:
+            pass
+    for event in RESILIENCE_EVENTS:
+        try:
+            MODEL_RESILIENCE_EVENTS.remove(model_name, model_version, event)
+        except KeyError:
+            pass
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every request by its route template (e.g. /predict/{model_name}/{model_version}).
+
+    Written as plain ASGI rather than BaseHTTPMiddleware to keep the per-request overhead to a
+    couple of dictionary lookups; streamed responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500  # Unhandled exceptions never start a response
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "unmatched"), str(status_code))
+            HTTP_REQUEST_SECONDS.labels(*labels).observe(time.perf_counter() - started)
+            if status_code >= 500:
+                HTTP_REQUEST_ERRORS.labels(*labels).inc()
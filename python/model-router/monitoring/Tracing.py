@@ -0,0 +1,50 @@
+from contextlib import nullcontext
+from typing import List, Tuple
+import os
+
+try:
+    from opentelemetry import propagate, trace
+except ImportError:  # Tracing is optional; install opentelemetry-api plus an SDK/exporter to enable it
+    propagate = trace = None
+
+
+class Tracer:
+    """Optional OpenTelemetry spans for the inference path, propagating trace context to model pods.
+
+    Enabled with TRACING_ENABLED=true when opentelemetry-api is installed. The tracer provider
+    and exporter are configured outside the router, e.g. by starting it with `opentelemetry-instrument`.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled and trace is not None
+        self.tracer = trace.get_tracer("byoc.model-router") if self.enabled else None
+
+    @classmethod
+    def from_env(cls):
+        """Factory method to create a Tracer from environment variables."""
+        enabled = os.getenv('TRACING_ENABLED', 'false').lower() == 'true'
+        if enabled and trace is None:
+            print("TRACING_ENABLED is set but opentelemetry-api is not installed; tracing is disabled")
+        return cls(enabled=enabled)
+
+    def span(self, name: str, headers: List[Tuple[bytes, bytes]] = None, **attributes):
+        """Context manager for a span; with headers it continues the caller's trace."""
+        if not self.enabled:
+            return nullcontext()
+        context = None
+        if headers is not None:
+            context = propagate.extract({key.decode("latin-1"): value.decode("latin-1") for key, value in headers})
+        return self.tracer.start_as_current_span(name, context=context, attributes=attributes)
+
+    def inject(self, headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+        """Replace any incoming trace context headers with the current span's."""
+        if not self.enabled:
+            return headers
+        carrier = {}
+        propagate.inject(carrier)
+        if not carrier:
+            return headers
+        replaced = {key.lower().encode("latin-1") for key in carrier}
+        return [(key, value) for key, value in headers if key.lower() not in replaced] + [
+            (key.encode("latin-1"), value.encode("latin-1")) for key, value in carrier.items()
+        ]
@@ -1,7 +1,13 @@
 import streamlit as st
 import requests
+import threading
+from collections import deque
+from requests.adapters import HTTPAdapter
 
 API_URL = "http://127.0.0.1"  # Update with your actual external IP address
+FLEET_REFRESH_SECONDS = 5
+FLEET_HISTORY = 60  # Snapshots kept per model for the sparklines
+HOT_ERROR_RATE = 0.05
 
 st.set_page_config(
     page_title="ML Model Management",
@@ -20,7 +26,7 @@ def main():
     st.title("ML Model Management")
 
     st.sidebar.title("Actions")
-    action = st.sidebar.selectbox("Select an action", ["Deploy Model", "Delete Model", "Get Model"])
+    action = st.sidebar.selectbox("Select an action", ["Deploy Model", "Delete Model", "Get Model", "Fleet"])
 
     if action == "Deploy Model":
         deploy_model()
@@ -31,6 +37,19 @@ def main():
     elif action == "Get Model":
         get_model()
 
+    elif action == "Fleet":
+        fleet()
+
+
+@st.cache_resource
+def session():
+    # One pooled keep-alive session shared by every page and browser tab instead of a connection per click
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    return http
+
 
 def deploy_model():
     st.subheader("Deploy a New Model")
@@ -83,7 +102,7 @@ def deploy_model():
             "model_endpoint": model_endpoint,
         }
 
-        response = requests.post(f"{API_URL}/model", json=payload)
+        response = session().post(f"{API_URL}/model", json=payload)
         handle_response(response)
 
 
@@ -94,7 +113,7 @@ def delete_model():
     model_version = st.text_input("Model Version")
 
     if st.button("Delete"):
-        response = requests.delete(f"{API_URL}/model/{model_name}/{model_version}")
+        response = session().delete(f"{API_URL}/model/{model_name}/{model_version}")
         handle_response(response)
 
 
@@ -105,10 +124,143 @@ def get_model():
     model_version = st.text_input("Model Version")
 
     if st.button("Get Model"):
-        response = requests.get(f"{API_URL}/model/{model_name}/{model_version}")
+        response = session().get(f"{API_URL}/model/{model_name}/{model_version}")
         handle_response(response)
 
 
+def fleet():
+    st.subheader("Fleet")
+    st.caption(
+        f"Refreshed every {FLEET_REFRESH_SECONDS}s from /fleet/stats, which adds up the traffic of every router replica. "
+        "Hot models run at their max replicas or fail more than "
+        f"{HOT_ERROR_RATE:.0%} of requests, cold ones had no traffic in the last window."
+    )
+    fleet_table()
+    resize_model()
+
+
+@st.cache_data(ttl=FLEET_REFRESH_SECONDS - 1, show_spinner=False)
+def fetch_fleet():
+    # Cached across browser tabs, so the router is asked at most once per refresh however many are open
+    response = session().get(f"{API_URL}/fleet/stats", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_resource
+def fleet_history():
+    return {"lock": threading.Lock(), "generated_at": 0.0, "models": {}}
+
+
+def record_history(snapshot):
+    """Append each model's RPS and p99 of a snapshot not seen yet to the shared sparkline history."""
+    history = fleet_history()
+    with history["lock"]:
+        if snapshot["generated_at"] <= history["generated_at"]:
+            return
+        history["generated_at"] = snapshot["generated_at"]
+        for model in snapshot["models"]:
+            traffic = model["traffic"] or {}
+            series = history["models"].setdefault(
+                (model["name"], model["version"]), (deque(maxlen=FLEET_HISTORY), deque(maxlen=FLEET_HISTORY))
+            )
+            series[0].append(traffic.get("rps") or 0.0)
+            series[1].append(traffic.get("p99_ms") or 0.0)
+
+
+def model_state(model):
+    traffic = model["traffic"] or {}
+    replicas = model["replicas"] or {}
+    if not traffic.get("rps"):
+        return "🧊 cold"
+    if traffic.get("error_rate", 0.0) > HOT_ERROR_RATE or replicas.get("desired", 0) >= (model["max_replicas"] or 0):
+        return "🔥 hot"
+    return "ok"
+
+
+@st.fragment(run_every=FLEET_REFRESH_SECONDS)
+def fleet_table():
+    try:
+        snapshot = fetch_fleet()
+    except requests.RequestException as e:
+        st.error(f"Could not load fleet stats: {e}")
+        return
+    record_history(snapshot)
+    history = fleet_history()["models"]
+
+    rows = []
+    for model in snapshot["models"]:
+        traffic = model["traffic"] or {}
+        replicas = model["replicas"]
+        cache = model["cache"]
+        batching = model["batching"]
+        rps_history, p99_history = history.get((model["name"], model["version"]), ((), ()))
+        rows.append({
+            "Model": f"{model['name']}:{model['version']}",
+            "State": model_state(model),
+            "Replicas": f"{replicas['ready']}/{replicas['desired']}" if replicas else "?",
+            "Range": f"{model['min_replicas']}-{model['max_replicas']}",
+            "RPS": traffic.get("rps", 0.0),
+            "RPS trend": list(rps_history),
+            "p50 ms": traffic.get("p50_ms"),
+            "p99 ms": traffic.get("p99_ms"),
+            "p99 trend": list(p99_history),
+            "Errors": traffic.get("error_rate", 0.0) * 100,
+            "Cache hits": cache["hit_ratio"] * 100 if cache else None,
+            "Avg batch": batching["avg_batch_size"] if batching else None,
+        })
+
+    states = [row["State"] for row in rows]
+    columns = st.columns(4)
+    columns[0].metric("Models", len(rows))
+    columns[1].metric("Total RPS", f"{sum(row['RPS'] for row in rows):.1f}")
+    columns[2].metric("Hot", states.count("🔥 hot"))
+    columns[3].metric("Cold", states.count("🧊 cold"))
+    if not snapshot["replicas_known"]:
+        st.warning("The router could not list deployments, replica counts are unknown")
+    if not snapshot["routers"]:
+        st.info("No router replica has published traffic numbers yet")
+
+    st.dataframe(
+        rows,
+        hide_index=True,
+        column_config={
+            "RPS": st.column_config.NumberColumn(format="%.1f"),
+            "RPS trend": st.column_config.LineChartColumn(y_min=0),
+            "p50 ms": st.column_config.NumberColumn(format="%.0f"),
+            "p99 ms": st.column_config.NumberColumn(format="%.0f"),
+            "p99 trend": st.column_config.LineChartColumn(y_min=0),
+            "Errors": st.column_config.ProgressColumn(format="%.1f%%", min_value=0, max_value=100),
+            "Cache hits": st.column_config.ProgressColumn(format="%.0f%%", min_value=0, max_value=100),
+            "Avg batch": st.column_config.NumberColumn(format="%.1f"),
+        },
+    )
+
+
+def resize_model():
+    st.subheader("Adjust Replicas")
+    try:
+        models = {(model["name"], model["version"]): model for model in fetch_fleet()["models"]}
+    except requests.RequestException:
+        return
+    if not models:
+        st.info("No models registered")
+        return
+
+    key = st.selectbox("Model", list(models), format_func=lambda key: f"{key[0]}:{key[1]}")
+    model = models[key]
+    with st.form("resize"):
+        min_replicas = st.number_input("Min Replicas", min_value=0, value=model["min_replicas"] or 0)
+        max_replicas = st.number_input("Max Replicas", min_value=1, value=model["max_replicas"] or 1)
+        if st.form_submit_button("Apply"):
+            response = session().patch(
+                f"{API_URL}/model/{key[0]}/{key[1]}/replicas",
+                json={"min_replicas": min_replicas, "max_replicas": max_replicas},
+            )
+            fetch_fleet.clear()
+            handle_response(response)
+
+
 def parse_lines(input_text):
     result = {}
     if input_text:
@@ -119,7 +271,7 @@ def parse_lines(input_text):
 
 
 def handle_response(response):
-    if response.status_code == 200:
+    if response.ok:
         st.success("Operation successful!")
         st.json(response.json())
     else: